@@ -0,0 +1,98 @@
+"""
+Foreground autotile areas resolved by signature lookup against resolving each tile by testing every area,
+and chunk bake time, plain and lit.
+Run from repository root: python -m benchmarks.autotile
+"""
+
+import time
+
+from benchmarks.common import SceneStub, save_path
+
+import pygame
+
+from src.maps.procedural import ProceduralMap
+from src.render import Camera, ForegroundSpriteResolver, PygameRenderer
+from src.tables import Tiles
+
+CHUNK = 12  # unit [tiles]
+CHUNKS = [(col, row) for col in range(10, 30) for row in range(3, 16)]
+
+
+def reference_area_type(grid, tile):
+    """ :return area of tile found by testing areas one by one on its neighbours, as resolver did before """
+    textures = ForegroundSpriteResolver.textures
+
+    def is_friendly(t0, t1):
+        return t1.type == textures[t0.type][1].value or t0.type == textures[t1.type][1].value
+
+    def is_same(t0, t1):
+        return t0.type == t1.type
+
+    def is_none(t0, t1):
+        return t1.type == Tiles.NONE or not is_same(t0, t1)
+
+    tests = {"N": is_none, "S": is_same, "F": is_friendly}
+    nbs = grid.get_nbs(tile.col, tile.row)
+    if all(nbs):
+        for area_type in ForegroundSpriteResolver.Areas:
+            if all(tests[letter](tile, nb) for letter, nb in zip(area_type.name, nbs)):
+                return area_type
+        raise AttributeError(tile, nbs)
+    return ForegroundSpriteResolver.Areas.SSSS
+
+
+def resolve_areas(map_):
+    """ :return unit [s] per chunk of lookup and of reference, chunks whose areas differ """
+    grid = map_.foreground
+    lookup = reference = 0.0
+    mismatched = 0
+    for col, row in CHUNKS:
+        s_col, s_row = col * CHUNK, row * CHUNK
+        started = time.perf_counter()
+        signatures = ForegroundSpriteResolver.get_signatures(grid, s_col, s_row, s_col + CHUNK, s_row + CHUNK)
+        areas = [ForegroundSpriteResolver.lookup[signature] for signature in signatures.ravel()]
+        lookup += time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = [reference_area_type(grid, grid.get_tile(c, r))
+                    for c in range(s_col, s_col + CHUNK) for r in range(s_row, s_row + CHUNK)]
+        reference += time.perf_counter() - started
+
+        tiles = [grid.get_tile(c, r) for c in range(s_col, s_col + CHUNK) for r in range(s_row, s_row + CHUNK)]
+        mismatched += any(a != b for a, b, tile in zip(areas, expected, tiles) if tile.type != Tiles.NONE)
+    return lookup / len(CHUNKS), reference / len(CHUNKS), mismatched
+
+
+def bake(map_, scene, lighting: bool) -> float:
+    """ :return unit [s] per chunk of baking CHUNKS once sprite caches are warm """
+    renderer = PygameRenderer.MapRenderer(Camera(scene, 1080, 768), map_, 16, 16, CHUNK, CHUNK, lighting, 64, 0.5)
+    chunks = [renderer.get_chunk(col, row) for col, row in CHUNKS]
+    for chunk in chunks:
+        renderer.pool.acquire(chunk)
+    for chunk in chunks[:20]:
+        for _ in chunk.init_surface():
+            pass
+    started = time.perf_counter()
+    for chunk in chunks:
+        for _ in chunk.init_surface():
+            pass
+    return (time.perf_counter() - started) / len(chunks)
+
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1080, 768), 0, 32)
+    scene = SceneStub(500, 500, LIGHTING=True)
+    map_ = ProceduralMap(500, 500)
+    map_.init(scene, save_path("autotile"))
+
+    lookup, reference, mismatched = resolve_areas(map_)
+    print("areas    mismatched chunks %d / %d, lookup %.2f ms/chunk, reference %.2f ms/chunk" % (
+        mismatched, len(CHUNKS), 1000 * lookup, 1000 * reference))
+    for lighting in (False, True):
+        print("%-8s bake %.2f ms/chunk" % ("lit" if lighting else "plain", 1000 * bake(map_, scene, lighting)))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Sweep and prune broadphase against testing every pair of swept boxes, pairs compared while entities come and go,
+and update time as number of moving entities grows.
+Run from repository root: python -m benchmarks.broadphase
+"""
+
+import random
+import time
+
+from benchmarks.common import FRAME_TIME, summary
+
+from src.physics import SweepAndPrune
+from src.rect import Entity
+from src.vector import Vector
+
+WORLD = 8400, 2400  # unit [px] of world holding 5000 entities, scaled with their number
+
+
+def brute_force(entities, dt: float) -> set:
+    """ :return pairs of entities whose boxes swept over dt overlap, each pair tested """
+    boxes = []
+    for entity in entities:
+        d_x, d_y = entity.vel.x * dt, entity.vel.y * dt
+        boxes.append((entity.pos.x + min(d_x, 0), entity.pos.x + entity.size.x + max(d_x, 0),
+                      entity.pos.y + min(d_y, 0), entity.pos.y + entity.size.y + max(d_y, 0)))
+    pairs = set()
+    for i in range(len(entities)):
+        for j in range(i + 1, len(entities)):
+            a, b = boxes[i], boxes[j]
+            if a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]:
+                pairs.add(frozenset((entities[i], entities[j])))
+    return pairs
+
+
+def actor(rng: random.Random, width: float, height: float) -> Entity:
+    entity = Entity(rng.uniform(0, width), rng.uniform(0, height), 20, 42)
+    entity.vel = Vector(rng.uniform(-300, 300), rng.uniform(-600, 600))
+    return entity
+
+
+def check(rng: random.Random) -> None:
+    """ Compare pairs of 400 entities over 60 frames, one of them is replaced every 7 frames """
+    entities = {actor(rng, 2000, 800) for _ in range(400)}
+    broadphase = SweepAndPrune()
+    mismatched = duplicated = 0
+    for frame in range(60):
+        if frame % 7 == 0:
+            entities.remove(next(iter(entities)))
+            entities.add(actor(rng, 2000, 800))
+        pairs = broadphase.update(entities, FRAME_TIME)
+        found = {frozenset(pair) for pair in pairs}
+        duplicated += len(pairs) != len(found)
+        mismatched += found != brute_force(list(entities), FRAME_TIME)
+        for entity in entities:
+            entity.update(FRAME_TIME)
+    print("mismatched frames %d / 60, frames with duplicate pairs %d" % (mismatched, duplicated))
+
+
+def scale(rng: random.Random, n: int) -> list:
+    """ :return entities of last frame after timing 120 updates of n entities bouncing inside world """
+    width, height = WORLD[0] * n / 5000, WORLD[1]
+    entities = {actor(rng, width, height) for _ in range(n)}
+    broadphase = SweepAndPrune()
+    broadphase.update(entities, FRAME_TIME)
+    times, pairs = [], 0
+    for _ in range(120):
+        for entity in entities:
+            entity.update(FRAME_TIME)
+            if not 0 < entity.pos.x < width:
+                entity.vel.x = -entity.vel.x
+            if not 0 < entity.pos.y < height:
+                entity.vel.y = -entity.vel.y
+        started = time.perf_counter()
+        pairs += len(broadphase.update(entities, FRAME_TIME))
+        times.append(time.perf_counter() - started)
+    print("n %5d  update %s  pairs/frame %.0f  x axis candidates %d" % (
+        n, summary(times), pairs / 120, broadphase.candidates))
+    return list(entities)
+
+
+def main():
+    rng = random.Random(1)
+    check(rng)
+    for n in (500, 1000, 2000, 5000, 10000):
+        entities = scale(rng, n)
+        if n == 1000:
+            started = time.perf_counter()
+            brute_force(entities, FRAME_TIME)
+            print("n  1000  brute force %.0f ms" % (1000 * (time.perf_counter() - started)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Helpers shared by benchmarks: headless pygame, scene stub for maps initialized without application,
+application started on throwaway save file and frame timing.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from src.settings import SceneSettings
+
+SAVE_DIR = tempfile.mkdtemp(prefix="benchmarks_")
+atexit.register(shutil.rmtree, SAVE_DIR, True)
+FRAME_TIME = 1 / 60  # unit [s]
+
+
+class SceneStub:
+    """ Scene as seen by map and camera, settings and followee only """
+
+    def __init__(self, world_width: int, world_height: int, **settings) -> None:
+        self.settings = SceneSettings(dict(settings, WORLD_WIDTH=world_width, WORLD_HEIGHT=world_height))
+        self.followee = None
+
+    def get_followee(self):
+        return self.followee
+
+
+def save_path(name: str) -> str:
+    """ :return path of map save file in temporary directory, world is generated on first use of name """
+    return os.path.join(SAVE_DIR, name + ".raw")
+
+
+def start_application(scene, name: str):
+    """ :return application with scene loaded, world saved under name in temporary directory """
+    from src.application import Application
+
+    app = Application()
+    app.init()
+    app._settings._settings["MAP_PATH"] = save_path(name)
+    app.set_scene(scene)
+    while app._loading is not None:
+        app._load()
+    return app
+
+
+def step_frame(app, idle: bool = False) -> float:
+    """
+    Update, run frame jobs and render one frame as Application.loop does, scene itself is not updated
+    :param idle rest of frame time is also given to frame jobs and then slept away, frames run in real time
+    :return unit [s] of main thread cpu time, idle jobs excluded
+    """
+    from src.application import IDLE_BUDGET, IDLE_MARGIN
+    from src.parellel import get_frame_scheduler
+
+    started, cpu = time.perf_counter(), time.thread_time()
+    app._renderer.update(FRAME_TIME)
+    get_frame_scheduler().run(app._settings.get_frame_budget())
+    app._renderer.render(FRAME_TIME)
+    busy = time.thread_time() - cpu
+    if idle:
+        rest = 1000 * (FRAME_TIME - (time.perf_counter() - started)) - IDLE_MARGIN
+        if rest > 0:
+            get_frame_scheduler().run(min(rest, IDLE_BUDGET), idle=True)
+        rest = FRAME_TIME - (time.perf_counter() - started)
+        if rest > 0:
+            time.sleep(rest)
+    return busy
+
+
+def summary(samples: List[float]) -> str:
+    """ :return median, p95 and max of samples in [s] as [ms] """
+    ordered = sorted(samples)
+    return "median %.2f ms p95 %.2f ms max %.2f ms" % (
+        1000 * ordered[len(ordered) // 2], 1000 * ordered[int(len(ordered) * 0.95)], 1000 * ordered[-1])
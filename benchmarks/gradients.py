@@ -0,0 +1,96 @@
+"""
+Lit chunks baked with gradient cache cleared against baked with it warm and with every gradient drawn again as
+before the cache, bake time and time of blitting light tiles per chunk, for each tile size.
+Run from repository root: python -m benchmarks.gradients
+"""
+
+import time
+
+from benchmarks.common import SceneStub, save_path
+
+import pygame
+
+from src.map import GridType
+from src.maps.procedural import ProceduralMap
+from src.render import Camera, GradientTile, PygameRenderer
+
+CHUNK = 12  # unit [tiles]
+CHUNKS = [(col, row) for col in range(10, 30) for row in range(3, 16)]
+
+
+class Uncached(dict):
+    """ Gradient cache which keeps nothing """
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def bake(chunks):
+    """ :return unit [s] per chunk of baking chunks again and of it spent blitting light tiles """
+    blit_tile = PygameRenderer.MapRenderer.Chunk.blit_tile
+    lighting = 0.0
+
+    def timed_blit_tile(chunk, tile, grid_type, *args):
+        nonlocal lighting
+        if grid_type != GridType.LIGHTING:
+            return blit_tile(chunk, tile, grid_type, *args)
+        started = time.perf_counter()
+        blit_tile(chunk, tile, grid_type, *args)
+        lighting += time.perf_counter() - started
+
+    for chunk in chunks:
+        chunk.initialized = False
+        chunk.surface.fill((0, 0, 0, 0))
+    PygameRenderer.MapRenderer.Chunk.blit_tile = timed_blit_tile
+    try:
+        started = time.perf_counter()
+        for chunk in chunks:
+            for _ in chunk.init_surface():
+                pass
+        total = time.perf_counter() - started
+    finally:
+        PygameRenderer.MapRenderer.Chunk.blit_tile = blit_tile
+    return total / len(chunks), lighting / len(chunks)
+
+
+def compare(map_, scene, tile: int) -> None:
+    renderer = PygameRenderer.MapRenderer(Camera(scene, 1080, 768), map_, tile, tile, CHUNK, CHUNK, True, 64, 0.5)
+    chunks = [renderer.get_chunk(col, row) for col, row in CHUNKS]
+    for chunk in chunks:
+        renderer.pool.acquire(chunk)
+    bake(chunks)  # warm sprite caches
+
+    GradientTile._surfaces.clear()
+    cold, cold_lighting = bake(chunks)
+    drawn = len(GradientTile._surfaces)
+    pixels = [pygame.image.tostring(chunk.surface, "RGBA") for chunk in chunks]
+    warm, warm_lighting = min(bake(chunks) for _ in range(3))
+    mismatched = sum(pygame.image.tostring(chunk.surface, "RGBA") != p for chunk, p in zip(chunks, pixels))
+
+    surfaces, GradientTile._surfaces = GradientTile._surfaces, Uncached()
+    try:
+        uncached, uncached_lighting = bake(chunks)
+    finally:
+        GradientTile._surfaces = surfaces
+    mismatched += sum(pygame.image.tostring(chunk.surface, "RGBA") != p for chunk, p in zip(chunks, pixels))
+    renderer.exit()
+
+    print("tile %2d px  mismatched chunks %d / %d, gradients drawn %d" % (tile, mismatched, len(chunks), drawn))
+    for name, total, lighting in (("cache cleared", cold, cold_lighting), ("cache warm", warm, warm_lighting),
+                                  ("uncached", uncached, uncached_lighting)):
+        print("  %-13s bake %5.2f ms/chunk, light tiles %5.2f ms/chunk" % (name, 1000 * total, 1000 * lighting))
+
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1080, 768), 0, 32)
+    scene = SceneStub(500, 500, LIGHTING=True)
+    map_ = ProceduralMap(500, 500)
+    map_.init(scene, save_path("gradients"))
+    for tile in (16, 8, 4):
+        compare(map_, scene, tile)
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Colored light map kept up to date while camera moves and light sources change, against light map built fresh
+for same frame, and frame time of default scene with lighting grid, light map and colored light map.
+Run from repository root: python -m benchmarks.light_map
+or for frame time: python -m benchmarks.light_map --frames [--light-map] [--color] [--day-length 60]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import SceneStub, start_application, step_frame, summary
+
+import pygame
+
+from src.lighting import ColorLighting, DayCycle, LightSource, register_light_source
+from src.map import Map
+from src.parellel import get_frame_scheduler
+from src.render import Camera, PygameRenderer
+from src.tables import Tiles
+
+WIDTH, HEIGHT = 400, 300  # unit [tiles]
+FRAMES = 200
+
+
+class RandomMap(Map):
+    """ Map of random solid tiles and ash glowing in orange over background """
+
+    def __init__(self) -> None:
+        super().__init__(WIDTH, HEIGHT)
+        rng = np.random.default_rng(0)
+        self.foreground.tiles = np.where(rng.random((WIDTH, HEIGHT)) < 0.6, Tiles.DIRT, 0).astype(np.uint8)
+        self.background.tiles = np.full((WIDTH, HEIGHT), Tiles.B_DIRT, dtype=np.uint8)
+        self.background.tiles[:, :5] = Tiles.NONE
+        self.furniture.tiles = np.where(rng.random((WIDTH, HEIGHT)) < 0.01, Tiles.ASH, 0).astype(np.uint8)
+        self.update_sky(0, WIDTH)
+
+    def init(self, scene, path=None):
+        pass
+
+    def exit(self):
+        pass
+
+
+def settle(light_map) -> None:
+    """ Render light map, run frame jobs it requested to their end and render it again with their light """
+    light_map.render(0)
+    while get_frame_scheduler().get_pending():
+        get_frame_scheduler().run(1000)
+    light_map.render(0)
+
+
+def check(day_length: float) -> None:
+    map_ = RandomMap()
+    camera = Camera(SceneStub(WIDTH, HEIGHT), 1900, 800)
+    renderer = PygameRenderer.WorldRenderer.LightMapRenderer
+    rng = np.random.default_rng(0)
+    light_map = renderer(camera, map_, 16, 16, ColorLighting(map_), DayCycle(day_length) if day_length else None)
+    mismatched = 0
+    times = []
+    for step in range(FRAMES):
+        camera.pos.x += rng.integers(-90, 120)
+        camera.pos.y += rng.integers(-60, 80)
+        if step % 3 == 0:
+            col, row = int(rng.integers(0, WIDTH)), int(rng.integers(0, HEIGHT))
+            map_.furniture.set_tile(col, row, Tiles.ASH if map_.furniture.tiles[col, row] == Tiles.NONE else 0)
+        light_map.update(1 / 60)
+        started = time.perf_counter()
+        settle(light_map)
+        times.append(time.perf_counter() - started)
+
+        day_cycle = DayCycle(day_length, light_map.day_cycle.time) if day_length else None
+        fresh = renderer(camera, map_, 16, 16, ColorLighting(map_), day_cycle)
+        fresh.update(0)
+        settle(fresh)
+        fresh.exit()
+        if not np.array_equal(pygame.surfarray.array3d(light_map.surface), pygame.surfarray.array3d(fresh.surface)):
+            mismatched += 1
+    light_map.exit()
+    print("day length %3d s  mismatched %d / %d  frame %s" % (day_length, mismatched, FRAMES, summary(times)))
+
+
+def frames(settings: dict) -> None:
+    """ Frame cpu time of default scene looking at surface with settings, application runs once per process """
+    from src.scenes.default import DefaultScene
+
+    scene = DefaultScene()
+    scene.settings._settings.maps[0].update(settings)
+    app = start_application(scene, "light_map")
+    camera = app._renderer._scene_renderer.camera
+    scene.unfollow()
+    camera.pos.x, camera.pos.y = 2080.0, 600.0
+    busy = [step_frame(app) for _ in range(600)][120:]
+    print("%-50s frame cpu %s" % (", ".join("%s=%s" % item for item in settings.items()), summary(busy)))
+    app.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", action="store_true", help="measure frame time of default scene instead")
+    parser.add_argument("--light-map", action="store_true", help="lighting grid drawn as light map")
+    parser.add_argument("--color", action="store_true", help="colored light drawn as light map")
+    parser.add_argument("--day-length", type=float, default=0, help="unit [s] of day and night cycle")
+    args = parser.parse_args()
+
+    if args.frames:
+        frames({"LIGHT_MAP": args.light_map, "LIGHT_COLOR": args.color, "DAY_LENGTH": args.day_length})
+        return
+
+    pygame.init()
+    pygame.display.set_mode((1900, 800), 0, 32)
+    register_light_source(Tiles.ASH, LightSource(12, (255, 120, 40)))
+    for day_length in (0, 60):
+        check(day_length)
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+World opened from cache into memory against world save file memory mapped from it, open time and max RSS while
+camera sized region is read and edited. Each runs in its own process, world is generated in one too, since peak RSS
+of process carries over into processes it starts.
+Run from repository root: python -m benchmarks.mapped
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.common import SceneStub, save_path
+
+from src.maps.procedural import ProceduralMap
+from src.storage import world_path
+from src.tables import Tiles
+
+WORLD = 4200, 2400  # unit [tiles]
+REGION = 2000, 400, 120, 50  # unit [tiles] of col, row, width and height seen by camera
+
+
+def max_rss() -> float:
+    """ :return unit [MB] of peak resident memory of this process """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def open_world(path: str, mapped: bool, name: str) -> None:
+    """ Open cached world, read and edit one region, then exit map, edit persists only when mapped """
+    before = max_rss()
+    started = time.perf_counter()
+    map_ = ProceduralMap(*WORLD)
+    map_.init(SceneStub(*WORLD, MEMORY_MAPPED_MAP=mapped), path)
+    opened = time.perf_counter() - started
+
+    col, row, cols, rows = REGION
+    solid = (map_.foreground.region(col, row, col + cols, row + rows) != Tiles.NONE).sum()
+    lit = (map_.lighting.region(col, row, col + cols, row + rows) > -15).sum()
+    map_.foreground.set_tile(col, row, Tiles.GOLD)
+    map_.exit()
+    print("%-18s open %6.1f ms  max RSS %4.0f MB, %4.0f MB before open  (solid %d, lit %d)" % (
+        name, 1000 * opened, max_rss(), before, solid, lit))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--open", choices=["generate", "memory", "mapped"],
+                        help="generate or open world saved at --path in this process")
+    parser.add_argument("--path", help="save file of cached world")
+    parser.add_argument("--name", default="", help="name of run printed with it")
+    args = parser.parse_args()
+
+    if args.open == "generate":
+        started = time.perf_counter()
+        ProceduralMap(*WORLD).init(SceneStub(*WORLD), args.path)
+        print("%dx%d world generated and cached in %.1f s" % (*WORLD, time.perf_counter() - started))
+        return
+    if args.open:
+        open_world(args.path, args.open == "mapped", args.name or args.open)
+        return
+
+    path = save_path("mapped")
+    runs = [("generate", ""), ("memory", "in memory"), ("mapped", "mapped, first open"), ("mapped", "mapped")]
+    for mode, name in runs:
+        subprocess.run([sys.executable, "-m", "benchmarks.mapped", "--open", mode, "--path", path, "--name", name],
+                       check=True)
+
+    col, row = REGION[:2]
+    cached, world = ProceduralMap(*WORLD), ProceduralMap(*WORLD)
+    cached.init(SceneStub(*WORLD), path)
+    world.init(SceneStub(*WORLD, MEMORY_MAPPED_MAP=True), path)
+    print("edit in world save file %s, in cache %s (%s)" % (
+        world.foreground.tiles[col, row] == Tiles.GOLD, cached.foreground.tiles[col, row] == Tiles.GOLD,
+        world_path(path)))
+
+
+if __name__ == '__main__':
+    main()
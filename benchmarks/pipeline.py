@@ -0,0 +1,129 @@
+"""
+Chunks composed in bake worker processes against chunks blitted on main thread, pixels compared and main thread
+time per chunk, for each tile size.
+Run from repository root: python -m benchmarks.pipeline [--workers 1]
+"""
+
+import argparse
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from benchmarks.common import SceneStub, save_path
+
+import pygame
+
+from src.maps.procedural import ProceduralMap
+from src.parellel import get_frame_scheduler
+from src.render import Camera, PygameRenderer
+
+CHUNK = 12  # unit [tiles]
+CHUNKS = [(col, row) for col in range(10, 30) for row in range(3, 16)] + [(41, 41), (42, 40)]  # last on map border
+
+
+def drain(job) -> float:
+    """ :return unit [s] of main thread cpu time of running job to its end, waiting on its futures """
+    busy = 0.0
+    while True:
+        started = time.thread_time()
+        try:
+            waiting = next(job)
+        except StopIteration:
+            return busy + time.thread_time() - started
+        busy += time.thread_time() - started
+        if isinstance(waiting, Future):
+            waiting.result()
+
+
+def overlap(chunks) -> float:
+    """
+    Bake chunks with several of them in flight, as frame scheduler runs them
+    :return unit [s] of main thread cpu time
+    """
+    queue = deque((chunk, chunk.init_surface()) for chunk in chunks)
+    pending = []
+    busy = 0.0
+    while queue or pending:
+        get_frame_scheduler().run(1000)  # failed slots are handed back through frame jobs
+        if queue:
+            chunk, job = queue.popleft()
+            started = time.thread_time()
+            try:
+                waiting = next(job)
+            except StopIteration:
+                if not chunk.initialized:  # gave up while every slot was taken
+                    queue.append((chunk, chunk.init_surface()))
+                    if pending:
+                        pending[0][0].result()
+            else:
+                if isinstance(waiting, Future) and not waiting.done():
+                    pending.append((waiting, chunk, job))
+                else:
+                    queue.append((chunk, job))
+            busy += time.thread_time() - started
+        else:
+            pending[0][0].result()
+        for item in [item for item in pending if item[0].done()]:
+            pending.remove(item)
+            queue.append(item[1:])
+    return busy
+
+
+def make(map_, scene, tile: int, lighting: bool, workers: int):
+    renderer = PygameRenderer.MapRenderer(Camera(scene, 1080, 768), map_, tile, tile, CHUNK, CHUNK, lighting,
+                                          64, 0.5, workers)
+    chunks = [renderer.get_chunk(col, row) for col, row in CHUNKS]
+    for chunk in chunks:
+        renderer.pool.acquire(chunk)
+    return renderer, chunks
+
+
+def compare(map_, scene, tile: int, lighting: bool, workers: int) -> None:
+    blit_renderer, blitted = make(map_, scene, tile, lighting, 0)
+    for chunk in blitted[:20]:
+        drain(chunk.init_surface())  # warm sprite caches
+    for chunk in blitted[:20]:
+        chunk.initialized = False
+        chunk.surface.fill((0, 0, 0, 0))
+    started = time.perf_counter()
+    blit_busy = sum(drain(chunk.init_surface()) for chunk in blitted)
+    blit_wall = time.perf_counter() - started
+
+    renderer, composed = make(map_, scene, tile, lighting, workers)
+    for chunk in composed[:5]:
+        drain(chunk.init_surface())  # start workers
+    for chunk in composed[:5]:
+        chunk.initialized = False
+    started = time.perf_counter()
+    busy = overlap(composed)
+    wall = time.perf_counter() - started
+
+    mismatched = sum(pygame.image.tostring(a.surface, "RGBA") != pygame.image.tostring(b.surface, "RGBA")
+                     for a, b in zip(blitted, composed))
+    n = len(CHUNKS)
+    print("%-5s tile %2d px  mismatched chunks %d / %d  blit %.2f ms/chunk main, %.2f wall  "
+          "pipeline %.2f ms/chunk main, %.2f wall" % (
+              "lit" if lighting else "plain", tile, mismatched, n, 1000 * blit_busy / n, 1000 * blit_wall / n,
+              1000 * busy / n, 1000 * wall / n))
+    renderer.exit()
+    blit_renderer.exit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="bake workers of pipeline")
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1080, 768), 0, 32)
+    scene = SceneStub(500, 500, LIGHTING=True)
+    map_ = ProceduralMap(500, 500)
+    map_.init(scene, save_path("pipeline"))
+    for tile in (16, 8, 4):
+        for lighting in (False, True):
+            compare(map_, scene, tile, lighting, args.workers)
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Chunk pop-in while free camera pans over world and while it follows body falling, with frame cpu time.
+Run from repository root: python -m benchmarks.popin [--speed 1500] [--generator] [--workers 0]
+"""
+
+import argparse
+
+from benchmarks.common import FRAME_TIME, start_application, step_frame, summary
+
+from src.parellel import get_frame_scheduler
+from src.rect import Entity
+from src.vector import Vector
+
+SETTLE_FRAMES = 240  # chunks around start are baked before run
+
+
+def run(app, renderer, move, frames: int):
+    """ :return chunks visible, pop-ins and main thread cpu of frames in [s] while move is applied each frame """
+    before = renderer.get_pop_in_stats()
+    busy = []
+    for frame in range(frames):
+        move(frame)
+        busy.append(step_frame(app, idle=True))
+    after = renderer.get_pop_in_stats()
+    return after["visible"] - before["visible"], after["pop_ins"] - before["pop_ins"], busy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speed", type=float, default=1500, help="unit [px/s] of camera")
+    parser.add_argument("--generator", action="store_true", help="2000x2000 world of generator scene")
+    parser.add_argument("--workers", type=int, default=0, help="bake workers")
+    args = parser.parse_args()
+
+    if args.generator:
+        from src.maps.procedural import ProceduralMap
+        from src.scenes.generator import GeneratorScene
+
+        scene = GeneratorScene()
+        scene.settings._settings.maps[0].update(WORLD_WIDTH=2000, WORLD_HEIGHT=2000)
+        scene.map = ProceduralMap(2000, 2000)
+    else:
+        from src.scenes.default import DefaultScene
+
+        scene = DefaultScene()
+    scene.settings._settings.maps[0]["BAKE_WORKERS"] = args.workers
+    app = start_application(scene, "popin_generator" if args.generator else "popin_default")
+    world_renderer = app._renderer._scene_renderer
+    renderer, camera = world_renderer.map_renderer, world_renderer.camera
+
+    speed, scale = args.speed, args.speed / 750  # runs cover same distance at any speed
+    step = speed * FRAME_TIME
+
+    def pan(vx: float, vy: float):
+        def move(frame: int):
+            camera.pos.x += vx * FRAME_TIME
+            camera.pos.y += vy * FRAME_TIME
+        return move
+
+    def zigzag(frame: int):
+        camera.pos.x += step
+        camera.pos.y += step if (frame // int(60 / scale)) % 2 == 0 else -step
+
+    scene.unfollow()
+    results, busy = {}, []
+    for name, start, move, frames in (("pan right", (200, 2000), pan(speed, 0), int(480 / scale)),
+                                      ("pan down", (4000, 200), pan(0, speed), int(480 / scale)),
+                                      ("pan diagonal", (6500, 6500), pan(-speed, -speed), int(360 / scale)),
+                                      ("zigzag", (1000, 4000), zigzag, int(480 / scale))):
+        camera.pos.x, camera.pos.y = start
+        run(app, renderer, lambda frame: None, SETTLE_FRAMES)
+        visible, pop_ins, frame_busy = run(app, renderer, move, frames)
+        results[name] = visible, pop_ins
+        busy += frame_busy
+
+    body = Entity(3000, 100, 20, 42)
+    body.vel = Vector(0, 1400 * scale)
+    scene.follow(body)
+    camera.pos.x, camera.pos.y = 3000 - camera.size.x / 2, 100 - camera.size.y / 2
+    run(app, renderer, lambda frame: None, SETTLE_FRAMES)
+
+    def fall(frame: int):
+        body.pos.y += body.vel.y * FRAME_TIME
+
+    visible, pop_ins, frame_busy = run(app, renderer, fall, int(300 / scale))
+    results["fall"] = visible, pop_ins
+    busy += frame_busy
+
+    results["total"] = sum(v for v, _ in results.values()), sum(p for _, p in results.values())
+    for name, (visible, pop_ins) in results.items():
+        print("%-13s visible %6d pop-ins %5d rate %5.2f%%" % (name, visible, pop_ins, 100 * pop_ins / visible))
+    print("frame cpu %s" % summary(busy))
+    print(get_frame_scheduler().get_stats())
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
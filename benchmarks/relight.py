@@ -0,0 +1,145 @@
+"""
+Lighting relit incrementally after random edits against lighting computed again for whole map, and frame time
+while tunnel is mined in default scene.
+Run from repository root: python -m benchmarks.relight
+"""
+
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import start_application, step_frame, summary
+
+from src.lighting import LIGHT_DEPTH, distance_light, light_emission, light_falloff, propagate_light, sky_mask
+from src.map import GridListener, GridType, Map, sky_rows
+from src.parellel import get_frame_scheduler
+from src.tables import Tiles
+
+WIDTH, HEIGHT = 120, 100  # unit [tiles]
+EDIT_VALUES = {
+    GridType.FOREGROUND: [Tiles.NONE, Tiles.NONE, Tiles.DIRT],
+    GridType.BACKGROUND: [Tiles.NONE, Tiles.NONE, Tiles.B_DIRT],
+    GridType.FURNITURE: [Tiles.NONE, Tiles.WHITE_TORCH],
+}
+
+
+class RandomMap(Map):
+    """ Map of random solid tiles over background starting below surface """
+
+    def __init__(self, solid: float) -> None:
+        super().__init__(WIDTH, HEIGHT)
+        rng = np.random.default_rng(1)
+        self.foreground.tiles = np.where(rng.random((WIDTH, HEIGHT)) < solid, Tiles.DIRT, 0).astype(np.uint8)
+        self.foreground.tiles[:, :10] = Tiles.NONE
+        self.background.tiles = np.where(np.arange(HEIGHT)[None, :] > 30, Tiles.B_DIRT, 0).astype(np.uint8) \
+            .repeat(WIDTH, 0)
+        self.furniture.tiles = np.zeros((WIDTH, HEIGHT), dtype=np.uint8)
+        self.update_sky(0, WIDTH)
+        self.lighting.tiles = self.compute_light()
+
+    def init(self, scene, path=None):
+        pass
+
+    def exit(self):
+        pass
+
+    def compute_light(self) -> np.ndarray:
+        """ :return lighting of whole map computed from scratch """
+        sky = sky_rows((self.foreground.tiles != Tiles.NONE) | (self.background.tiles != Tiles.NONE))
+        emission = light_emission(sky_mask(sky, 0, self.height), self.furniture.tiles)
+        return distance_light(emission, LIGHT_DEPTH, light_falloff(self.foreground.tiles))
+
+
+class ChangedTiles(GridListener):
+    """ Collects tiles reported changed, as renderer passes them to propagate_light """
+
+    def __init__(self) -> None:
+        self.tiles = []
+
+    def on_tile_change(self, tile, grid_id):
+        self.tiles.append((tile.col, tile.row))
+
+    def on_region_change(self, grid, s_col: int, s_row: int, e_col: int, e_row: int):
+        self.tiles.extend((col, row) for col in range(s_col, e_col) for row in range(s_row, e_row))
+
+
+def random_edits(map_):
+    """ :return (grid, col, row, type) writes, most of them near surface """
+    edits = []
+    for _ in range(random.choice([1, 1, 1, 3])):
+        col = random.randrange(WIDTH)
+        row = random.randrange(40) if random.random() < 0.6 else random.randrange(HEIGHT)
+        grid = random.choice([map_.foreground, map_.foreground, map_.background, map_.furniture])
+        edits.append((grid, col, row, random.choice(EDIT_VALUES[grid.type])))
+    return edits
+
+
+def check(solid: float, batches: int, transactions: bool) -> None:
+    map_ = RandomMap(solid)
+    listener = ChangedTiles()
+    map_.add_map_listener(listener)
+    random.seed(2)
+    mismatched = 0
+    times, full_times = [], []
+    for _ in range(batches):
+        listener.tiles.clear()
+        if transactions:
+            with map_.transaction():
+                for grid, col, row, value in random_edits(map_):
+                    grid.set_tile(col, row, value)
+        else:
+            for grid, col, row, value in random_edits(map_):
+                grid.set_tile(col, row, value)
+        started = time.perf_counter()
+        propagate_light(map_, listener.tiles)
+        times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        expected = map_.compute_light()
+        full_times.append(time.perf_counter() - started)
+        if not np.array_equal(expected, map_.lighting.tiles):
+            mismatched += 1
+            map_.lighting.tiles = expected
+    print("%-12s solid %.1f  mismatched %d / %d  relight %s, whole map %s" % (
+        "transactions" if transactions else "single", solid, mismatched, batches, summary(times),
+        summary(full_times)))
+
+
+def mine() -> None:
+    """ Dig tunnel from lit area into dark rock, two tiles of both layers in transaction every 4 frames """
+    from src.scenes.default import DefaultScene
+
+    scene = DefaultScene()
+    app = start_application(scene, "relight")
+    camera = app._renderer._scene_renderer.camera
+    map_ = scene.map
+    scene.unfollow()
+    camera.pos.x, camera.pos.y = 2080.0, 1280.0
+    for _ in range(240):
+        step_frame(app)
+
+    s_col, s_row = int(camera.pos.x // 16) + 40, int(camera.pos.y // 16) + 20
+    busy = []
+    for i in range(60):
+        col, row = s_col + i, s_row + i // 3
+        with map_.transaction():
+            for r in (row, row + 1):
+                map_.foreground.set_tile(col, r, Tiles.NONE)
+                map_.background.set_tile(col, r, Tiles.NONE)
+        busy += [step_frame(app) for _ in range(4)]
+    while get_frame_scheduler().get_pending():
+        busy.append(step_frame(app))
+    print("mining       60 edits in %d frames, frame cpu %s" % (len(busy), summary(busy)))
+    print(get_frame_scheduler().get_stats())
+    app.quit()
+
+
+def main():
+    for solid in (0.8, 0.3):
+        check(solid, 600, False)
+        check(solid, 400, True)
+    mine()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Tile reads of Grid, allocating Tile objects against reading plain types and region views, rate and memory
+allocated per call.
+Run from repository root: python -m benchmarks.tiles
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.map import Grid, GridType
+from src.tables import Tiles
+
+SIZE = 500  # unit [tiles]
+READS = 250000
+
+
+def rate(read, cells) -> float:
+    """ :return unit [M tiles/s] of read called for each (col, row) of cells """
+    started = time.perf_counter()
+    for col, row in cells:
+        read(col, row)
+    return len(cells) / (time.perf_counter() - started) / 1e6
+
+
+def allocations(read, args) -> str:
+    """ :return memory blocks and bytes per call of read for each of args, results of every call are kept alive """
+    results = [None] * len(args)
+    blocks = sys.getallocatedblocks()
+    for i, arg in enumerate(args):
+        results[i] = read(*arg)
+    blocks = sys.getallocatedblocks() - blocks
+
+    results = [None] * len(args)
+    tracemalloc.start()
+    for i, arg in enumerate(args):
+        results[i] = read(*arg)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return "%5.2f blocks %6.1f B per call" % (blocks / len(args), size / len(args))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    grid = Grid(GridType.FOREGROUND, SIZE, SIZE)
+    grid.tiles = rng.choice([Tiles.NONE, Tiles.DIRT, Tiles.STONE], (SIZE, SIZE)).astype(np.uint8)
+    cells = [(int(col), int(row)) for col, row in rng.integers(-1, SIZE + 1, (READS, 2))]
+
+    same = all(
+        (tile.type if tile else None) == grid.type_at(col, row) and
+        [nb.type if nb else None for nb in grid.get_nbs(col, row)] == list(grid.nbs_types(col, row))
+        for (col, row), tile in zip(cells[:10000], (grid.get_tile(col, row) for col, row in cells[:10000])))
+    print("identical %s" % same)
+
+    for name, read in (("get_tile", grid.get_tile), ("type_at", grid.type_at), ("get_nbs", grid.get_nbs),
+                       ("nbs_types", grid.nbs_types)):
+        print("%-9s %6.2fM tiles/s  %s" % (name, rate(read, cells), allocations(read, cells[:10000])))
+
+    # old accessors read 12x12 view as 144 get_tile calls
+    boxes = [(col, row, col + 12, row + 12) for col, row in cells[:10000]]
+    started = time.perf_counter()
+    count = sum(grid.region(*box).size for box in boxes)
+    print("region    %6.0fM tiles/s  %s" % (count / (time.perf_counter() - started) / 1e6,
+                                            allocations(grid.region, boxes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Relighting while tiles are mined and torches are placed and removed in darkest cave of default scene.
+Run from repository root: python -m benchmarks.torches [--light-map]
+"""
+
+import argparse
+
+import numpy as np
+
+from benchmarks.common import start_application, step_frame, summary
+
+from src.parellel import get_frame_scheduler
+from src.tables import Tiles
+
+CAVE = 120, 50  # unit [tiles]
+
+
+def find_cave(map_):
+    """ :return (col, row) of region of CAVE size with most open tiles left dark """
+    cols, rows = CAVE
+    foreground, background, light = map_.foreground.tiles, map_.background.tiles, map_.lighting.tiles
+    best = None
+    for col in range(0, map_.width - cols, 40):
+        for row in range(map_.height // 3, map_.height - rows, 25):
+            region = np.s_[col:col + cols, row:row + rows]
+            dark = (foreground[region] == Tiles.NONE) & (background[region] != Tiles.NONE) & (light[region] <= -15)
+            if best is None or dark.sum() > best[0]:
+                best = dark.sum(), col, row
+    return best[1:]
+
+
+def run(app, renderer, edits, name: str) -> None:
+    """ Write one tile each frame, then run frames until relighting is done """
+    before = renderer.get_light_stats()
+    busy = []
+    for grid, col, row, value in edits:
+        grid.set_tile(int(col), int(row), value)
+        busy.append(step_frame(app))
+    while get_frame_scheduler().get_pending():
+        busy.append(step_frame(app))
+    after = renderer.get_light_stats()
+    updates = after["updates"] - before["updates"]
+    mean = (after["time"] * after["updates"] - before["time"] * before["updates"]) / updates
+    print("%-20s relights %3d mean %.2f ms, frame cpu %s" % (name, updates, mean, summary(busy)))
+
+
+def main():
+    from src.scenes.default import DefaultScene
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--light-map", action="store_true", help="lighting drawn as light map, chunks baked unlit")
+    args = parser.parse_args()
+
+    scene = DefaultScene()
+    scene.settings._settings.maps[0]["LIGHT_MAP"] = args.light_map
+    app = start_application(scene, "torches")
+    world_renderer = app._renderer._scene_renderer
+    renderer, camera = world_renderer.map_renderer, world_renderer.camera
+    map_ = scene.map
+    scene.unfollow()
+
+    map_.ensure_region(0, 0, map_.width, map_.height)
+    s_col, s_row = find_cave(map_)
+    camera.pos.x, camera.pos.y = s_col * 16, s_row * 16
+    for _ in range(240):
+        step_frame(app)
+
+    region = np.s_[s_col:s_col + CAVE[0], s_row:s_row + CAVE[1]]
+    rng = np.random.default_rng(3)
+    open_tiles = np.argwhere((map_.foreground.tiles[region] == Tiles.NONE) &
+                             (map_.background.tiles[region] != Tiles.NONE)) + (s_col, s_row)
+    spots = open_tiles[rng.permutation(len(open_tiles))[:300]]
+    solid = np.argwhere(map_.foreground.tiles[region] != Tiles.NONE) + (s_col, s_row)
+    digs = [(map_.foreground, col, row, Tiles.NONE) for col, row in solid[rng.permutation(len(solid))[:40]]]
+
+    run(app, renderer, digs[:20], "mining, no torches")
+    run(app, renderer, [(map_.furniture, col, row, Tiles.WHITE_TORCH) for col, row in spots], "placing 300 torches")
+    run(app, renderer, digs[20:], "mining among torches")
+    run(app, renderer, [(map_.furniture, col, row, Tiles.NONE) for col, row in spots[:100]], "removing 100 torches")
+    print("lit tiles in cave %d of %d" % ((map_.lighting.tiles[region] > -15).sum(), CAVE[0] * CAVE[1]))
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
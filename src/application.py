@@ -1,12 +1,15 @@
 import pygame
+import time
 from typing import Union
 
-from src.parellel import tick
+from src.parellel import get_scheduler, get_frame_scheduler
 from src.render import PygameRenderer
 from src.scene import Scene
 from src.settings import ApplicationSettings
 
 FPS = 60
+IDLE_MARGIN = 1  # unit [ms], part of frame left idle so clock keeps frame rate
+IDLE_BUDGET = 4  # unit [ms], most of idle time spent on jobs, rest is slept away by clock
 
 class LogicError(Exception):
     pass
@@ -23,6 +26,7 @@ class Application:
         self._initialized = False
         self._running = False
         self._current_scene = None
+        self._loading = None
         self._clock = None
 
     def init(self):
@@ -35,6 +39,7 @@ class Application:
             })
             self._renderer = PygameRenderer(self._settings)
             self._renderer.init()
+            get_scheduler().set_workers(self._settings.get_workers())
             self._initialized = True
             self._clock = pygame.time.Clock()
 
@@ -43,19 +48,51 @@ class Application:
             raise LogicError("You must first initialize app")
 
         self._running = self._current_scene is not None
+        frame_budget = self._settings.get_frame_budget()
+        frame_time = 1000 / FPS
 
         self._clock.tick()
         while self._running:
             delta_time = self._clock.tick(FPS) / 1000
-            tick(FPS)
+            frame_start = time.perf_counter()
             # print(self._clock.get_fps())
-            self._current_scene.get_input().handle_events(pygame.event.get(pump=True))
+            events = pygame.event.get(pump=True)
+            if any(event.type == pygame.QUIT for event in events):
+                self._running = False  # caller of loop quits, loading is cancelled then
+                break
+            if self._loading is not None:
+                self._load()  # scene takes no input while loading
+                continue
+            self._current_scene.handle_events(events)
             self._current_scene.update(delta_time)
             self._renderer.update(delta_time)
+            get_frame_scheduler().run(frame_budget)  # chunks baked now are rendered this frame
             self._renderer.render(delta_time)
 
+            # rest of frame would be slept away by clock
+            idle = frame_time - (time.perf_counter() - frame_start) * 1000 - IDLE_MARGIN
+            if idle > 0:
+                get_frame_scheduler().run(min(idle, IDLE_BUDGET), idle=True)
+
+    def _load(self):
+        """ Advance loading of current scene by one step, renderer takes scene once loading finishes """
+        try:
+            self._renderer.render_loading(next(self._loading))
+        except StopIteration:
+            self._loading = None
+            self._renderer.set_scene(self._current_scene)
+
+    def _cancel_loading(self):
+        if self._loading is not None:
+            self._loading.close()
+            self._loading = None
+
     def quit(self):
         if self._initialized:
+            self._cancel_loading()
+            # no job touches map or renderer while they exit
+            get_scheduler().shutdown(cancel_pending=True)
+            get_frame_scheduler().shutdown(cancel_pending=True)
             if self._current_scene:
                 self._current_scene.exit()
 
@@ -65,10 +102,11 @@ class Application:
             raise LogicError("Game not initialized")
 
     def set_scene(self, scene: Scene):
+        self._cancel_loading()
         self._current_scene = scene
         if not self._current_scene.is_initialized():
             scene.init(self)
-            self._renderer.set_scene(scene)
+            self._loading = iter(scene.load(self))
 
     def get_settings(self):
         return self._settings
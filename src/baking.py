@@ -0,0 +1,274 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from src.parellel import submit_sliced
+
+# Chunks composed from tile arrays in worker processes, reproducing pixel for pixel what blitting each tile with
+# pygame does. Sprites larger than tile overlap neighbours, so sprites are cut into tile sized cells and cells
+# of all tiles are blended at once, in order their tiles were blitted.
+
+PIXEL_FORMAT = "RGBA"  # byte order of composed pixels, pygame.image.frombuffer reads it, blit converts it
+
+
+def _cells(sprites: np.ndarray, masks: np.ndarray, offset: Tuple[int, int],
+           tile_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param sprites in shape (n, height, width, 4)
+    :param masks of pixels blitted, in shape (n, height, width)
+    :param offset unit [px] of sprites from top left corner of their tiles
+    :return sprites and masks cut into tile sized cells they cover, in shape
+    ([4,] cells down, cells right, n, tile_height, tile_width), sprites with channels first
+    """
+
+    n, height, width = masks.shape
+    tile_width, tile_height = tile_size
+    ox, oy = offset
+    cells_x, cells_y = -(-(ox + width) // tile_width), -(-(oy + height) // tile_height)
+
+    padded = np.zeros((n, cells_y * tile_height, cells_x * tile_width, 4), dtype=np.uint8)
+    padded[:, oy:oy + height, ox:ox + width] = sprites
+    padded_masks = np.zeros(padded.shape[:3], dtype=bool)
+    padded_masks[:, oy:oy + height, ox:ox + width] = masks
+
+    shape = (n, cells_y, tile_height, cells_x, tile_width)
+    cells = padded.reshape(shape + (4,)).transpose(5, 1, 3, 0, 2, 4)
+    cell_masks = padded_masks.reshape(shape).transpose(1, 3, 0, 2, 4)
+    return np.ascontiguousarray(cells), np.ascontiguousarray(cell_masks)
+
+
+def _bounds(cell_masks: np.ndarray) -> np.ndarray:
+    """ :return y0, y1, x0, x1 of part of each cell any sprite covers, zeros when none does """
+
+    bounds = np.zeros(cell_masks.shape[:2] + (4,), dtype=np.int32)
+    for dr in range(cell_masks.shape[0]):
+        for dc in range(cell_masks.shape[1]):
+            ys = np.nonzero(cell_masks[dr, dc].any(axis=(0, 2)))[0]
+            xs = np.nonzero(cell_masks[dr, dc].any(axis=(0, 1)))[0]
+            if len(ys):
+                bounds[dr, dc] = ys[0], ys[-1] + 1, xs[0], xs[-1] + 1
+    return bounds
+
+
+class AtlasLayer:
+    """ Sprites of one map layer in RGBA pixels """
+
+    def __init__(self, sprites: np.ndarray, masks: np.ndarray, index: np.ndarray, offset: Tuple[int, int],
+                 tile_size: Tuple[int, int]) -> None:
+        """
+        :param sprites uint8 array of shape (n, height, width, 4), smaller sprites padded
+        :param masks bool array of shape (n, height, width), pixels sprite covers
+        :param index sprite of [tile type, area, clip], -1 when tile has none
+        :param offset unit [px] of sprite from top left corner of its tile
+        """
+        self.index = index
+        self.cells, self.cell_masks = _cells(sprites, masks, offset, tile_size)
+        self.bounds = _bounds(self.cell_masks)
+
+    def get_clips(self) -> int:
+        return self.index.shape[2]
+
+
+class Atlas:
+    """ Pixels of tile sprites, everything worker needs to compose chunk """
+
+    def __init__(self, tile_width: int, tile_height: int, background: AtlasLayer, furniture: AtlasLayer,
+                 foreground: AtlasLayer, areas: np.ndarray) -> None:
+        """ :param areas index of foreground area of each of 81 tile signatures """
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.background = background
+        self.furniture = furniture
+        self.foreground = foreground
+        self.areas = areas
+
+
+def light_sprites(light: np.ndarray, tile_width: int, tile_height: int) -> np.ndarray:
+    """
+    :param light levels with one tile border of neighbours, 0 outside of map
+    :return shadow sprites of inner tiles in shape (cols * rows, tile_height, tile_width, 4), corners of tile
+    darkened by its neighbours as render.gradient draws them
+    """
+
+    def alpha(level):
+        return np.abs(level).astype(np.float64).ravel() / 15 * 255
+
+    top, down = alpha(light[1:-1, :-2]), alpha(light[1:-1, 2:])
+    left, right = alpha(light[:-2, 1:-1]), alpha(light[2:, 1:-1])
+    horizontal = np.stack([left, left + (right - left) * 0.5], axis=1).astype(np.int32)  # gradient of depth 2
+    vertical = np.stack([top, top + (down - top) * 0.5], axis=1).astype(np.int32)
+
+    # both gradients scaled up to tile, vertical blitted over horizontal
+    h = horizontal[:, None, np.arange(tile_width) * 2 // tile_width]
+    v = vertical[:, np.arange(tile_height) * 2 // tile_height, None]
+    sprites = np.zeros((len(top), tile_height, tile_width, 4), dtype=np.uint8)
+    sprites[..., 3] = v + h - v * h // 255
+    return sprites
+
+
+def _blend(dest: np.ndarray, source: np.ndarray, mask: np.ndarray) -> None:
+    """
+    Blend source pixels over dest in place where mask is set, as pygame blits per pixel alpha onto per pixel alpha
+    :param dest, source with channels first
+    """
+
+    if not dest[3].any() or source[3].min() == 255:
+        np.copyto(dest, source, where=mask)  # copied onto transparent pixels, opaque pixels cover
+        return
+
+    s = source.astype(np.uint16)
+    d = dest.astype(np.uint16)
+    s_a, d_a = s[3], d[3]
+    blended = np.empty_like(s)
+    # (((s - d) * s_a + s) >> 8) + d, rearranged to stay positive and within 16 bits
+    blended[:3] = (s[:3] * (s_a + 1) + d[:3] * (256 - s_a)) >> 8
+    product = s_a * d_a
+    blended[3] = s_a + d_a - ((product + 1 + (product >> 8)) >> 8)  # s_a + d_a - s_a * d_a // 255
+    np.copyto(blended, s, where=d_a == 0)  # onto transparent pixel source is copied
+    np.copyto(dest, blended, casting="unsafe", where=mask)
+
+
+def compose(atlas: Atlas, pixels: np.ndarray, s_col: int, s_row: int, lighting: bool, background: np.ndarray,
+            furniture: np.ndarray, foreground: np.ndarray, signatures: np.ndarray, light: np.ndarray) -> None:
+    """
+    Draw chunk tiles into pixels
+    :param pixels uint8 array of shape (height, width, 4) filled in place, channels in PIXEL_FORMAT order
+    :param s_col, s_row of first chunk tile, selects clips of sprites
+    :param background, furniture, foreground tiles of chunk in (col, row) layout
+    :param signatures of foreground tiles, see Atlas.areas
+    :param light levels of chunk tiles with one tile border of neighbours
+    """
+
+    tile_width, tile_height = atlas.tile_width, atlas.tile_height
+    cols, rows = background.shape
+    col, row = np.indices((cols, rows))
+    levels = light[1:-1, 1:-1]
+    visible = levels > -15 if lighting else np.ones((cols, rows), dtype=bool)  # lighting depth
+
+    # cells, their masks and bounds, sprite and whether it is drawn of each tile
+    layers = []
+    for atlas_layer, tiles, area in ((atlas.background, background, 0),
+                                     (atlas.furniture, furniture, 0),
+                                     (atlas.foreground, foreground, atlas.areas[signatures])):
+        clip = (s_col + col + s_row + row) % atlas_layer.get_clips()
+        index = atlas_layer.index[tiles, area, clip]
+        drawn = visible & (tiles != 0) & (index >= 0)
+        if drawn.any():
+            layers.append((atlas_layer.cells, atlas_layer.cell_masks, atlas_layer.bounds, index, drawn))
+    if lighting and (levels != 0).any():
+        sprites = light_sprites(light, tile_width, tile_height)
+        masks = np.ones(sprites.shape[:3], dtype=bool)
+        cells, cell_masks = _cells(sprites, masks, (tile_width // 2, tile_height // 2), (tile_width, tile_height))
+        layers.append((cells, cell_masks, _bounds(cell_masks), np.arange(cols * rows).reshape(cols, rows),
+                       levels != 0))
+
+    # tiles are blitted column by column, all layers of tile at once, so pixel of cell gets sprites of tiles
+    # further left first, then further up, then by layer
+    steps = sorted((-dc, -dr, layer) for layer, (_, cell_masks, *_) in enumerate(layers)
+                   for dr in range(cell_masks.shape[0]) for dc in range(cell_masks.shape[1]))
+    height, width = pixels.shape[:2]
+    cells_x, cells_y = -(-width // tile_width), -(-height // tile_height)
+    canvas = np.zeros((4, cells_x, cells_y, tile_height, tile_width), dtype=np.uint8)
+    for dc, dr, layer in steps:
+        dc, dr = -dc, -dr
+        cells, cell_masks, bounds, index, drawn = layers[layer]
+        n_c, n_r = min(cols, cells_x - dc), min(rows, cells_y - dr)
+        y0, y1, x0, x1 = bounds[dr, dc]
+        if n_c <= 0 or n_r <= 0 or y0 == y1:
+            continue
+
+        index = index[:n_c, :n_r]
+        mask = cell_masks[dr, dc, :, y0:y1, x0:x1][index] & drawn[:n_c, :n_r, None, None]
+        _blend(canvas[:, dc:dc + n_c, dr:dr + n_r, y0:y1, x0:x1], cells[:, dr, dc, :, y0:y1, x0:x1][:, index], mask)
+    canvas = canvas.transpose(2, 3, 1, 4, 0).reshape(cells_y * tile_height, cells_x * tile_width, 4)
+    pixels[:] = canvas[:height, :width]
+
+
+_atlas = None
+
+
+def _init_worker(atlas: Atlas) -> None:
+    global _atlas
+    _atlas = atlas
+
+
+def _compose_shared(name: str, size: Tuple[int, int], *args) -> None:
+    """ Process pool entry, composes chunk into shared memory block of size[1] x size[0] pixels """
+
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        pixels = np.ndarray((size[1], size[0], 4), dtype=np.uint8, buffer=memory.buf)
+        compose(_atlas, pixels, *args)
+        del pixels
+    finally:
+        memory.close()
+
+
+class BakePipeline:
+    """ Composes chunks in worker processes into shared memory slots, slot is held until its pixels are copied """
+
+    def __init__(self, workers: int, atlas: Atlas, size: Tuple[int, int]) -> None:
+        """
+        :param workers number of processes
+        :param atlas of sprites workers compose from
+        :param size unit [px] of chunk surface
+        """
+        self.size = size
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(atlas,))
+        self.slots = [shared_memory.SharedMemory(create=True, size=size[0] * size[1] * 4)
+                      for _ in range(4 * workers)]
+        self.free = list(range(len(self.slots)))
+        self.freed = None  # resolved once slot is released, waiting compose calls then compete for it again
+
+    def compose(self, *args) -> Iterator[Future]:
+        """
+        Compose chunk in free slot, see compose for args
+        :return generator yielding futures to wait for, returns slot holding pixels, release it once copied
+        """
+
+        while self.is_full():
+            if self.freed is None:
+                self.freed = Future()
+            yield self.freed
+        slot = self.free.pop()
+
+        future = self.executor.submit(_compose_shared, self.slots[slot].name, self.size, *args)
+        try:
+            while not future.done():
+                yield future
+            future.result()
+        except BaseException:
+            # worker may still write into slot, callback runs on thread of executor and hands it to main thread
+            future.add_done_callback(lambda _: self._release_later(slot))
+            raise
+        return slot
+
+    def is_full(self) -> bool:
+        """ :return True when compose has to wait for slot """
+        return not self.free
+
+    def get_buffer(self, slot: int) -> memoryview:
+        """ :return pixels of slot in PIXEL_FORMAT """
+        return self.slots[slot].buf[:self.size[0] * self.size[1] * 4]  # block may be rounded up to pages
+
+    def _release_later(self, slot: int) -> None:
+        try:
+            submit_sliced(self.release, (slot,))
+        except RuntimeError:
+            pass  # scheduler is shut down, pipeline is closed next
+
+    def release(self, slot: int) -> None:
+        """ Hand slot back, only main thread touches free slots """
+        self.free.append(slot)
+        if self.freed is not None:
+            freed, self.freed = self.freed, None
+            freed.set_result(None)
+
+    def close(self) -> None:
+        """ Stop workers and free shared memory """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for memory in self.slots:
+            memory.close()
+            memory.unlink()
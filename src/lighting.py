@@ -0,0 +1,370 @@
+from collections import deque
+from math import cos, pi
+from typing import Iterable, Iterator, List, Tuple, Union
+
+import numpy
+
+from src.map import GridListener, GridType, Tile, merge_box
+from src.parellel import submit_sliced
+from src.tables import Tiles
+
+LIGHT_DEPTH = 14  # tiles light reaches from its source, lighting grid is -LIGHT_DEPTH - 1 beyond
+SOLID_FALLOFF = 2  # levels light loses entering solid foreground tile, it loses 1 entering any other tile
+COLOR_BITS = 4  # bits of each channel level in packed color plane, holds levels up to LIGHT_DEPTH + 1
+COLOR_BLOCK = 32  # unit [tiles], color plane is computed in blocks of this size
+NIGHT_LIGHT = 0.2  # sky light is scaled by this at midnight
+DAYLIGHT_STEPS = 32  # daylight is rounded to multiples of 1 / DAYLIGHT_STEPS, light drawn changes only that often
+
+
+class LightSource:
+    """ Light emitted by tile type """
+
+    def __init__(self, intensity: int, color: Tuple[int, int, int] = (255, 255, 255)) -> None:
+        """
+        :param intensity light level of emitting tile, level drops by falloff of each tile light enters
+        :param color of light, scales intensity of each channel in colored lighting
+        """
+        self.intensity = intensity
+        self.color = color
+
+    def get_radius(self) -> int:
+        """ :return tiles light reaches through air """
+        return self.intensity - 1
+
+
+# furniture tiles emitting light, tiles open to sky emit LIGHT_DEPTH + 1
+LIGHT_SOURCES = {
+    Tiles.WHITE_TORCH: LightSource(12),
+}
+
+
+def register_light_source(tile_type: int, source: LightSource) -> None:
+    """ Make furniture tiles of type emit light, applies to lighting computed afterwards """
+    LIGHT_SOURCES[tile_type] = source
+
+
+def sky_mask(sky: numpy.ndarray, s_row: int, e_row: int) -> numpy.ndarray:
+    """
+    :param sky first covered row of columns, see Map.sky
+    :return bool mask of tiles open to sky in rows [s_row, e_row) of these columns
+    """
+    return numpy.arange(s_row, e_row)[None, :] < sky[:, None]
+
+
+def light_emission(sky: Union[None, numpy.ndarray], furniture: Union[None, numpy.ndarray] = None,
+                   depth: int = LIGHT_DEPTH) -> numpy.ndarray:
+    """
+    :param sky mask of tiles open to sky, see sky_mask, None when sky does not emit
+    :return uint8 light level tiles emit, depth + 1 open to sky, intensity of furniture light sources, 0 elsewhere
+    """
+
+    emission = numpy.zeros(sky.shape if sky is not None else furniture.shape, dtype=numpy.uint8)
+    if sky is not None:
+        emission[sky] = depth + 1
+    if furniture is not None and LIGHT_SOURCES:
+        table = numpy.zeros(max(256, max(LIGHT_SOURCES) + 1), dtype=numpy.uint8)
+        for tile_type, source in LIGHT_SOURCES.items():
+            table[tile_type] = min(source.intensity, depth + 1)
+        numpy.maximum(emission, table[furniture], out=emission)
+    return emission
+
+
+def color_emission(sky: Union[None, numpy.ndarray], furniture: numpy.ndarray, depth: int = LIGHT_DEPTH,
+                   colored: bool = True) -> numpy.ndarray:
+    """
+    :param colored sources emit their color, white of their intensity otherwise
+    :return uint8 light level each channel of tiles emits in shape (cols, rows, 3), see light_emission
+    """
+
+    emission = numpy.zeros(furniture.shape + (3,), dtype=numpy.uint8)
+    if sky is not None:
+        emission[sky] = depth + 1
+    if LIGHT_SOURCES:
+        table = numpy.zeros((max(256, max(LIGHT_SOURCES) + 1), 3), dtype=numpy.uint8)
+        for tile_type, source in LIGHT_SOURCES.items():
+            intensity = min(source.intensity, depth + 1)
+            color = source.color if colored else (255, 255, 255)
+            table[tile_type] = [round(intensity * channel / 255) for channel in color]
+        numpy.maximum(emission, table[furniture], out=emission)
+    return emission
+
+
+def light_falloff(foreground: numpy.ndarray) -> numpy.ndarray:
+    """ :return int8 levels light loses entering each tile, SOLID_FALLOFF where foreground is solid """
+    return numpy.where(foreground != Tiles.NONE, SOLID_FALLOFF, 1).astype(numpy.int8)
+
+
+def distance_light(emission: numpy.ndarray, depth: int = LIGHT_DEPTH,
+                   falloff: Union[None, numpy.ndarray] = None) -> numpy.ndarray:
+    """
+    Bounded distance of every tile to the nearest light source, path entering tile adds its falloff. Source
+    emitting less than depth + 1 starts as far as it is dimmer.
+    :param emission levels in (col, row) layout, see light_emission, color_emission adds axis of channels
+    :param depth maximal distance light reaches
+    :param falloff of tiles, see light_falloff, manhattan distance when None
+    :return int8 grid in (col, row) layout, 0 at source, -d up to -depth, -depth - 1 where light does not reach
+    """
+
+    dark = depth + 1
+    distance = (dark - numpy.minimum(emission, dark)).astype(numpy.int8)
+    if falloff is None:
+        falloff = numpy.ones(distance.shape[:2], dtype=numpy.int8)
+    if distance.ndim == 3:
+        falloff = falloff[..., None]  # same for each channel
+
+    # each pass of 4-neighbour minimum pushes the light front at least one tile further
+    nbs = numpy.empty_like(distance)
+    for _ in range(depth):
+        nbs.fill(dark)
+        numpy.minimum(nbs[1:, :], distance[:-1, :], out=nbs[1:, :])
+        numpy.minimum(nbs[:-1, :], distance[1:, :], out=nbs[:-1, :])
+        numpy.minimum(nbs[:, 1:], distance[:, :-1], out=nbs[:, 1:])
+        numpy.minimum(nbs[:, :-1], distance[:, 1:], out=nbs[:, :-1])
+        nbs += falloff
+        relaxed = numpy.minimum(distance, numpy.minimum(nbs, dark))
+        if numpy.array_equal(relaxed, distance):
+            break
+        distance = relaxed
+
+    return -distance
+
+
+def propagate_light(map_, tiles: Iterable[Tuple[int, int]], depth: int = LIGHT_DEPTH) -> List[Tuple[int, int]]:
+    """
+    Update lighting of map after tiles changed, visiting only tiles whose light depends on them. Light of changed
+    tiles and light which spread through them is removed breadth first, then light spreads again from tiles
+    bordering removed ones and from sources among removed tiles. Changes far apart are relit in separate windows.
+    :param tiles (col, row) of changed tiles
+    :return (col, row) of tiles whose light changed
+    """
+
+    tiles = [(col, row) for col, row in tiles if 0 <= col < map_.width and 0 <= row < map_.height]
+    if not tiles:
+        return []
+
+    # tiles between previous and current first covered row of column are opened to sky or covered from it
+    for col in {col for col, _ in tiles}:
+        previous, current = int(map_.update_sky(col, col + 1)[0]), int(map_.sky[col])
+        tiles.extend((col, row) for row in range(min(previous, current), min(max(previous, current), map_.height)))
+
+    # light level is depth + 1 at brightest source and 0 in dark, it changes at most depth + 1 tiles from changes,
+    # windows of changes twice as far apart neither overlap nor read tiles the other writes
+    margin = depth + 2
+    boxes = []
+    tiles = list(dict.fromkeys(tiles))  # each layer of region change reports same tiles
+    for col, row in tiles:
+        merge_box(boxes, (col, row, col + 1, row + 1), 2 * margin)
+    lit = []
+    for s_col, s_row, e_col, e_row in boxes:
+        window = (max(0, s_col - margin), max(0, s_row - margin),
+                  min(map_.width, e_col + margin), min(map_.height, e_row + margin))
+        lit.extend(_propagate_window(map_, [(col, row) for col, row in tiles
+                                            if s_col <= col < e_col and s_row <= row < e_row], window, depth))
+    return lit
+
+
+def _propagate_window(map_, tiles: List[Tuple[int, int]], window: Tuple[int, int, int, int],
+                      depth: int) -> List[Tuple[int, int]]:
+    """ Relight changed tiles reading and writing only tiles of window, see propagate_light """
+
+    s_col, s_row, e_col, e_row = window
+    current = map_.lighting.region(*window)
+    foreground = map_.foreground.region(*window)
+    emission = light_emission(sky_mask(map_.sky[s_col:e_col], s_row, e_row), map_.furniture.region(*window),
+                              depth).tolist()
+    falloff = light_falloff(foreground).tolist()
+    levels = numpy.maximum(current.astype(numpy.int32) + depth + 1, 0).tolist()
+    cols, rows = e_col - s_col, e_row - s_row
+
+    removal = deque()
+    removed = []  # tiles emitting light once removed
+    spread = deque()
+    for col, row in tiles:
+        col, row = col - s_col, row - s_row
+        if levels[col][row]:
+            removal.append((col, row, levels[col][row]))
+            levels[col][row] = 0
+        removed.append((col, row))
+        # neighbours light it again, also when it was dark
+        spread.extend(nb for nb in ((col, row - 1), (col, row + 1), (col - 1, row), (col + 1, row))
+                      if 0 <= nb[0] < cols and 0 <= nb[1] < rows)
+
+    while removal:
+        col, row, level = removal.popleft()
+        for n_col, n_row in ((col, row - 1), (col, row + 1), (col - 1, row), (col + 1, row)):
+            if 0 <= n_col < cols and 0 <= n_row < rows:
+                n_level = levels[n_col][n_row]
+                if n_level == 0:
+                    continue
+                if n_level < level:  # may have been lit through removed tile
+                    levels[n_col][n_row] = 0
+                    removal.append((n_col, n_row, n_level))
+                    if emission[n_col][n_row]:
+                        removed.append((n_col, n_row))
+                else:
+                    spread.append((n_col, n_row))
+
+    for col, row in removed:
+        if emission[col][row] > levels[col][row]:
+            levels[col][row] = emission[col][row]
+            spread.append((col, row))
+
+    while spread:
+        col, row = spread.popleft()
+        level = levels[col][row]
+        for n_col, n_row in ((col, row - 1), (col, row + 1), (col - 1, row), (col + 1, row)):
+            if 0 <= n_col < cols and 0 <= n_row < rows:
+                n_level = level - falloff[n_col][n_row]
+                if n_level > levels[n_col][n_row]:
+                    levels[n_col][n_row] = n_level
+                    spread.append((n_col, n_row))
+
+    light = numpy.array(levels, dtype=numpy.int8) - (depth + 1)
+    changed = light != current
+    current[changed] = light[changed]
+    changed_cols, changed_rows = numpy.nonzero(changed)
+    return list(zip((changed_cols + s_col).tolist(), (changed_rows + s_row).tolist()))
+
+
+def pack_color(levels: numpy.ndarray) -> numpy.ndarray:
+    """ :return uint16 of levels of shape (..., 3), red in highest COLOR_BITS bits """
+    levels = levels.astype(numpy.uint16)
+    return levels[..., 0] << 2 * COLOR_BITS | levels[..., 1] << COLOR_BITS | levels[..., 2]
+
+
+def unpack_color(packed: numpy.ndarray) -> numpy.ndarray:
+    """ :return uint8 levels of shape (..., 3) of packed colors """
+    mask = (1 << COLOR_BITS) - 1
+    return numpy.stack([packed >> 2 * COLOR_BITS & mask, packed >> COLOR_BITS & mask, packed & mask],
+                       axis=-1).astype(numpy.uint8)
+
+
+class ColorLighting(GridListener):
+    """
+    Colored light of map in uint16 plane next to map lighting, each channel spread as lighting grid is. Plane is
+    computed in blocks by frame jobs once requested and blocks around changed tiles are computed again.
+    """
+
+    def __init__(self, map_, depth: int = LIGHT_DEPTH, sky: bool = True, colored: bool = True) -> None:
+        """
+        :param sky tiles open to sky emit light, plane holds only light of furniture sources otherwise
+        :param colored sources emit their color, see color_emission
+        """
+        self.map = map_
+        self.depth = depth
+        self.colored = colored
+        self.sky = map_.sky.copy() if sky else None  # first covered rows plane was computed with
+        self.plane = numpy.zeros((map_.width, map_.height), dtype=numpy.uint16)  # packed levels, see pack_color
+        self.stale = numpy.ones((-(-map_.width // COLOR_BLOCK), -(-map_.height // COLOR_BLOCK)), dtype=bool)
+        self.computed = 0  # unit [tiles] computed
+        map_.add_map_listener(self)
+
+    def exit(self) -> None:
+        self.map.remove_map_listener(self)
+
+    def on_tile_change(self, tile: Tile, grid_id: GridType):
+        self.invalidate(tile.col, tile.row, tile.col + 1, tile.row + 1)
+        self.update_sky(tile.col, tile.col + 1)
+
+    def on_region_change(self, grid, s_col: int, s_row: int, e_col: int, e_row: int):
+        self.invalidate(s_col, s_row, e_col, e_row)
+        self.update_sky(s_col, e_col)
+
+    def update_sky(self, s_col: int, e_col: int) -> None:
+        """ Find first covered rows of columns [s_col, e_col) again, tiles between old and new one changed """
+
+        if self.sky is None:
+            return
+        s_col, e_col = max(0, s_col), min(self.map.width, e_col)
+        current = self.map.find_sky(s_col, e_col)
+        previous = self.sky[s_col:e_col]
+        for col in numpy.nonzero(previous != current)[0]:
+            self.invalidate(s_col + col, min(previous[col], current[col]), s_col + col + 1,
+                            max(previous[col], current[col]))
+        previous[:] = current
+
+    def invalidate(self, s_col: int, s_row: int, e_col: int, e_row: int) -> None:
+        """ Tiles of [s_col, e_col) x [s_row, e_row) changed, light up to depth + 1 tiles around them may differ """
+        margin = self.depth + 1
+        self.stale[max(0, (s_col - margin) // COLOR_BLOCK):max(0, -(-(e_col + margin) // COLOR_BLOCK)),
+                   max(0, (s_row - margin) // COLOR_BLOCK):max(0, -(-(e_row + margin) // COLOR_BLOCK))] = True
+
+    def region(self, s_col: int, s_row: int, e_col: int, e_row: int) -> numpy.ndarray:
+        """
+        :return view of packed levels of [s_col, e_col) x [s_row, e_row) clipped to map, see Grid.region, stale
+        blocks keep light they had until request computes them
+        """
+
+        s_col, s_row = max(0, s_col), max(0, s_row)
+        e_col, e_row = max(s_col, min(self.map.width, e_col)), max(s_row, min(self.map.height, e_row))
+        return self.plane[s_col:e_col, s_row:e_row]
+
+    def request(self, s_col: int, s_row: int, e_col: int, e_row: int, priority: float = 0) -> None:
+        """ Compute stale blocks touching [s_col, e_col) x [s_row, e_row) in frame job, see compute """
+
+        s_col, s_row = max(0, s_col), max(0, s_row)
+        e_col, e_row = min(self.map.width, e_col), min(self.map.height, e_row)
+        if s_col >= e_col or s_row >= e_row:
+            return
+        stale = self.stale[s_col // COLOR_BLOCK:-(-e_col // COLOR_BLOCK), s_row // COLOR_BLOCK:-(-e_row // COLOR_BLOCK)]
+        if stale.any():
+            submit_sliced(self.compute, (s_col, s_row, e_col, e_row), priority, key=self)
+
+    def compute(self, s_col: int, s_row: int, e_col: int, e_row: int) -> Iterator[None]:
+        """ Compute stale blocks touching [s_col, e_col) x [s_row, e_row), one row of blocks each slice """
+
+        s_bc, e_bc = s_col // COLOR_BLOCK, -(-e_col // COLOR_BLOCK)
+        for block_row in range(s_row // COLOR_BLOCK, -(-e_row // COLOR_BLOCK)):
+            block_cols = numpy.nonzero(self.stale[s_bc:e_bc, block_row])[0]
+            if len(block_cols):
+                self.compute_blocks(s_bc + block_cols[0], block_row, s_bc + block_cols[-1] + 1, block_row + 1)
+                yield
+
+    def compute_blocks(self, s_bc: int, s_br: int, e_bc: int, e_br: int) -> None:
+        """ Compute blocks [s_bc, e_bc) x [s_br, e_br) at once """
+
+        r_s_col, r_s_row = s_bc * COLOR_BLOCK, s_br * COLOR_BLOCK
+        r_e_col = min(self.map.width, e_bc * COLOR_BLOCK)
+        r_e_row = min(self.map.height, e_br * COLOR_BLOCK)
+
+        # light of region depends on sources up to depth + 1 tiles further
+        margin = self.depth + 1
+        w_s_col, w_s_row = max(0, r_s_col - margin), max(0, r_s_row - margin)
+        w_e_col, w_e_row = min(self.map.width, r_e_col + margin), min(self.map.height, r_e_row + margin)
+        window = (w_s_col, w_s_row, w_e_col, w_e_row)
+        self.map.ensure_region(*window)
+        self.update_sky(w_s_col, w_e_col)  # regions generated on demand are not reported
+
+        foreground = self.map.foreground.region(*window)
+        sky = sky_mask(self.sky[w_s_col:w_e_col], w_s_row, w_e_row) if self.sky is not None else None
+        emission = color_emission(sky, self.map.furniture.region(*window), self.depth, self.colored)
+        if (emission == emission[..., :1]).all():  # only white light, channels spread alike
+            light = distance_light(emission[..., 0], self.depth, light_falloff(foreground))[..., None]
+        else:
+            light = distance_light(emission, self.depth, light_falloff(foreground))
+        light = light[r_s_col - w_s_col:r_e_col - w_s_col, r_s_row - w_s_row:r_e_row - w_s_row]
+        self.plane[r_s_col:r_e_col, r_s_row:r_e_row] = pack_color(numpy.broadcast_to(light + self.depth + 1,
+                                                                                     light.shape[:2] + (3,)))
+        self.stale[s_bc:e_bc, s_br:e_br] = False
+        self.computed += (r_e_col - r_s_col) * (r_e_row - r_s_row)
+
+
+class DayCycle:
+    """ Time of day, scales light of sky from full at noon down to NIGHT_LIGHT at midnight """
+
+    def __init__(self, day_length: float, time: float = 0.5) -> None:
+        """
+        :param day_length unit [s] of one day, time stands still when 0
+        :param time of day as fraction of day, 0 at midnight, 0.5 at noon
+        """
+        self.day_length = day_length
+        self.time = time
+
+    def update(self, delta_time: float) -> None:
+        if self.day_length > 0:
+            self.time = (self.time + delta_time / self.day_length) % 1
+
+    def get_daylight(self) -> float:
+        """ :return factor of sky light, multiple of 1 / DAYLIGHT_STEPS """
+        daylight = NIGHT_LIGHT + (1 - NIGHT_LIGHT) * (1 - cos(2 * pi * self.time)) / 2
+        return round(daylight * DAYLIGHT_STEPS) / DAYLIGHT_STEPS
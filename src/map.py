@@ -1,7 +1,12 @@
 import numpy
 from abc import abstractmethod, ABC
+from contextlib import contextmanager, ExitStack
 from enum import IntEnum
-from typing import Union, List
+from typing import Union, List, Tuple
+
+from src.tables import Tiles
+
+REGION_GAP = 16  # unit [tiles], writes of transaction closer than this to each other are one region change
 
 
 class GridType(IntEnum):
@@ -25,6 +30,32 @@ class GridListener(ABC):
     def on_tile_change(self, tile: Tile, grid_id: GridType):
         pass
 
+    def on_region_change(self, grid, s_col: int, s_row: int, e_col: int, e_row: int):
+        """ Tiles of grid in [s_col, e_col) x [s_row, e_row) changed at once, by default reported tile by tile """
+        for col in range(s_col, e_col):
+            for row in range(s_row, e_row):
+                self.on_tile_change(grid.get_tile(col, row), grid.type)
+
+
+def merge_box(boxes: List[Tuple[int, int, int, int]], box: Tuple[int, int, int, int], gap: int) -> None:
+    """
+    Add box (s_col, s_row, e_col, e_row) to boxes, box is merged with boxes closer than gap to it, boxes left are
+    at least gap apart
+    """
+
+    s_col, s_row, e_col, e_row = box
+    merged = True
+    while merged:
+        merged = False
+        for i, (b_s_col, b_s_row, b_e_col, b_e_row) in enumerate(boxes):
+            if b_s_col - gap < e_col and s_col < b_e_col + gap and b_s_row - gap < e_row and s_row < b_e_row + gap:
+                s_col, s_row = min(s_col, b_s_col), min(s_row, b_s_row)
+                e_col, e_row = max(e_col, b_e_col), max(e_row, b_e_row)
+                del boxes[i]
+                merged = True  # grown box may reach boxes it missed before
+                break
+    boxes.append((s_col, s_row, e_col, e_row))
+
 
 class Grid:
     tiles: numpy.ndarray
@@ -39,6 +70,8 @@ class Grid:
         self.height = height
         self.listeners = set()
         self.type = grid_type
+        self._transactions = 0
+        self._dirty = []  # bounding boxes of writes made in open transaction, see merge_box
 
     def add_listener(self, listener):
         self.listeners.add(listener)
@@ -73,19 +106,73 @@ class Grid:
 
     def get_tile(self, col: int, row: int) -> Union[None, Tile]:
         if 0 <= col < self.width and 0 <= row < self.height:
-            return Tile(col, row, int(self.tiles[col, row]))
+            return Tile(col, row, self.tiles.item(col, row))
         else:
             return None
 
+    def type_at(self, col: int, row: int, default=None):
+        """ :return type of tile as int without allocating Tile, default outside of grid """
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return self.tiles.item(col, row)
+        else:
+            return default
+
+    def nbs_types(self, col: int, row: int, default=None) -> Tuple:
+        """ :return top, down, left, right neighbour types in this order, default outside of grid """
+
+        return (self.type_at(col, row - 1, default),
+                self.type_at(col, row + 1, default),
+                self.type_at(col - 1, row, default),
+                self.type_at(col + 1, row, default))
+
+    def region(self, s_col: int, s_row: int, e_col: int, e_row: int) -> numpy.ndarray:
+        """
+        :return view of tiles [s_col, e_col) x [s_row, e_row) clipped to grid, view starts at max(0, s_col),
+        max(0, s_row) and writes into it bypass listeners
+        """
+
+        s_col, s_row = max(0, s_col), max(0, s_row)
+        e_col, e_row = max(s_col, min(self.width, e_col)), max(s_row, min(self.height, e_row))
+        return self.tiles[s_col:e_col, s_row:e_row]
+
     def set_tile(self, col: int, row: int, tile_type: int) -> None:
         if 0 <= col < self.width and 0 <= row < self.height:
             self.tiles[col, row] = tile_type
-            tile = self.get_tile(col, row)
-            for listener in self.listeners:
-                listener.on_tile_change(tile, self.type)
+            if self._transactions:
+                self._extend_dirty(col, row, col + 1, row + 1)
+            else:
+                tile = self.get_tile(col, row)
+                for listener in list(self.listeners):
+                    listener.on_tile_change(tile, self.type)
         else:
             raise AttributeError
 
+    @contextmanager
+    def transaction(self):
+        """
+        Defer notifications of writes made inside, listeners then get one region change for each group of writes
+        closer than REGION_GAP to each other. Transactions nest, only closing the outermost one notifies.
+        """
+
+        self._transactions += 1
+        try:
+            yield self
+        finally:
+            self._transactions -= 1
+            if self._transactions == 0 and self._dirty:
+                dirty, self._dirty = self._dirty, []
+                for box in dirty:
+                    for listener in list(self.listeners):
+                        listener.on_region_change(self, *box)
+
+    def _extend_dirty(self, s_col: int, s_row: int, e_col: int, e_row: int) -> None:
+        merge_box(self._dirty, (s_col, s_row, e_col, e_row), REGION_GAP)
+
+
+def sky_rows(covered: numpy.ndarray) -> numpy.ndarray:
+    """ :return first covered row of each column of bool mask in (col, row) layout, number of rows when none is """
+    return numpy.where(covered.any(axis=1), covered.argmax(axis=1), covered.shape[1]).astype(numpy.int32)
+
 
 class Map(ABC):
     """ Implementation of map with layer switching, tiles are represented by int """
@@ -102,15 +189,56 @@ class Map(ABC):
         self.background = Grid(GridType.BACKGROUND, width, height)
         self.furniture = Grid(GridType.FURNITURE, width, height)
         self.lighting = Grid(GridType.LIGHTING, width, height)
+        self.sky = numpy.zeros(width, dtype=numpy.int32)  # first row of each column not open to sky, see update_sky
 
     @abstractmethod
-    def init(self, scene):
+    def init(self, scene, path: Union[None, str] = None):
+        """
+        :param scene
+        :param path save file of map, None keeps map only in memory
+        """
         pass
 
     @abstractmethod
     def exit(self):
         pass
 
+    def ensure_region(self, s_col: int, s_row: int, e_col: int, e_row: int) -> None:
+        """ Make sure tiles of [s_col, e_col) x [s_row, e_row) exist, maps generated on demand override this """
+        pass
+
+    def is_covered(self, s_col: int, s_row: int, e_col: int, e_row: int) -> numpy.ndarray:
+        """ :return bool mask of tiles in region with foreground or background, they shade sky, see Grid.region """
+        return (self.foreground.region(s_col, s_row, e_col, e_row) != Tiles.NONE) | \
+               (self.background.region(s_col, s_row, e_col, e_row) != Tiles.NONE)
+
+    def find_sky(self, s_col: int, e_col: int) -> numpy.ndarray:
+        """ :return first covered row of columns [s_col, e_col) clipped to map, O(height) per column """
+        return sky_rows(self.is_covered(s_col, 0, e_col, self.height))
+
+    def update_sky(self, s_col: int, e_col: int) -> numpy.ndarray:
+        """
+        Find first covered row of columns [s_col, e_col) again, tiles above it are open to sky
+        :return previous rows of columns clipped to map
+        """
+
+        s_col, e_col = max(0, s_col), min(self.width, e_col)
+        previous = self.sky[s_col:e_col].copy()
+        self.sky[s_col:e_col] = self.find_sky(s_col, e_col)
+        return previous
+
+    def get_grids(self) -> List[Grid]:
+        """ :return all layers of map """
+        return [self.background, self.furniture, self.foreground, self.lighting]
+
+    @contextmanager
+    def transaction(self):
+        """ Open transaction on every listened layer, see Grid.transaction """
+        with ExitStack() as stack:
+            for grid in (self.foreground, self.background, self.furniture):
+                stack.enter_context(grid.transaction())
+            yield self
+
     def add_map_listener(self, listener):
         self.foreground.add_listener(listener)
         self.background.add_listener(listener)
@@ -0,0 +1,166 @@
+import noise
+import numpy as np
+
+# Vectorized port of the improved Perlin noise from the `noise` package (_perlin.c).
+# All arithmetic is carried out in float32 in the same order as the C extension,
+# so the results are bit-identical to noise.pnoise1 / noise.pnoise2.
+
+_PERM = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140,
+    36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120,
+    234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32, 57, 177, 33,
+    88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71,
+    134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133,
+    230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161,
+    1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130,
+    116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226, 250,
+    124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227,
+    47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44,
+    154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98,
+    108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34,
+    242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14,
+    239, 107, 49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121,
+    50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72, 243,
+    141, 128, 195, 78, 66, 215, 61, 156, 180,
+] * 2, dtype=np.int32)
+
+_GRAD3 = np.array([
+    [1, 1], [-1, 1], [1, -1], [-1, -1],
+    [1, 0], [-1, 0], [1, 0], [-1, 0],
+    [0, 1], [0, -1], [0, 1], [0, -1],
+    [1, 0], [-1, 0], [0, -1], [0, 1],
+], dtype=np.float32)
+
+# gradient components addressed by the second level hash, grad2(PERM[h], ...) == x * _GRAD_X[h] + y * _GRAD_Y[h]
+_GRAD_X = _GRAD3[_PERM & 15, 0]
+_GRAD_Y = _GRAD3[_PERM & 15, 1]
+
+_ONE = np.float32(1)
+
+
+def _fade(t):
+    return t * t * t * (t * (t * np.float32(6) - np.float32(15)) + np.float32(10))
+
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
+
+
+def _grad1(h, x):
+    g = np.where(h & 8, np.float32(-1), ((h & 7) + 1).astype(np.float32))
+    return g * x
+
+
+def _grad2(h, x, y):
+    return x * _GRAD_X[h] + y * _GRAD_Y[h]
+
+
+def _noise1(x, repeat: int, base: int):
+    fl = np.floor(x)
+    i = fl.astype(np.int32) % repeat
+    ii = (i + 1) % repeat
+    i = (i & 255) + base
+    ii = (ii & 255) + base
+
+    x = x - fl
+    fx = _fade(x)
+
+    return _lerp(fx, _grad1(_PERM[i], x), _grad1(_PERM[ii], x - _ONE)) * np.float32(0.4)
+
+
+def _noise2(x, y, repeatx, repeaty, base: int):
+    """ :return (noise, overflow) where overflow marks cells hashed past the permutation table """
+
+    i = np.floor(np.fmod(x, repeatx)).astype(np.int32)
+    j = np.floor(np.fmod(y, repeaty)).astype(np.int32)
+    ii = np.fmod(i + 1, repeatx).astype(np.int32)
+    jj = np.fmod(j + 1, repeaty).astype(np.int32)
+    i = (i & 255) + base
+    j = (j & 255) + base
+    ii = (ii & 255) + base
+    jj = (jj & 255) + base
+
+    x = x - np.floor(x)
+    y = y - np.floor(y)
+    fx = _fade(x)
+    fy = _fade(y)
+
+    a = _PERM[i]
+    b = _PERM[ii]
+    overflow = np.maximum(a, b) + np.maximum(j, jj) >= len(_PERM)
+
+    aa = _PERM[(a + j) & 511]
+    ab = _PERM[(a + jj) & 511]
+    ba = _PERM[(b + j) & 511]
+    bb = _PERM[(b + jj) & 511]
+
+    value = _lerp(fy, _lerp(fx, _grad2(aa, x, y),
+                            _grad2(ba, x - _ONE, y)),
+                  _lerp(fx, _grad2(ab, x, y - _ONE),
+                        _grad2(bb, x - _ONE, y - _ONE)))
+    return value, overflow
+
+
+def pnoise1(x, octaves: int = 1, persistence: float = 0.5, lacunarity: float = 2.0, repeat: int = 1024,
+            base: int = 0) -> np.ndarray:
+    """ Vectorized noise.pnoise1, x is array like """
+
+    x = np.asarray(x, dtype=np.float32)
+    persistence = np.float32(persistence)
+    lacunarity = np.float32(lacunarity)
+
+    freq = np.float32(1)
+    amp = np.float32(1)
+    max_ = np.float32(0)
+    total = np.zeros(x.shape, dtype=np.float32)
+    for _ in range(octaves):
+        total += _noise1(x * freq, int(repeat * freq), base) * amp
+        max_ += amp
+        freq *= lacunarity
+        amp *= persistence
+    return (total / max_).astype(np.float64)
+
+
+def pnoise2(x, y, octaves: int = 1, persistence: float = 0.5, lacunarity: float = 2.0, repeatx: float = 1024,
+            repeaty: float = 1024, base: int = 0) -> np.ndarray:
+    """
+    Vectorized noise.pnoise2, x and y are broadcast against each other. Lattice and fade terms are evaluated
+    before broadcasting, so passing a column of x and a row of y is much cheaper than two full grids.
+
+    With a non-zero base the C extension can hash past the end of its permutation table, the value it reads there
+    depends on the build. Such cells are recomputed with noise.pnoise2 to stay identical to the scalar path.
+    """
+
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    shape = np.broadcast_shapes(x.shape, y.shape)
+    persistence = np.float32(persistence)
+    lacunarity = np.float32(lacunarity)
+    repeatx = np.float32(repeatx)
+    repeaty = np.float32(repeaty)
+
+    freq = np.float32(1)
+    amp = np.float32(1)
+    max_ = np.float32(0)
+    total = np.zeros(shape, dtype=np.float32)
+    overflow = np.zeros(shape, dtype=bool)
+    for _ in range(octaves):
+        value, overflow_ = _noise2(x * freq, y * freq, repeatx * freq, repeaty * freq, base)
+        total += value * amp
+        overflow |= overflow_
+        max_ += amp
+        freq *= lacunarity
+        amp *= persistence
+    result = (total / max_).astype(np.float64)
+
+    x = np.broadcast_to(x, shape)
+    y = np.broadcast_to(y, shape)
+    for index in zip(*np.nonzero(overflow)):
+        result[index] = noise.pnoise2(float(x[index]), float(y[index]),
+                                      octaves=octaves,
+                                      persistence=float(persistence),
+                                      lacunarity=float(lacunarity),
+                                      repeatx=float(repeatx),
+                                      repeaty=float(repeaty),
+                                      base=base)
+    return result
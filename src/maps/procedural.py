@@ -1,8 +1,18 @@
-import noise
+import hashlib
 import numpy as np
 import random
-
-from src.map import Map
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from enum import Enum
+from multiprocessing import shared_memory
+from typing import Union, Dict, Iterator, Tuple
+
+from src.lighting import LIGHT_DEPTH, SOLID_FALLOFF, light_emission, light_falloff, distance_light, sky_mask
+from src.map import Map, GridListener, Tile, GridType, sky_rows
+from src.maps.perlin import pnoise1, pnoise2
+from src.parellel import submit
+from src.storage import copy_planes, read_planes, world_path, write_planes
 from src.tables import Tiles
 
 sky = [155, 209, 255]
@@ -23,37 +33,313 @@ cave_bg = [84, 57, 42]
 caverns_bg = [72, 64, 57]
 
 
-class ProceduralMap(Map):
+# bump when tile classification or lighting changes, invalidates saved worlds
+GENERATOR_VERSION = 3
+
+SEED = 47
+BANDS = 16  # world is generated in at least this many row bands, each band is one generation step
+SKY_PLANE = "SKY"  # save file plane of first covered row of each column, map is loaded without scanning it
+
+# noise parameters, surface scale is relative to world height
+SURFACE_NOISE = {"scale": 4, "octaves": 6, "persistence": 0.6, "lacunarity": 2.0}
+CAVE_NOISE = {"scale": 65, "octaves": 6, "persistence": 0.5, "lacunarity": 2.0}
+ORE_NOISE = {"scale": 30, "octaves": 3, "persistence": 0.9, "lacunarity": 2.}
+FILLING_NOISE = {"scale": 40, "octaves": 4, "persistence": 0.4, "lacunarity": 4.}
+
+
+def surface_noise(cols: np.ndarray, height: int, s: int) -> np.ndarray:
+    """ :return surface noise for each column """
+    scale = height * SURFACE_NOISE["scale"]
+
+    return pnoise1(cols / scale,
+                   octaves=SURFACE_NOISE["octaves"],
+                   persistence=SURFACE_NOISE["persistence"],
+                   lacunarity=SURFACE_NOISE["lacunarity"],
+                   repeat=1024,
+                   base=s)
+
+
+def _noise(rows: np.ndarray, cols: np.ndarray, s: int, params: dict) -> np.ndarray:
+    scale = params["scale"]
+
+    return pnoise2(rows[:, None] / scale,
+                   cols[None, :] / scale,
+                   octaves=params["octaves"],
+                   persistence=params["persistence"],
+                   lacunarity=params["lacunarity"],
+                   repeatx=1024,
+                   repeaty=1024,
+                   base=s)
+
+
+def cave_noise(rows: np.ndarray, cols: np.ndarray, s: int) -> np.ndarray:
+    """ :return cave noise of shape (rows, cols) """
+    return _noise(rows, cols, s, CAVE_NOISE)
+
+
+def ore_noise(rows: np.ndarray, cols: np.ndarray, s: int) -> np.ndarray:
+    """ :return ore noise of shape (rows, cols) """
+    return _noise(rows, cols, s, ORE_NOISE)
+
+
+def filling_noise(rows: np.ndarray, cols: np.ndarray, s: int) -> np.ndarray:
+    """ :return filling noise of shape (rows, cols) """
+    return _noise(rows, cols, s, FILLING_NOISE)
+
+
+def cache_key(seed: int, width: int, height: int) -> str:
+    """ :return key identifying world generated with these and module parameters """
+
+    params = (GENERATOR_VERSION, seed, width, height, LIGHT_DEPTH, SOLID_FALLOFF,
+              SURFACE_NOISE, CAVE_NOISE, ORE_NOISE, FILLING_NOISE)
+    return hashlib.sha1(repr(params).encode()).hexdigest()
+
+
+def layer_bounds(height: int):
+    """ :return end rows of sky, surface, cave and caverns layers, hell spans the rest """
+
+    sky_end = int(height / 10)  # 1 / 10
+    surface_end = sky_end + int(2 * height / 10)  # 2 / 10
+    cave_end = surface_end + int(2 * height / 10)  # 2 / 10
+    caverns_end = cave_end + int(4 * height / 10)  # 4 / 10
+    return sky_end, surface_end, cave_end, caverns_end
 
-    def init(self, scene):
+
+def lerp(v0, v1, t):
+    return (1 - t) * v0 + t * v1
+
+
+def map_tiles(start: int, end: int, height: int, surface, caves, filling, cop, ld, sil, gd) -> np.ndarray:
+    """
+    Classify tiles of rows [start, end), noise arrays hold only these rows.
+    :return tiles of shape (end - start, width)
+    """
+
+    sky_end, surface_end, cave_end, caverns_end = layer_bounds(height)
+    tiles = np.zeros((end - start, len(surface)), dtype=np.uint8)
+
+    def layer(min_i: int, max_i: int):
+        """ :return band slice of layer rows [min_i, max_i), their indexes and progress through layer """
+        s, e = max(min_i, start), min(max_i, end)
+        rows = np.arange(s, e)[:, None]
+        return slice(s - start, max(s, e) - start), rows, (rows - min_i) / (max_i - 1 - min_i)
+
+    # sky (1 / 10) stays Tiles.NONE
+
+    # surface (2 / 10)
+    k, rows, p = layer(sky_end, surface_end)
+    if k.stop > k.start:
+        min_i = sky_end  # surface min value is 30% of dirt caves height (1.5 / 10)
+        ground = rows - min_i > surface * min_i
+        ore = np.select([cop[k] < -0.25,  # copper
+                         ld[k] < -0.35,  # lead
+                         filling[k] < lerp(-0.5, -0.2, p)],  # stone
+                        [Tiles.COPPER, Tiles.LEAD, Tiles.STONE],
+                        Tiles.DIRT)  # dirt
+        tiles[k] = np.where(ground & (caves[k] < lerp(0.25, 0.2, p)), ore, Tiles.NONE)  # cave bg
+
+    # caves (2 / 10)
+    k, _, p = layer(surface_end, cave_end)
+    if k.stop > k.start:
+        ore = np.select([cop[k] < -0.35,  # copper
+                         ld[k] < -0.28,  # lead
+                         sil[k] < -0.35,  # silver
+                         gd[k] < -0.4,  # gold
+                         filling[k] < lerp(-0.2, 0.1, p)],  # stone
+                        [Tiles.COPPER, Tiles.LEAD, Tiles.SILVER, Tiles.GOLD, Tiles.STONE],
+                        Tiles.DIRT)  # dirt
+        tiles[k] = np.select([caves[k] < lerp(0.2, 0.15, p),
+                              caves[k] < 0.45,  # cave bg
+                              caves[k] < 1.0],  # stone
+                             [ore, Tiles.NONE, Tiles.STONE],
+                             Tiles.NONE)
+
+    # caverns (4 / 10)
+    k, _, p = layer(cave_end, caverns_end)
+    if k.stop > k.start:
+        ore = np.select([cop[k] < -0.4,  # copper
+                         ld[k] < -0.3,  # lead
+                         sil[k] < -0.3,  # silver
+                         gd[k] < -0.32,  # gold
+                         filling[k] < lerp(0.1, 0.3, p)],  # stone
+                        [Tiles.COPPER, Tiles.LEAD, Tiles.SILVER, Tiles.GOLD, Tiles.STONE],
+                        Tiles.DIRT)  # dirt
+        tiles[k] = np.select([caves[k] < lerp(0.15, 0.05, p),
+                              caves[k] < 0.35,  # size of caves, caverns bg
+                              caves[k] < 1.0],  # stone
+                             [ore, Tiles.NONE, Tiles.STONE],
+                             Tiles.NONE)
+
+    # hell (1 / 10)
+    tiles[max(caverns_end, start) - start:] = Tiles.ASH
+
+    # # treasure alg
+    # for i in range(10):
+    #     y = random.randint(int(4 * height / 10), int(height - 2 * height / 10))
+    #     x = random.randint(0, width - 15)
+    #     place_treasure_house(y, x, tiles)
+
+    return tiles
+
+
+def band_noise(start: int, end: int, cols: np.ndarray, seed: int):
+    """ :return caves, filling, copper, iron, silver and gold noise of rows [start, end) and given columns """
+
+    rows = np.arange(start, end)
+
+    caves = cave_noise(rows, cols, seed)
+    filling = filling_noise(rows, cols, seed + 10)
+
+    # ore
+    copper = ore_noise(rows, cols, seed + 1)
+    iron = ore_noise(rows, cols, seed + 2)
+    silver = ore_noise(rows, cols, seed + 3)
+    gold = ore_noise(rows, cols, seed + 4)
+
+    return caves, filling, copper, iron, silver, gold
+
+
+def generate_band(start: int, end: int, cols: np.ndarray, seed: int, surface: np.ndarray, height: int) -> np.ndarray:
+    """
+    :param cols column indexes to generate
+    :param surface normalized surface profile of whole world
+    :return foreground tiles of rows [start, end) in shape (end - start, len(cols))
+    """
+
+    return map_tiles(start, end, height, surface[cols], *band_noise(start, end, cols, seed))
+
+
+def map_background(start: int, end: int, width: int, height: int) -> np.ndarray:
+    """ :return background tiles of rows [start, end) in shape (end - start, width) """
+
+    _, surface_end, _, _ = layer_bounds(height)
+    background = np.zeros((end - start, width), dtype=np.uint8)
+    background[max(surface_end + 1, start) - start:] = Tiles.B_DIRT  # dirt background
+    return background
+
+
+def _generate_shared_band(name: str, start: int, end: int, width: int, seed: int, surface: np.ndarray,
+                          height: int):
+    """
+    Process pool entry, writes band into shared memory block of shape (height, width)
+    :return seconds spent computing noise and classifying tiles
+    """
+
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        tiles = np.ndarray((height, width), dtype=np.uint8, buffer=memory.buf)
+        started = time.perf_counter()
+        fields = band_noise(start, end, np.arange(width), seed)
+        noised = time.perf_counter()
+        tiles[start:end] = map_tiles(start, end, height, surface, *fields)
+        del tiles
+        return noised - started, time.perf_counter() - noised
+    finally:
+        memory.close()
+
+
+def bands(height: int, workers: int):
+    """ :return row ranges split on layer boundaries, each at most height / workers rows high """
+
+    size = max(1, -(-height // max(1, workers)))
+    seams = [0, *layer_bounds(height), height]
+
+    result = []
+    for start, end in zip(seams, seams[1:]):
+        for s in range(start, end, size):
+            result.append((s, min(s + size, end)))
+    return result
+
+
+# preview colors of tile types, empty tiles show sky
+_PALETTE = np.zeros((256, 3), dtype=np.uint8)
+_PALETTE[:] = sky
+for _type, _color in ((Tiles.DIRT, dirt), (Tiles.STONE, stone), (Tiles.COPPER, copper), (Tiles.LEAD, lead),
+                      (Tiles.SILVER, silver), (Tiles.GOLD, gold), (Tiles.ASH, ash), (Tiles.B_OAK_LOG, wood),
+                      (Tiles.B_DIRT, cave_bg)):
+    _PALETTE[_type] = _color
+
+
+class GenerationStage(Enum):
+    NOISE = "noise"
+    CLASSIFY = "classify"
+    BACKGROUND = "background"
+    LIGHTING = "lighting"
+    SAVE = "save"
+
+
+class GenerationProgress:
+    """
+    Snapshot yielded by ProceduralMap.generate after each generation step.
+    Arrays are in (col, row) layout and are filled as generation advances, None until their stage runs.
+    Timings hold seconds spent in each finished step, with parallel generation noise and classification
+    are summed over workers.
+    """
+
+    def __init__(self, stage: GenerationStage, done: int, total: int, timings: Dict[GenerationStage, float],
+                 foreground: np.ndarray, background: Union[None, np.ndarray],
+                 light: Union[None, np.ndarray]) -> None:
+        self.stage = stage
+        self.done = done
+        self.total = total
+        self.timings = timings
+        self.foreground = foreground
+        self.background = background
+        self.lighting = light
+
+    def get_fraction(self) -> float:
+        """ :return finished fraction of all generation steps """
+        return self.done / self.total
+
+    def preview(self, step: int = 1) -> np.ndarray:
+        """
+        :param step take every step-th tile in both directions
+        :return RGB colors of shape (width / step, height / step, 3)
+        """
+
+        tiles = self.foreground[::step, ::step]
+        if self.background is not None:
+            tiles = np.where(tiles == Tiles.NONE, self.background[::step, ::step], tiles)
+        return _PALETTE[tiles]
+
+
+class ProceduralMap(GridListener, Map):
+
+    def __init__(self, width: int, height: int) -> None:
+        super().__init__(width, height)
+        self._seed = SEED
+        self._surface = None
+        self._region_size = (1, 1)
+        self._pending = None  # regions not generated yet, None once whole map exists
+
+    def init(self, scene, path: Union[None, str] = None):
+        for _ in self.generate(scene, path):
+            pass
+
+    def generate(self, scene, path: Union[None, str] = None) -> Iterator[GenerationProgress]:
+        """
+        Generate map in stages, yield progress after every step. Grids are assigned when generation finishes,
+        closing the generator sooner cancels generation and leaves map untouched.
+        :param scene providing map settings
+        :param path of save file caching generated world, None disables cache
+        """
 
         # ----------- BASICS ------------
-        seed = 47
+        seed = SEED
         width = scene.settings.get_world_width()
         height = scene.settings.get_world_height()
         shape = (height, width)
 
-        sky_start = 0
-        sky_end = int(height / 10)  # 1 / 10
-        sky_height = sky_end - sky_start
+        key = cache_key(seed, width, height)
+        mapped = scene.settings.is_map_memory_mapped()
+        names = [grid.type.name for grid in self.get_grids()] + [SKY_PLANE]
+        if path is not None:
+            planes = self._open_world(path, key, names) if mapped else read_planes(path, key, names)
+            if planes is not None:
+                self._assign(planes, mapped)
+                return
 
         # ---------- MAP GENERATION ----------
-        surface_start = sky_end
-        surface_end = surface_start + int(2 * height / 10)  # 2 / 10
-        surface_height = surface_end - surface_start
-
-        cave_start = surface_end
-        cave_end = cave_start + int(2 * height / 10)  # 2 / 10
-        cave_height = cave_end - cave_start
-
-        caverns_start = cave_end
-        caverns_end = caverns_start + int(4 * height / 10)  # 4 / 10
-        caverns_height = caverns_end - caverns_start
-
-        hell_start = caverns_end  # 1 / 10
-        hell_end = height
-        hell_height = hell_end - hell_start
-
         random.seed(seed)
 
         def tree(col: int, row: int, tiles):
@@ -69,261 +355,68 @@ class ProceduralMap(Map):
                     tiles[col - _, row + 1] = 100
             tiles[col - tree_height - 4, row - 2] = 105
 
-        def lerp(v0, v1, t):
-            return (1 - t) * v0 + t * v1
-
-        def surface_noise(i, s):
-            scale = height * 4
-            octaves = 6
-            persistence = 0.6
-            lacunarity = 2.0
-
-            return noise.pnoise1(i / scale,
-                                 octaves=octaves,
-                                 persistence=persistence,
-                                 lacunarity=lacunarity,
-                                 repeat=1024,
-                                 base=s)
-
-        def cave_noise(i, j, s):
-            scale = 65
-            octaves = 6
-            persistence = 0.5
-            lacunarity = 2.0
-
-            return noise.pnoise2(i / scale,
-                                 j / scale,
-                                 octaves=octaves,
-                                 persistence=persistence,
-                                 lacunarity=lacunarity,
-                                 repeatx=1024,
-                                 repeaty=1024,
-                                 base=s)
-
-        def ore_noise(i, j, s):
-            scale = 30
-            octaves = 3
-            persistence = 0.9
-            lacunarity = 2.
-
-            return noise.pnoise2(i / scale,
-                                 j / scale,
-                                 octaves=octaves,
-                                 persistence=persistence,
-                                 lacunarity=lacunarity,
-                                 repeatx=1024,
-                                 repeaty=1024,
-                                 base=s)
-
-        def filling_noise(i, j, s):
-            scale = 40
-            octaves = 4
-            persistence = 0.4
-            lacunarity = 4.
-
-            return noise.pnoise2(i / scale,
-                                 j / scale,
-                                 octaves=octaves,
-                                 persistence=persistence,
-                                 lacunarity=lacunarity,
-                                 repeatx=1024,
-                                 repeaty=1024,
-                                 base=s)
-
-        def map_tiles(surface, caves, filling, cop, ld, sil, gd):
-
-            tiles = np.zeros(shape)
-
-            for i in range(shape[0]):
-                for j in range(shape[1]):
-
-                    if i < sky_end:  # sky
-
-                        tiles[i][j] = Tiles.NONE  # sky
-
-                    elif i < surface_end:
-
-                        min_i = sky_end  # surface min value is 30% of dirt caves height (1.5 / 10)
-                        max_i = surface_end - 1
-                        p = (i - min_i) / (max_i - min_i)
-
-                        if i - min_i > surface[j] * min_i:
-                            if caves[i][j] < lerp(0.25, 0.2, p):
-                                if cop[i][j] < -0.25:
-                                    tiles[i][j] = Tiles.COPPER  # copper
-                                elif ld[i][j] < -0.35:
-                                    tiles[i][j] = Tiles.LEAD  # lead
-                                else:
-                                    if filling[i][j] < lerp(-0.5, -0.2, p):
-                                        tiles[i][j] = Tiles.STONE  # stone
-                                    else:
-                                        tiles[i][j] = Tiles.DIRT  # dirt
-                            elif caves[i][j] < 1.0:
-                                tiles[i][j] = Tiles.NONE  # cave bg
-
-                        else:
-                            tiles[i][j] = Tiles.NONE
-
-                    elif i < cave_end:  # caves (2 / 10)
-
-                        min_i = surface_end
-                        max_i = cave_end - 1
-                        p = (i - min_i) / (max_i - min_i)
-
-                        if caves[i][j] < lerp(0.2, 0.15, p):
-                            if cop[i][j] < -0.35:
-                                tiles[i][j] = Tiles.COPPER  # copper
-                            elif ld[i][j] < -0.28:
-                                tiles[i][j] = Tiles.LEAD  # lead
-                            elif sil[i][j] < -0.35:
-                                tiles[i][j] = Tiles.SILVER  # silver
-                            elif gd[i][j] < -0.4:
-                                tiles[i][j] = Tiles.GOLD  # gold
-                            else:
-                                if filling[i][j] < lerp(-0.2, 0.1, p):
-                                    tiles[i][j] = Tiles.STONE  # stone
-                                else:
-                                    tiles[i][j] = Tiles.DIRT  # dirt
-                        elif caves[i][j] < 0.45:
-                            tiles[i][j] = Tiles.NONE  # cave bg
-                        elif caves[i][j] < 1.0:
-                            tiles[i][j] = Tiles.STONE  # stone
-
-                    elif i < caverns_end:  # caverns (4 / 10)
-
-                        min_i = cave_end
-                        max_i = caverns_end - 1
-                        p = (i - min_i) / (max_i - min_i)
-
-                        if caves[i][j] < lerp(0.15, 0.05, p):
-                            if cop[i][j] < -0.4:
-                                tiles[i][j] = Tiles.COPPER  # copper
-                            elif ld[i][j] < -0.3:
-                                tiles[i][j] = Tiles.LEAD  # lead
-                            elif sil[i][j] < -0.3:
-                                tiles[i][j] = Tiles.SILVER  # silver
-                            elif gd[i][j] < -0.32:
-                                tiles[i][j] = Tiles.GOLD  # gold
-                            else:
-                                if filling[i][j] < lerp(0.1, 0.3, p):
-                                    tiles[i][j] = Tiles.STONE  # stone
-                                else:
-                                    tiles[i][j] = Tiles.DIRT  # dirt
-
-                        elif caves[i][j] < 0.35:  # size of caves
-                            tiles[i][j] = Tiles.NONE  # caverns_bg
-                        elif caves[i][j] < 1.0:
-                            tiles[i][j] = Tiles.STONE  # stone
-
-                    else:  # hell (1 / 10)
-                        tiles[i][j] = Tiles.ASH  # ash
-
-            # # treasure alg
-            # for i in range(10):
-            #     y = random.randint(int(4 * height / 10), int(height - 2 * height / 10))
-            #     x = random.randint(0, width - 15)
-            #     place_treasure_house(y, x, tiles)
-
-            return tiles
-
-        def lighting(background, foreground, depth):
-
-            class Tile:
-                def __init__(self, col: int, row: int, tile_type: int) -> None:
-                    self.col = col
-                    self.row = row
-                    self.type = tile_type
-
-                def __hash__(self):
-                    return hash((self.col, self.row))
-
-                def __eq__(self, other):
-                    return self.col == other.col and self.row == other.row
-
-            def nbs(tile, arr):
-                nbs = []
-                c = tile.col
-                r = tile.row
-                if c >= 0:
-                    nbs.append(Tile(c - 1, r, arr[c - 1, r]))
-                if c < shape[0] - 1:
-                    nbs.append(Tile(c + 1, r, arr[c + 1, r]))
-                if r >= 0:
-                    nbs.append(Tile(c, r - 1, arr[c, r - 1]))
-                if r < shape[1] - 1:
-                    nbs.append(Tile(c, r + 1, arr[c, r + 1]))
-                return nbs
-
-            light = np.zeros(shape)
-            for i in range(shape[0]):
-                for j in range(shape[1]):
-                    if foreground[j, i] == 0 and background[j, i] == 0:
-                        light[i, j] = 0
-                    else:
-                        light[i, j] = -depth - 1
-
-            queue = set()
-            for i in range(shape[0]):
-                for j in range(shape[1]):
-                    if light[i, j] == -depth - 1:
-                        tile = Tile(i, j, 1)
-                        n = nbs(tile, light)
-                        light_count = 0
-                        for _ in n:
-                            if _.type == 0:
-                                light_count += 1
-                        if light_count > 0:
-                            light[i, j] = 1
-                            queue.add(tile)
-
-            for d in range(1, depth + 1):
-                next = set()
-                for tile in queue:
-                    col = tile.col
-                    row = tile.row
-                    light[col, row] = -d
-
-                    try:
-                        for nb in nbs(tile, light):
-                            if nb.type < -d and nb not in queue:
-                                next.add(nb)
-                    except IndexError:
-                        pass
-                queue.clear()
-                queue.update(next)
-
-            return light.T
-
-        surface = np.zeros(shape=width)
-        caves = np.zeros(shape)
-        filling = np.zeros(shape)
-
-        # ore
-        copper = np.zeros(shape)
-        iron = np.zeros(shape)
-        silver = np.zeros(shape)
-        gold = np.zeros(shape)
-
-        # mineral
-
-        for j in range(shape[1]):
-            for i in range(shape[0]):
-                caves[i][j] = cave_noise(i, j, seed)
-                filling[i][j] = filling_noise(i, j, seed + 10)
-                copper[i][j] = ore_noise(i, j, seed + 1)
-                iron[i][j] = ore_noise(i, j, seed + 2)
-                silver[i][j] = ore_noise(i, j, seed + 3)
-                gold[i][j] = ore_noise(i, j, seed + 4)
-            surface[j] = abs(surface_noise(j, seed))
-
+        surface = np.abs(surface_noise(np.arange(width), height, seed))
         surface *= 1 / np.max(surface)  # normalize
 
-        background = np.zeros(shape)
-
-        for j in range(shape[1]):
-            for i in range(shape[0]):
-                if i > surface_end:
-                    background[i, j] = Tiles.B_DIRT  # dirt background
+        if scene.settings.is_generation_lazy():
+            # regions are generated on first touch, incomplete world is not saved
+            if mapped:
+                warnings.warn("MEMORY_MAPPED_MAP is ignored by LAZY_GENERATION, regions are generated into memory")
+            self._seed = seed
+            self._surface = surface
+            self._region_size = (scene.settings.get_chunk_width(), scene.settings.get_chunk_height())
+            self._pending = np.ones((-(-width // self._region_size[0]), -(-height // self._region_size[1])),
+                                    dtype=bool)
+            self.background.tiles = np.zeros((width, height), dtype=np.uint8)
+            self.furniture.tiles = np.zeros((width, height), dtype=np.uint8)
+            self.foreground.tiles = np.zeros((width, height), dtype=np.uint8)
+            self.lighting.tiles = np.zeros((width, height), dtype=np.int8)
+            # nothing is generated, first covered row is where pending tiles below sky layer start, see is_covered
+            self.sky[:] = min(layer_bounds(height)[0], height)
+            self.add_map_listener(self)
+            return
+
+        workers = scene.settings.get_generator_workers()
+        row_bands = bands(height, max(workers, BANDS))
+        total = 2 * len(row_bands) + 2 + (path is not None)
+        timings = {stage: 0. for stage in GenerationStage}
+        foreground = np.zeros(shape, dtype=np.uint8)
+        background = None
+        light = None
+        done = 0
+
+        def progress(stage: GenerationStage):
+            return GenerationProgress(stage, done, total, dict(timings), foreground.T, background, light)
+
+        if workers > 1:
+            parallel = self._generate_parallel(width, height, seed, surface, workers, foreground)
+            try:
+                for noise_time, classify_time in parallel:
+                    timings[GenerationStage.NOISE] += noise_time
+                    timings[GenerationStage.CLASSIFY] += classify_time
+                    done += 2
+                    yield progress(GenerationStage.CLASSIFY)
+            finally:
+                parallel.close()  # cancels pending bands when generation is cancelled
+        else:
+            for start, end in row_bands:
+                started = time.perf_counter()
+                fields = band_noise(start, end, np.arange(width), seed)
+                timings[GenerationStage.NOISE] += time.perf_counter() - started
+                done += 1
+                yield progress(GenerationStage.NOISE)
+
+                started = time.perf_counter()
+                foreground[start:end] = map_tiles(start, end, height, surface, *fields)
+                timings[GenerationStage.CLASSIFY] += time.perf_counter() - started
+                done += 1
+                yield progress(GenerationStage.CLASSIFY)
+
+        started = time.perf_counter()
+        background = map_background(0, height, width, height).T
+        timings[GenerationStage.BACKGROUND] += time.perf_counter() - started
+        done += 1
+        yield progress(GenerationStage.BACKGROUND)
 
         # tree alg
         # for i in range(shape[0]):
@@ -332,10 +425,206 @@ class ProceduralMap(Map):
         #         if i - min_i == int(surface[j] * min_i) and j % random.randint(30, 50) == 0:
         #             tree(i, j, background)  # tree
 
-        self.background.tiles = background.astype(np.uint8).T
+        started = time.perf_counter()
+        sky = sky_rows((foreground.T != Tiles.NONE) | (background != Tiles.NONE))
+        light = distance_light(light_emission(sky_mask(sky, 0, height)), LIGHT_DEPTH, light_falloff(foreground.T))
+        timings[GenerationStage.LIGHTING] += time.perf_counter() - started
+        done += 1
+        yield progress(GenerationStage.LIGHTING)
+
+        self.background.tiles = background
         self.furniture.tiles = np.zeros(shape).astype(np.uint8).T
-        self.foreground.tiles = map_tiles(surface, caves, filling, copper, iron, silver, gold).astype(np.uint8).T
-        self.lighting.tiles = lighting(self.background.tiles, self.foreground.tiles, 14)
+        self.foreground.tiles = foreground.T
+        self.lighting.tiles = light
+        self.sky[:] = sky
+
+        if path is not None:
+            started = time.perf_counter()
+            write_planes(path, key, {**{grid.type.name: grid.tiles for grid in self.get_grids()}, SKY_PLANE: self.sky})
+            planes = self._open_world(path, key, names) if mapped else None
+            if planes is not None:
+                self._assign(planes, mapped)
+            timings[GenerationStage.SAVE] += time.perf_counter() - started
+            done += 1
+            yield progress(GenerationStage.SAVE)
+
+    @staticmethod
+    def _open_world(path: str, key: str, names) -> Union[None, Dict[str, np.ndarray]]:
+        """
+        Map planes of world save file read and write, it is copied from cache on first open so cache is never edited
+        :return planes, None if neither world save file nor cache holds world of key
+        """
+
+        planes = read_planes(world_path(path), key, names, "r+")
+        if planes is None and read_planes(path, key, names, "r") is not None:
+            copy_planes(path, world_path(path))
+            planes = read_planes(world_path(path), key, names, "r+")
+        return planes
+
+    def _assign(self, planes: Dict[str, np.ndarray], mapped: bool) -> None:
+        """ Back grids and sky with planes read from save file, edits of mapped planes are flushed into it """
+        for grid in self.get_grids():
+            grid.tiles = planes[grid.type.name]
+        self.sky = planes[SKY_PLANE]
+        if mapped:
+            self.add_map_listener(self)
+
+    def ensure_region(self, s_col: int, s_row: int, e_col: int, e_row: int) -> None:
+        if self._pending is None:
+            return
+
+        r_w, r_h = self._region_size
+        s_rc = max(0, s_col // r_w)
+        s_rr = max(0, s_row // r_h)
+        e_rc = min(self._pending.shape[0], -(-e_col // r_w))
+        e_rr = min(self._pending.shape[1], -(-e_row // r_h))
+        if s_rc >= e_rc or s_rr >= e_rr:
+            return
+
+        pending = self._pending[s_rc:e_rc, s_rr:e_rr]
+        if not pending.any():
+            return
+
+        # shrink to bounding box of pending regions and generate it at once
+        region_cols = np.nonzero(pending.any(axis=1))[0]
+        region_rows = np.nonzero(pending.any(axis=0))[0]
+        self._generate_regions(s_rc + region_cols[0], s_rr + region_rows[0],
+                               s_rc + region_cols[-1] + 1, s_rr + region_rows[-1] + 1)
+
+        if not self._pending.any():
+            self._pending = None
+            self._surface = None
+            self.remove_map_listener(self)
+
+    def _generate_regions(self, s_rc: int, s_rr: int, e_rc: int, e_rr: int) -> None:
+        """ Generate pending regions in [s_rc, e_rc) x [s_rr, e_rr) """
+
+        r_w, r_h = self._region_size
+        s_col, s_row = s_rc * r_w, s_rr * r_h
+        e_col, e_row = min(self.width, e_rc * r_w), min(self.height, e_rr * r_h)
+
+        # light reaches LIGHT_DEPTH tiles, halo of that size makes seams match whole map generation
+        halo = self._halo(s_col, s_row, e_col, e_row)
+        box, pending, foreground, background = self._halo_tiles(*halo)
+
+        # halo regions outside of box are generated on their own request
+        cols, rows = np.arange(halo[0], halo[2]), np.arange(halo[1], halo[3])
+        new = pending & ((cols >= s_col) & (cols < e_col))[:, None] & ((rows >= s_row) & (rows < e_row))[None, :]
+        for grid, tiles in ((self.foreground, foreground), (self.background, background)):
+            view = grid.tiles[box]
+            view[new] = tiles[new]
+        self._pending[s_rc:e_rc, s_rr:e_rr] = False
+
+        previous = self.update_sky(halo[0], halo[2])
+        view = self.lighting.tiles[box]
+        view[new] = self._halo_light(halo, foreground, background)[new]
+
+        # tiles generated before below opened columns were lit as covered, light around them is found again
+        sky = self.sky[halo[0]:halo[2]]
+        deeper = np.nonzero(sky > np.maximum(previous, e_row))[0]
+        if len(deeper):
+            margin = LIGHT_DEPTH + 1
+            r_s_col, r_e_col = max(0, halo[0] + deeper[0] - margin), min(self.width, halo[0] + deeper[-1] + 1 + margin)
+            r_e_row = min(self.height, int(sky[deeper].max()) + margin)
+            halo = self._halo(r_s_col, e_row, r_e_col, r_e_row)
+            box, pending, foreground, background = self._halo_tiles(*halo)
+            light = self._halo_light(halo, foreground, background)
+            inner = (slice(r_s_col - halo[0], r_e_col - halo[0]), slice(e_row - halo[1], r_e_row - halo[1]))
+            view = self.lighting.tiles[r_s_col:r_e_col, e_row:r_e_row]
+            view[~pending[inner]] = light[inner][~pending[inner]]
+            # chunks baked before show old light, listeners of lighting redraw them
+            for listener in list(self.lighting.listeners):
+                listener.on_region_change(self.lighting, r_s_col, e_row, r_e_col, r_e_row)
+
+    def _halo(self, s_col: int, s_row: int, e_col: int, e_row: int) -> Tuple[int, int, int, int]:
+        """ :return [s_col, e_col) x [s_row, e_row) with LIGHT_DEPTH tiles around it, clipped to map """
+        return max(0, s_col - LIGHT_DEPTH), max(0, s_row - LIGHT_DEPTH), \
+            min(self.width, e_col + LIGHT_DEPTH), min(self.height, e_row + LIGHT_DEPTH)
+
+    def _halo_tiles(self, s_col: int, s_row: int, e_col: int, e_row: int):
+        """
+        Foreground and background of [s_col, e_col) x [s_row, e_row), pending tiles are generated but not kept
+        :return slices of region, its pending mask, foreground and background
+        """
+
+        r_w, r_h = self._region_size
+        cols = np.arange(s_col, e_col)
+        rows = np.arange(s_row, e_row)
+        box = (slice(s_col, e_col), slice(s_row, e_row))
+
+        foreground = generate_band(s_row, e_row, cols, self._seed, self._surface, self.height).T
+        background = map_background(s_row, e_row, len(cols), self.height).T
+
+        # regions generated before keep their current, possibly edited, tiles
+        pending = self._pending[(cols // r_w)[:, None], (rows // r_h)[None, :]]
+        foreground = np.where(pending, foreground, self.foreground.tiles[box])
+        background = np.where(pending, background, self.background.tiles[box])
+        return box, pending, foreground, background
+
+    def _halo_light(self, halo: Tuple[int, int, int, int], foreground: np.ndarray,
+                    background: np.ndarray) -> np.ndarray:
+        """ :return lighting of halo region with its tiles, it matches whole map generation LIGHT_DEPTH tiles inside """
+
+        s_col, s_row, e_col, e_row = halo
+        # columns open down to halo stay open down to its first covered tile, pending halo tiles included
+        sky = self.sky[s_col:e_col]
+        sky = np.where(sky >= s_row, s_row + sky_rows((foreground != Tiles.NONE) | (background != Tiles.NONE)), sky)
+        emission = light_emission(sky_mask(sky, s_row, e_row), self.furniture.tiles[s_col:e_col, s_row:e_row])
+        return distance_light(emission, LIGHT_DEPTH, light_falloff(foreground))
+
+    def is_covered(self, s_col: int, s_row: int, e_col: int, e_row: int) -> np.ndarray:
+        """ Pending tiles below sky layer may be ground, they count as covered until they are generated """
+
+        covered = super().is_covered(s_col, s_row, e_col, e_row)
+        if self._pending is not None:
+            r_w, r_h = self._region_size
+            cols = np.arange(max(0, s_col), max(0, s_col) + covered.shape[0])
+            rows = np.arange(max(0, s_row), max(0, s_row) + covered.shape[1])
+            pending = self._pending[(cols // r_w)[:, None], (rows // r_h)[None, :]]
+            covered |= pending & (rows >= layer_bounds(self.height)[0])[None, :]
+        return covered
+
+    def on_tile_change(self, tile: Tile, grid_id: GridType):
+        self.on_region_change(None, tile.col, tile.row, tile.col + 1, tile.row + 1)
+
+    def on_region_change(self, grid, s_col: int, s_row: int, e_col: int, e_row: int):
+        if self._pending is not None:
+            # relight of edit changes LIGHT_DEPTH + 1 tiles around it and its neighbours, reading sources as far again
+            margin = 2 * (LIGHT_DEPTH + 1) + 1
+            self.ensure_region(s_col - margin, s_row - margin, e_col + margin, e_row + margin)
+        else:
+            # edits reach world save file on scheduler thread, edits made meanwhile join waiting flush
+            submit(self.flush, key=(self, "flush"))
+
+    def flush(self) -> None:
+        """ Write edits of memory mapped planes into world save file """
+        for plane in [grid.tiles for grid in self.get_grids()] + [self.sky]:
+            if isinstance(plane, np.memmap):
+                plane.flush()
+
+    @staticmethod
+    def _generate_parallel(width: int, height: int, seed: int, surface: np.ndarray, workers: int,
+                           foreground: np.ndarray):
+        """
+        Generate foreground bands in process pool into one shared memory block, copy each finished band into
+        foreground of shape (height, width) and yield its noise and classification seconds
+        """
+
+        memory = shared_memory.SharedMemory(create=True, size=width * height)
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = {executor.submit(_generate_shared_band, memory.name, start, end, width, seed, surface,
+                                       height): (start, end)
+                       for start, end in bands(height, max(workers, BANDS))}
+            for future in as_completed(futures):
+                timings = future.result()
+                start, end = futures[future]
+                foreground[start:end] = np.ndarray((height, width), dtype=np.uint8, buffer=memory.buf)[start:end]
+                yield timings
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            memory.close()
+            memory.unlink()
 
     def exit(self) -> None:
-        pass
+        self.flush()
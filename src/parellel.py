@@ -1,68 +1,319 @@
 import heapq
-import random
+import itertools
 import time
-from threading import Thread
+from concurrent.futures import Future
+from inspect import isgenerator
+from threading import Condition, Thread, current_thread
+from typing import Callable, Dict, Hashable, Union
 
+# heap entry fields, entry of job that was resubmitted or cancelled has no job
+_PRIORITY, _SEQUENCE, _PUSH, _JOB = 0, 1, 2, 3
 
-class HeapExecutor(Thread):
 
-    def run(self) -> None:
-        global _last_tick
-        global _tick_time
-        global _pool0
+class _Job:
 
+    def __init__(self, func: Callable, args: tuple, key: Union[None, Hashable], future: Future) -> None:
+        self.func = func
+        self.args = args
+        self.key = key
+        self.future = future
+        self.priority = None
+        self.sequence = None  # order among jobs with same priority, kept when job moves or resumes
+        self.entry = None
+        self.slices = None  # generator of started sliced job
+
+
+class _JobQueue:
+    """ Jobs waiting to run, lower priority first, jobs with same priority in order of submission """
+
+    def __init__(self) -> None:
+        self._condition = Condition()
+        self._heap = []
+        self._keys = {}  # key: job waiting to run, sliced job keeps its key until it finishes
+        self._stale = 0  # heap entries without job
+        self._sequence = itertools.count()
+        self._pushes = itertools.count()
+        self._running = 0
+        self._shutdown = False
+
+    def submit(self, func: Callable, args: tuple = (), priority: float = 0,
+               key: Union[None, Hashable] = None) -> Future:
+        """
+        :param func called with args by scheduler
+        :param priority lower runs sooner
+        :param key identifies job, submitting while job with same key waits returns its future and
+        only moves it to new priority, started sliced job resumes with new priority
+        :return future of func result, cancel it to drop job that did not start yet
+        """
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+
+            job = self._keys.get(key) if key is not None else None
+            if job is not None and not job.future.cancelled():
+                if job.entry is None:
+                    job.priority = priority  # started job resumes with it
+                elif job.entry[_PRIORITY] != priority:
+                    self._push(job, priority)
+                return job.future
+
+            future = Future()
+            job = _Job(func, args, key, future)
+            future.add_done_callback(lambda f: self._on_cancel(job) if f.cancelled() else None)
+            if key is not None:
+                self._keys[key] = job
+            self._push(job, priority)
+            self._on_submit()
+            return future
+
+    def get_pending(self) -> int:
+        """ :return number of jobs waiting to run """
+        with self._condition:
+            return len(self._heap) - self._stale
+
+    def shutdown(self, cancel_pending: bool = False) -> None:
+        """
+        Stop accepting jobs
+        :param cancel_pending cancel jobs which did not start instead of running them
+        """
+
+        with self._condition:
+            self._shutdown = True
+            if cancel_pending:
+                jobs = [entry[_JOB] for entry in self._heap if entry[_JOB] is not None]
+            else:
+                jobs = []
+            self._condition.notify_all()
+        for job in jobs:
+            job.future.cancel()
+
+    def _on_submit(self) -> None:
+        pass
+
+    def _push(self, job: _Job, priority: float) -> None:
+        if job.entry is not None:
+            job.entry[_JOB] = None
+            self._stale += 1
+        if job.sequence is None:
+            job.sequence = next(self._sequence)
+        job.priority = priority
+        job.entry = [priority, job.sequence, next(self._pushes), job]  # job never compared
+        heapq.heappush(self._heap, job.entry)
+
+        # drop entries left by resubmitted and cancelled jobs once they are majority of heap
+        if self._stale > 64 and self._stale * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if entry[_JOB] is not None]
+            heapq.heapify(self._heap)
+            self._stale = 0
+        self._condition.notify()
+
+    def _pop(self) -> Union[None, _Job]:
+        while self._heap:
+            job = heapq.heappop(self._heap)[_JOB]
+            if job is None:
+                self._stale -= 1
+                continue
+            job.entry = None
+            return job
+        return None
+
+    def _heap_empty(self) -> bool:
+        return len(self._heap) == self._stale
+
+    def _on_cancel(self, job: _Job) -> None:
+        with self._condition:
+            if job.entry is not None:
+                job.entry[_JOB] = None
+                job.entry = None
+                self._stale += 1
+                self._forget(job)
+            self._condition.notify_all()
+
+    def _forget(self, job: _Job) -> None:
+        """ Job started, finished or was cancelled, its key identifies new job """
+        if job.key is not None and self._keys.get(job.key) is job:
+            del self._keys[job.key]
+
+
+class Scheduler(_JobQueue):
+    """ Runs jobs on pool of worker threads """
+
+    def __init__(self, workers: int = 1, name: str = "scheduler") -> None:
+        """
+        :param workers number of threads running jobs, started with first submitted job
+        :param name of worker threads
+        """
+        super().__init__()
+        self.name = name
+        self._workers = workers
+        self._threads = []
+
+    def set_workers(self, workers: int) -> None:
+        """ :param workers number of threads running jobs, surplus threads exit after their current job """
+        with self._condition:
+            self._workers = workers
+            if self._heap:
+                self._start_workers()
+            self._condition.notify_all()
+
+    def join(self) -> None:
+        """ Block until no job waits or runs """
+        with self._condition:
+            self._condition.wait_for(lambda: self._heap_empty() and self._running == 0)
+
+    def shutdown(self, cancel_pending: bool = False) -> None:
+        """
+        Stop accepting jobs and wait for workers to finish
+        :param cancel_pending cancel jobs which did not start instead of running them
+        """
+
+        super().shutdown(cancel_pending)
+        for thread in list(self._threads):
+            if thread is not current_thread():
+                thread.join()
+
+    def _on_submit(self) -> None:
+        self._start_workers()
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self._workers:
+            thread = Thread(target=self._work, name="{}-{}".format(self.name, len(self._threads)), daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self) -> None:
         while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._shutdown or not self._heap_empty() or
+                                         len(self._threads) > self._workers)
+                if len(self._threads) > self._workers or (self._shutdown and self._heap_empty()):
+                    self._threads.remove(current_thread())
+                    self._condition.notify_all()
+                    return
 
-            now = time.time()
+                job = self._pop()
+                self._forget(job)
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                self._running += 1
 
-            while (now - _last_tick) + 0.0005 < _tick_time:
+            try:
+                result = job.func(*job.args)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._condition.notify_all()
 
-                if len(_pool0) > 0:
-                    priority, func, arg = heapq.heappop(_pool0)
-                    func(*arg)
-                    now = time.time()
-                    time.sleep(random.randint(1, 10) * 0.000001)
-                else:
-                    time.sleep(abs(_tick_time - (time.time() - _last_tick)))
+
+class FrameScheduler(_JobQueue):
+    """
+    Runs jobs on thread calling run, within time budget of each frame. Job returning generator is sliced, each
+    next call is one slice and job resumes with next slice in some later run. Slice yielding future which is not
+    done parks job until future is done, so job waits on work of other threads without spending frame time.
+    Budget is checked between slices, so slice running past it is recorded as overrun.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.frames = 0
+        self.slices = 0
+        self.overruns = 0
+        self.overrun_time = 0.0  # unit [ms]
+        self.max_overrun = 0.0  # unit [ms]
+
+    def run(self, budget: float, idle: bool = False) -> None:
+        """
+        :param budget unit [ms], slices start only while some is left
+        :param idle pass spending rest of frame already counted, it is not recorded in stats
+        """
+
+        start = time.perf_counter()
+        deadline = start + budget / 1000
+        while time.perf_counter() < deadline:
+            with self._condition:
+                job = self._pop()
+                if job is None:
                     break
-            time.sleep(0)
+                if job.slices is None and not job.future.set_running_or_notify_cancel():
+                    self._forget(job)
+                    continue
+                self._running += 1
 
+            self.slices += 1
+            finished = True
+            try:
+                if job.slices is None:
+                    result = job.func(*job.args)
+                    if not isgenerator(result):
+                        job.future.set_result(result)
+                        continue
+                    job.slices = result
+                waiting = next(job.slices)
+            except StopIteration as e:
+                job.future.set_result(e.value)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                finished = False
+                if isinstance(waiting, Future) and not waiting.done():
+                    waiting.add_done_callback(lambda _, job=job: self._resume(job))
+                else:
+                    self._resume(job)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    if finished:
+                        self._forget(job)  # key of sliced job identifies it until its last slice
 
-_pool0 = []
+        if idle:
+            return
+        self.frames += 1
+        overrun = (time.perf_counter() - start) * 1000 - budget
+        if overrun > 0:
+            self.overruns += 1
+            self.overrun_time += overrun
+            self.max_overrun = max(self.max_overrun, overrun)
 
-_last_tick = time.time()
-_tick_time = 1 / 60
-_executor = HeapExecutor()
-_executor.setDaemon(True)
-_executor.start()
+    def _resume(self, job: _Job) -> None:
+        with self._condition:
+            self._push(job, job.priority)  # resume with next slice, jobs of higher priority go first
 
+    def get_stats(self) -> Dict[str, float]:
+        """ :return frames run, slices run, frames which ran past budget, total and worst overrun in ms """
+        return {
+            "frames": self.frames,
+            "slices": self.slices,
+            "overruns": self.overruns,
+            "overrun_time": self.overrun_time,
+            "max_overrun": self.max_overrun
+        }
 
-class _PriorityTuple(tuple):
 
-    def __lt__(self, x) -> bool:
-        return self[0] < x[0]
+_scheduler = Scheduler()
+_frame_scheduler = FrameScheduler()
 
-    def __le__(self, x) -> bool:
-        return self[0] <= x[0]
 
-    def __gt__(self, x) -> bool:
-        return self[0] > x[0]
+def get_scheduler() -> Scheduler:
+    """ :return scheduler shared by application """
+    return _scheduler
 
-    def __ge__(self, x) -> bool:
-        return self[0] >= x[0]
 
+def submit(func: Callable, args: tuple = (), priority: float = 0, key: Union[None, Hashable] = None) -> Future:
+    """ Submit job to shared scheduler, see Scheduler.submit """
+    return _scheduler.submit(func, args, priority, key)
 
-def tick(fps):
-    global _last_tick
-    global _tick_time
-    global _executor
-    _last_tick = time.time()
-    _tick_time = 1 / fps
 
-    if not _executor.is_alive():
-        _executor = HeapExecutor()
-        _executor.start()
+def get_frame_scheduler() -> FrameScheduler:
+    """ :return scheduler of main thread work run by application loop """
+    return _frame_scheduler
 
 
-def run_in_thread(func, args, priority: int = 0):
-    heapq.heappush(_pool0, _PriorityTuple((priority, func, args)))
+def submit_sliced(func: Callable, args: tuple = (), priority: float = 0,
+                  key: Union[None, Hashable] = None) -> Future:
+    """ Submit job to run on main thread within frame budget, see FrameScheduler """
+    return _frame_scheduler.submit(func, args, priority, key)
@@ -1,4 +1,9 @@
+from itertools import chain
 from math import isnan
+from operator import attrgetter
+from typing import Iterable, List, Tuple
+
+import numpy
 
 from src.rect import Rect, Entity
 from src.vector import Vector
@@ -91,3 +96,69 @@ def resolve_dynamic_rect_vs_rect(r_dynamic: Entity, r_static: Rect, dt: float):
         return False
 
 
+_BOX = attrgetter("pos.x", "pos.y", "size.x", "size.y", "vel.x", "vel.y")
+
+
+class SweepAndPrune:
+    """
+    Broadphase finding pairs of entities whose boxes swept by their velocity overlap. Order sorting boxes by their
+    start on x axis is kept between updates and sorted again, so coherent motion makes sorting almost linear.
+    """
+
+    def __init__(self) -> None:
+        self.entities = []  # in order of collection given to update, boxes are read in order entities move
+        self.order = numpy.zeros(0, dtype=numpy.intp)  # indexes of entities sorted by start of their boxes
+        self.members = set()
+        self.candidates = 0  # pairs overlapping on x axis at last update
+
+    def update(self, entities: Iterable[Entity], dt: float) -> List[Tuple[Entity, Entity]]:
+        """
+        Sort boxes of entities moved since last update again and sweep them
+        :param entities added since last update are inserted, entities missing are removed
+        :return pairs of entities whose boxes swept over dt overlap, candidates for dynamic_rect_vs_rect
+        """
+
+        if self.members != entities:
+            self.insert(entities)
+        n = len(self.entities)
+        if n < 2:
+            self.candidates = 0
+            return []
+
+        boxes = numpy.fromiter(chain.from_iterable(map(_BOX, self.entities)), dtype=numpy.float64, count=6 * n)
+        x, y, width, height, v_x, v_y = boxes.reshape(n, 6)[self.order].T
+        d_x, d_y = v_x * dt, v_y * dt
+        s_x, e_x = x + numpy.minimum(d_x, 0), x + width + numpy.maximum(d_x, 0)
+        s_y, e_y = y + numpy.minimum(d_y, 0), y + height + numpy.maximum(d_y, 0)
+
+        # stable sort is adaptive, starts sorted at last update are sorted again in almost linear time
+        resort = numpy.argsort(s_x, kind="stable")
+        if (resort != numpy.arange(n)).any():
+            self.order = self.order[resort]
+            s_x, e_x, s_y, e_y = s_x[resort], e_x[resort], s_y[resort], e_y[resort]
+
+        # boxes after box i starting before its end overlap it on x axis
+        first = numpy.arange(1, n + 1)
+        counts = numpy.maximum(numpy.searchsorted(s_x, e_x, side="left") - first, 0)
+        self.candidates = int(counts.sum())
+        if self.candidates == 0:
+            return []
+        i = numpy.repeat(first - 1, counts)
+        j = numpy.arange(self.candidates) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + i + 1
+        overlap = (s_y[j] < e_y[i]) & (s_y[i] < e_y[j])
+
+        entities = self.entities
+        return [(entities[a], entities[b])
+                for a, b in zip(self.order[i[overlap]].tolist(), self.order[j[overlap]].tolist())]
+
+    def insert(self, entities: Iterable[Entity]) -> None:
+        """ Take entities given to update, entities kept stay in their sorted order and new ones follow them """
+
+        members = set(entities)
+        kept = [self.entities[i] for i in self.order.tolist() if self.entities[i] in members]
+        self.entities = list(entities)
+        index = {entity: i for i, entity in enumerate(self.entities)}
+        self.order = numpy.array([index[entity] for entity in kept] +
+                                 [index[entity] for entity in self.entities if entity not in self.members],
+                                 dtype=numpy.intp)
+        self.members = members
@@ -1,20 +1,39 @@
+import numpy
 import pygame
 import random
 import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from enum import Enum
+from math import exp, hypot
 from pathlib import Path
 from pygame import Surface, Color, SRCALPHA, BLEND_RGBA_MIN
-from typing import Tuple, Union, Dict
+from typing import Tuple, Union, Dict, Iterator, List
 
 from src.actor import ActorState
-from src.map import GridListener, GridType, Tile
-from src.parellel import run_in_thread
+from src.baking import PIXEL_FORMAT, Atlas, AtlasLayer, BakePipeline
+from src.lighting import COLOR_BITS, COLOR_BLOCK, LIGHT_DEPTH, ColorLighting, DayCycle, pack_color, propagate_light, \
+    unpack_color
+from src.map import REGION_GAP, GridListener, GridType, Tile, merge_box
+from src.parellel import submit_sliced
 from src.rect import Rect
 from src.scene import SceneListener
 from src.settings import ApplicationSettings
 from src.tables import Actors, Tiles, Items
 from src.vector import Vector
 
+CAMERA_FOLLOW_RATE = 4  # unit [1/s], fraction of distance to followee camera covers each second
+CAMERA_VELOCITY_SMOOTHING = 10  # unit [1/s], how fast measured camera velocity follows actual movement
+
+# chunk baking priorities, lower runs first
+BAKE_PRIORITY = 10  # visible chunk, prefetched chunks add their estimated seconds to become visible
+BAKE_MIN_SPEED = 256  # unit [px/s], chunks camera does not move towards are assumed reached this fast
+BAKE_BEHIND_PENALTY = 1  # unit [s], added to chunks camera moves away from
+
+LIGHT_MAP_MARGIN = 8  # unit [tiles], light map origin snaps to multiples of it, camera moving less reuses texture
+
+ATLAS_PAGE_SIZE = 1024  # unit [px], side of texture atlas pages, larger rects get page of their own
+
 # tile states with corresponding areas
 
 _tree_state_areas = {
@@ -111,19 +130,101 @@ def gradient(size: Tuple[int, int], v_s: Color, v_e: Color, h_s: Color, h_e: Col
 
 
 class TextureFactory:
+    """ Loads textures by name, rects sprites clip from textures are packed into shared atlas pages """
+
+    _path = "./res/"
+    _manifest = None  # name: file of each texture under path, scanned once
     _loaded_textures = {}
+    _regions = {}  # (name, rect): subsurface of atlas page holding rect of texture
+    _pages = []  # [surface, y of free space below shelves]
+    _shelves = []  # [page, y, height, x of free space] rows of rects on pages
+
+    @classmethod
+    def set_path(cls, path: str):
+        """ :param path directory of textures, manifest is scanned again on next load """
+        if path != cls._path:
+            cls._path = path
+            cls._manifest = None
+
+    @classmethod
+    def get_manifest(cls) -> Dict[str, Path]:
+        """ :return file of each texture name """
+        if cls._manifest is None:
+            cls._manifest = {}
+            for path in sorted(Path(cls._path).rglob('*.*')):
+                cls._manifest.setdefault(path.name.split('.')[0], path)
+        return cls._manifest
 
     @classmethod
     def load(cls, name):
         """ Lazily load textures by name """
 
-        if cls._loaded_textures.get(name) is None:
-            for path in Path("./res/").rglob('{}.*'.format(name)):
-                surface = pygame.image.load(path)
-                cls._loaded_textures.setdefault(name, surface)
-                return surface
-        else:
-            return cls._loaded_textures.get(name)
+        texture = cls._loaded_textures.get(name)
+        if texture is None:
+            path = cls.get_manifest().get(name)
+            if path is not None:
+                texture = cls._loaded_textures[name] = pygame.image.load(path)
+        return texture
+
+    @classmethod
+    def get_region(cls, name, rect: Tuple[int, int, int, int], size: Union[None, Tuple[int, int]] = None,
+                   alpha: bool = True) -> Surface:
+        """
+        :param rect (x, y, w, h) of texture
+        :param size unit [px] pixels of rect are scaled to, size of rect when None
+        :param alpha region lies in atlas page, opaque regions are 8 bit surfaces of their own
+        :return surface holding pixels of rect, scaled and packed on first request, never changed later
+        """
+
+        x, y, w, h = rect
+        size = (w, h) if size is None else tuple(size)
+        key = (name, tuple(rect), size, alpha)
+        region = cls._regions.get(key)
+        if region is None:
+            if size == (w, h):
+                source, area = cls.load(name), pygame.Rect(x, y, w, h)
+            else:
+                source, area = pygame.transform.scale(cls.get_region(name, rect, None, alpha), size), None
+            if alpha:
+                page, pos = cls._place(*size)
+                region = page.subsurface(pygame.Rect(pos, size))
+            else:
+                region = Surface(size, 0, 8)
+                region.fill(Color(0, 0, 0, 0))
+            region.blit(source, (0, 0), area)
+            cls._regions[key] = region
+        return region
+
+    @classmethod
+    def _place(cls, width: int, height: int) -> Tuple[Surface, Tuple[int, int]]:
+        """ :return page and position of free space of size, on shelf wasting least height """
+
+        if width > ATLAS_PAGE_SIZE or height > ATLAS_PAGE_SIZE:
+            return cls._new_page((width, height))[0], (0, 0)
+
+        shelves = [shelf for shelf in cls._shelves if shelf[2] >= height and shelf[3] + width <= ATLAS_PAGE_SIZE]
+        if not shelves:
+            page = next((page for page in cls._pages if page[1] + height <= ATLAS_PAGE_SIZE), None)
+            if page is None:
+                page = cls._new_page((ATLAS_PAGE_SIZE, ATLAS_PAGE_SIZE))
+            shelves = [[page[0], page[1], height, 0]]
+            cls._shelves.append(shelves[0])
+            page[1] += height
+
+        shelf = min(shelves, key=lambda s: s[2])
+        pos = shelf[3], shelf[1]
+        shelf[3] += width
+        return shelf[0], pos
+
+    @classmethod
+    def _new_page(cls, size: Tuple[int, int]) -> list:
+        surface = Surface(size, SRCALPHA, 32)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()  # display pixel format blits fastest
+            surface.fill(Color(0, 0, 0, 0))
+        page = [surface, 0]
+        cls._pages.append(page)
+        return page
 
 
 class Camera(Rect):
@@ -136,9 +237,11 @@ class Camera(Rect):
         self.surface = pygame.display.get_surface()
         self.fonts = {}
         self.scene = scene
+        self.vel = Vector(0, 0)  # unit [px/s], smoothed movement of camera between updates
+        self._last_pos = Vector(0, 0)
 
-    def _blit(self, surface: Surface, dest: Vector, area: Union[None, Tuple[Vector, Vector]]):
-        self.surface.blit(surface, (dest.x, dest.y), area)
+    def _blit(self, surface: Surface, dest: Vector, area: Union[None, Tuple[Vector, Vector]], special_flags: int = 0):
+        self.surface.blit(surface, (dest.x, dest.y), area, special_flags)
 
     def draw_sprite(self, sprite, pos: Vector, delta_time: float, translate: bool = True):
         if translate:
@@ -148,13 +251,14 @@ class Camera(Rect):
 
         sprite.render(self.surface, n_pos, delta_time)
 
-    def draw_surface(self, surface: Surface, pos: Vector, area: Tuple[Vector, Vector], translate: bool = True):
+    def draw_surface(self, surface: Surface, pos: Vector, area: Tuple[Vector, Vector], translate: bool = True,
+                     special_flags: int = 0):
         """ Saves draw information into queue for next render to draw """
         if translate:
             n_pos = pos - self.pos
         else:
             n_pos = pos
-        self._blit(surface, n_pos, area)
+        self._blit(surface, n_pos, area, special_flags)
 
     def draw_rect(self, rect: Tuple[Vector, Vector], color: Color, translate: bool = True):
         """ Saves draw information into queue for next render to draw """
@@ -208,9 +312,27 @@ class Camera(Rect):
         if followee:
             pos = self.pos
             new_pos = followee.pos + (followee.size / 2) - (self.size / 2)
-            self.pos += (new_pos - pos) * 4 * delta_time
+            self.pos += (new_pos - pos) * CAMERA_FOLLOW_RATE * delta_time
         self.scene.pos = self.pos
 
+        # scene may move camera too, so velocity is measured from position rather than derived from followee
+        if delta_time > 0:
+            vel = (self.pos - self._last_pos) / delta_time
+            self.vel += (vel - self.vel) * min(1.0, CAMERA_VELOCITY_SMOOTHING * delta_time)
+        self._last_pos = Vector(self.pos.x, self.pos.y)
+
+    def predict(self, time_: float) -> Vector:
+        """
+        :param time_ unit [s] ahead
+        :return predicted position of camera, followed camera eases towards where followee will be
+        """
+
+        followee = self.scene.get_followee()
+        if followee:
+            target = followee.pos + followee.vel * time_ + (followee.size / 2) - (self.size / 2)
+            return self.pos + (target - self.pos) * (1 - exp(-CAMERA_FOLLOW_RATE * time_))
+        return self.pos + self.vel * time_
+
     def render(self, delta_time: float):
         """ Draw each layer into system surface """
         #
@@ -236,19 +358,22 @@ class Camera(Rect):
         # while locked:
         #     locked = l0.locked() or l1.locked() or l2.locked() or l3.locked()
         # _thread.start_new_thread(pygame.display.flip, tuple())
-        # run_in_thread(pygame.display.flip, tuple(), priority=0)
+        # submit_sliced(pygame.display.flip, priority=0)
         pygame.display.flip()
 
 
 class Sprite:
 
-    def __init__(self, file_name, rects: Tuple[Tuple[int, int, int, int]], rect_time: float, alpha=True):
+    def __init__(self, file_name, rects: Tuple[Tuple[int, int, int, int]], rect_time: float, alpha=True,
+                 factor: float = 1):
         """
         :param file_name of file
         :param rects ((x, y, w, h), ...)
         :param rect_time time for each rect to play in ms
+        :param factor rects are scaled by
         """
         self.alpha = alpha
+        self.factor = factor
         self.filename = file_name
         self.rect_time = rect_time
         self.static = rect_time == 0
@@ -341,20 +466,19 @@ class Sprite:
         self.clip = None
 
         if self.len > 0:
-            texture = TextureFactory.load(self.filename)
-            for i in range(self.len):
-                x, y, w, h = clips[i]
-                if self.alpha:
-                    clip = Surface((w, h), SRCALPHA, 32)
-                else:
-                    clip = Surface((w, h), 0, 8)
-                clip.fill(Color(0, 0, 0, 0))
-                clip.blit(texture, (0, 0), pygame.Rect(x, y, w, h))
-                self.clips.append(clip)
+            # clips are shared with every sprite of same texture rects and factor, transforms give own copies
+            self.clips = [TextureFactory.get_region(self.filename, (x, y, w, h),
+                                                    (int(w * self.factor), int(h * self.factor)), self.alpha)
+                          for x, y, w, h in clips]
             self.clip = self.clips[0]
 
+    def get_clip(self, index: int) -> Surface:
+        """ :return surface of clip by index, current clip of sprite stays """
+        return self.clips[index]
+
     def set_clip(self, index: int):
         """ Update clip by index """
+        self.i = index
         self.clip = self.clips[index]
 
     def set_time(self, rect_time: float):
@@ -377,6 +501,71 @@ class Sprite:
         surface.blit(self.clip, [pos.x, pos.y, self.get_width(), self.get_height()], None)
 
 
+class SpriteCache:
+    """ Sprites of texture areas scaled once per factor, cached sprites are never scaled in place """
+
+    _sprites = {}  # ((texture, area, alpha), (width, height)): Sprite
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def get(cls, texture, area, factor: float = 1, alpha: bool = True) -> Sprite:
+        """
+        Sprite is shared, pick clip of each draw with get_clip instead of changing it
+        :param area enum of clip rects, or tuple of them
+        :param factor clips are scaled by, factors scaling first clip to same size share sprite
+        """
+
+        rects = area.value if isinstance(area, Enum) else area
+        x, y, w, h = rects[0]
+        size = (int(w * factor), int(h * factor))
+        key = ((texture, area, alpha), size)
+        sprite = cls._sprites.get(key)
+        if sprite is None:
+            cls._misses += 1
+            sprite = cls._sprites[key] = Sprite(texture, rects, 0, alpha, factor)
+        else:
+            cls._hits += 1
+        return sprite
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, float]:
+        """ :return hits, misses, hit rate, sprites held and memory of their clips in bytes """
+        clips = {id(clip): clip for sprite in cls._sprites.values() for clip in sprite.clips}
+        lookups = cls._hits + cls._misses
+        return {
+            "hits": cls._hits,
+            "misses": cls._misses,
+            "hit_rate": cls._hits / lookups if lookups else 0.0,
+            "sprites": len(cls._sprites),
+            "memory": sum(clip.get_width() * clip.get_height() * clip.get_bytesize() for clip in clips.values())
+        }
+
+
+# neighbour states of autotiled sides, signature of tile is top * 27 + bottom * 9 + left * 3 + right
+_SAME, _FRIENDLY, _NONE = 0, 1, 2
+
+
+def _friendly_table(textures) -> numpy.ndarray:
+    """ :return table[t0, t1], true when tile type t0 blends into t1 """
+    table = numpy.zeros((256, 256), dtype=bool)
+    for t0, (_, diff_t0) in textures.items():
+        for t1, (_, diff_t1) in textures.items():
+            table[t0, t1] = t1 == diff_t0 or t0 == diff_t1
+    return table
+
+
+def _signature_lookup(areas):
+    """ :return first of areas matching each of 81 signatures, F in area name matches friendly, N also matches it """
+    matches = {"S": (_SAME,), "F": (_FRIENDLY,), "N": (_NONE, _FRIENDLY)}
+    lookup = []
+    for signature in range(81):
+        sides = (signature // 27, signature // 9 % 3, signature // 3 % 3, signature % 3)
+        lookup.append(next(area_type for area_type in areas
+                           if all(side in matches[letter] for side, letter in zip(sides, area_type.name))))
+    return lookup
+
+
 class ActorSpriteResolver:
     textures = {
         Actors.PLAYER: "Silver"
@@ -508,72 +697,51 @@ class ForegroundSpriteResolver:
         SSNN = [(90, 0, 16, 16), (90, 18, 16, 16), (90, 36, 16, 16)]  # tunnel vertical
         NNSS = [(108, 72, 16, 16), (126, 72, 16, 16), (144, 72, 16, 16)]  # tunnel horizontal
 
-    sprites = {}
+    friendly = _friendly_table(textures)
+    lookup = _signature_lookup(Areas)
 
     @classmethod
-    def create_sprite(cls, tile, area_type: Areas):
-        filename, diff = cls.textures[tile.type]
-        cls.sprites[tile.type] = {}
-        cls.sprites[tile.type][area_type] = Sprite(filename, area_type.value, 0)
+    def get_signatures(cls, grid, s_col: int, s_row: int, e_col: int, e_row: int) -> numpy.ndarray:
+        """
+        Neighbour signatures of tiles [s_col, e_col) x [s_row, e_row) computed in one pass,
+        tiles on map border get signature of SSSS
+        :return uint8 array in (col, row) layout, index into lookup
+        """
+
+        # block with one tile border of neighbours, -1 outside of map
+        block = numpy.full((e_col - s_col + 2, e_row - s_row + 2), -1, dtype=numpy.int16)
+        h_s_col, h_s_row = max(0, s_col - 1), max(0, s_row - 1)
+        h_e_col, h_e_row = min(grid.width, e_col + 1), min(grid.height, e_row + 1)
+        if h_s_col < h_e_col and h_s_row < h_e_row:
+            block[h_s_col - s_col + 1:h_e_col - s_col + 1, h_s_row - s_row + 1:h_e_row - s_row + 1] = \
+                grid.tiles[h_s_col:h_e_col, h_s_row:h_e_row]
+
+        center = block[1:-1, 1:-1]
+        signatures = numpy.zeros(center.shape, dtype=numpy.uint8)
+        border = numpy.zeros(center.shape, dtype=bool)
+        for nbs, weight in ((block[1:-1, :-2], 27), (block[1:-1, 2:], 9), (block[:-2, 1:-1], 3), (block[2:, 1:-1], 1)):
+            state = numpy.where(nbs == center, _SAME, numpy.where(cls.friendly[center, nbs], _FRIENDLY, _NONE))
+            signatures += (state * weight).astype(numpy.uint8)
+            border |= nbs < 0
+        signatures[border] = 0  # SSSS
+        return signatures
 
     @classmethod
     def resolve_tile_sprite_area_type(cls, grid, tile):
-
-        def is_friendly(t0, t1):
-            _, diff_t0 = cls.textures[t0.type]
-            _, diff_t1 = cls.textures[t1.type]
-            return t1.type == diff_t0.value or t0.type == diff_t1.value
-
-        def is_same(t0, t1):
-            return t0.type == t1.type
-
-        def is_none(t0, t1):
-            return t1.type == Tiles.NONE or not is_same(t0, t1)
-
-        def get_func(letter: str):
-            if letter == "N":
-                return is_none
-            elif letter == "S":
-                return is_same
-            elif letter == "F":
-                return is_friendly
-            else:
-                raise AttributeError
-
-        top, bottom, left, right = grid.get_nbs(tile.col, tile.row)
-
-        if top and bottom and left and right:
-            for area_type in cls.Areas:
-                area_name = area_type.name
-                if get_func(area_name[0])(tile, top) and \
-                        get_func(area_name[1])(tile, bottom) and \
-                        get_func(area_name[2])(tile, left) and \
-                        get_func(area_name[3])(tile, right):
-                    return area_type
-            raise AttributeError(
-                Tiles(tile.type),
-                Tiles(top.type),
-                Tiles(bottom.type),
-                Tiles(left.type),
-                Tiles(right.type)
-            )
-        else:
-            return cls.Areas.SSSS
+        signature = cls.get_signatures(grid, tile.col, tile.row, tile.col + 1, tile.row + 1)[0, 0]
+        return cls.lookup[signature]
 
     @classmethod
-    def get_sprite(cls, grid, tile, size):
-        area_type = cls.resolve_tile_sprite_area_type(grid, tile)
-        try:
-            _ = cls.sprites[tile.type][area_type]
-        except KeyError:
-            cls.create_sprite(tile, area_type)
-        sprite = cls.sprites[tile.type][area_type]
-        sprite.set_clip((tile.col + tile.row) % sprite.len)  # set clip from available
-
-        if sprite.get_width() != size.x or sprite.get_height() != size.y:
-            sprite.scale(size.x / 16)
-
-        return sprite
+    def get_surface(cls, grid, tile, size, area_type: Union[None, Areas] = None) -> Surface:
+        """
+        :param area_type resolved from neighbours of tile when None
+        :return clip of tile sprite, picked from available by tile position
+        """
+        if area_type is None:
+            area_type = cls.resolve_tile_sprite_area_type(grid, tile)
+        filename, diff = cls.textures[tile.type]
+        sprite = SpriteCache.get(filename, area_type, size.x / 16)
+        return sprite.get_clip((tile.col + tile.row) % sprite.len)
 
 
 class BackgroundSpriteResolver:
@@ -589,13 +757,6 @@ class BackgroundSpriteResolver:
         NSSS = [(36, 0, 32, 32), (72, 0, 32, 32), (108, 0, 32, 32)]  # only top empty
         SNSS = [(36, 72, 32, 32), (72, 72, 32, 32), (108, 72, 32, 32)]  # only bottom empty
 
-    sprites = {}
-
-    @classmethod
-    def create_sprite(cls, tile, area_type: Areas):
-        filename = cls.textures[tile.type]
-        cls.sprites[area_type] = Sprite(filename, area_type.value, 0)
-
     @classmethod
     def resolve_tile_sprite_area_type(cls, grid, tile):
         # def is_same(t0, t1):
@@ -628,18 +789,11 @@ class BackgroundSpriteResolver:
         return cls.Areas.SSSS
 
     @classmethod
-    def get_sprite(cls, grid, tile, size):
+    def get_surface(cls, grid, tile, size) -> Surface:
+        """ :return clip of tile sprite, picked from available by tile position """
         area_type = cls.resolve_tile_sprite_area_type(grid, tile)
-        if cls.sprites.get(area_type) is None:
-            cls.create_sprite(tile, area_type)
-
-        sprite = cls.sprites.get(area_type)
-        sprite.set_clip((tile.col + tile.row) % sprite.len)  # set clip from available
-
-        if sprite.get_width() != size.x or sprite.get_height() != size.y:
-            sprite.scale(size.x / 32)
-
-        return sprite
+        sprite = SpriteCache.get(cls.textures[tile.type], area_type, size.x / 32)
+        return sprite.get_clip((tile.col + tile.row) % sprite.len)
 
 
 class FurnitureSpriteResolver:
@@ -650,13 +804,6 @@ class FurnitureSpriteResolver:
     class Areas(Enum):
         WHITE_TORCH = [(4, 0, 16, 20), (22, 0, 20, 20), (44, 0, 20, 20)]
 
-    sprites = {}
-
-    @classmethod
-    def create_sprite(cls, tile, area_type: Areas):
-        filename = cls.textures[tile.type]
-        cls.sprites[area_type] = Sprite(filename, area_type.value, 0)
-
     @classmethod
     def resolve_tile_sprite_area_type(cls, grid, tile):
 
@@ -668,14 +815,7 @@ class FurnitureSpriteResolver:
     @classmethod
     def get_sprite(cls, grid, tile, size):
         area_type = cls.resolve_tile_sprite_area_type(grid, tile)
-        if cls.sprites.get(area_type) is None:
-            cls.create_sprite(tile, area_type)
-        sprite = cls.sprites.get(area_type)
-
-        if sprite.get_width() != size.x or sprite.get_height() != size.y:
-            sprite.scale(size.x / 16)
-
-        return sprite
+        return SpriteCache.get(cls.textures[tile.type], area_type, size.x / 16)
 
 
 class ItemSpriteResolver:
@@ -714,13 +854,6 @@ class WorldBackgroundResolver:
     class Textures(Enum):
         FOREST = ["Forest_background_2", [0, 0, 1024, 838]]
 
-    backgrounds = {}
-
-    @classmethod
-    def create_sprite(cls, texture_enum):
-        filename, area = texture_enum.value
-        cls.backgrounds[texture_enum.name] = Sprite(filename, (area,), 0, alpha=False)
-
     @classmethod
     def resolve_background(cls, map_, pos: Vector, t_size: Vector):
         return cls.Textures.FOREST
@@ -729,44 +862,111 @@ class WorldBackgroundResolver:
     def get_sprite(cls, map_, camera, t_size: Vector):
         pos = camera.pos
         texture = cls.resolve_background(map_, pos, t_size)
-        if cls.backgrounds.get(texture.name) is None:
-            cls.create_sprite(texture)
-        sprite = cls.backgrounds[texture.name]
+        filename, area = texture.value
+        return SpriteCache.get(filename, (tuple(area),), camera.size.y * 2 / area[3], alpha=False)  # twice screen
 
-        w, h = sprite.get_width(), sprite.get_height()
-        sw, sh = camera.size.x, camera.size.y
-        if h != (sh / h) * 2:
-            sprite.scale((sh / h) * 2)
 
-        return sprite
+class GradientTile:
+    _surfaces = {}  # (top, down, left, right, width, height): gradient surface, shared and never changed
 
+    @classmethod
+    def get_surface(cls, grid, col: int, row: int, size):
+        top, down, left, right = grid.nbs_types(col, row, 0)
+        return cls.get_gradient(abs(top), abs(down), abs(left), abs(right), size)
+
+    @classmethod
+    def get_gradient(cls, top: int, down: int, left: int, right: int, size) -> Surface:
+        """
+        :param top, down, left, right darkness of neighbours in 0..15
+        :return surface darkened by neighbours, drawn once for each of them and size
+        """
+
+        key = (top, down, left, right, size.x, size.y)
+        surface = cls._surfaces.get(key)
+        if surface is None:
+            surface = cls._surfaces[key] = gradient((size.x, size.y),
+                                                    (0, 0, 0, top / 15 * 255),
+                                                    (0, 0, 0, down / 15 * 255),
+                                                    (0, 0, 0, left / 15 * 255),
+                                                    (0, 0, 0, right / 15 * 255),
+                                                    2)
+        return surface
+
+    @classmethod
+    def warm(cls, light: numpy.ndarray, size):
+        """
+        Draw gradients of every lit tile in advance
+        :param light levels of tiles in (col, row) layout
+        """
+
+        block = numpy.abs(numpy.pad(light, 1).astype(numpy.int32))  # 0 outside of grid, as nbs_types
+        keys = block[1:-1, :-2] << 12 | block[1:-1, 2:] << 8 | block[:-2, 1:-1] << 4 | block[2:, 1:-1]
+        for key in numpy.unique(keys[light != 0]).tolist():
+            cls.get_gradient(key >> 12, key >> 8 & 15, key >> 4 & 15, key & 15, size)
 
-class GradientTile:
 
-    @staticmethod
-    def get_surface(grid, tile, size):
-        col = tile.col
-        row = tile.row
-        top, down, left, right = grid.get_nbs(col, row)
+def _atlas_layer(surfaces, index, offset: Tuple[int, int], tile_size: Tuple[int, int]) -> AtlasLayer:
+    """
+    :param surfaces sprites of layer, padded to size of largest
+    :param index sprite of [tile type, area, clip]
+    """
 
-        t_v = abs(top.type) if top else 0
-        d_v = abs(down.type) if down else 0
-        l_v = abs(left.type) if left else 0
-        r_v = abs(right.type) if right else 0
-        return gradient((size.x, size.y),
-                        (0, 0, 0, t_v / 15 * 255),
-                        (0, 0, 0, d_v / 15 * 255),
-                        (0, 0, 0, l_v / 15 * 255),
-                        (0, 0, 0, r_v / 15 * 255),
-                        2)
+    width = max(surface.get_width() for surface in surfaces)
+    height = max(surface.get_height() for surface in surfaces)
+    sprites = numpy.zeros((len(surfaces), height, width, 4), dtype=numpy.uint8)
+    masks = numpy.zeros((len(surfaces), height, width), dtype=bool)
+    for i, surface in enumerate(surfaces):
+        w, h = surface.get_size()
+        pixels = numpy.frombuffer(pygame.image.tostring(surface, "RGBA"), dtype=numpy.uint8)
+        sprites[i, :h, :w] = pixels.reshape((h, w, 4))
+        masks[i, :h, :w] = True
+    return AtlasLayer(sprites, masks, index, offset, tile_size)
+
+
+def _build_atlas(tile_width: int, tile_height: int) -> Atlas:
+    """ :return pixels of every tile sprite chunk bake blits, drawn by sprite resolvers at chunk tile size """
+
+    size = Vector(tile_width, tile_height)
+    offset = (tile_width // 2, tile_height // 2)
+    tile = Tile(0, 0, Tiles.NONE)
+
+    def layer(textures, areas, clips, get_surface, layer_offset):
+        surfaces = []
+        index = numpy.full((256, len(areas), clips), -1, dtype=numpy.int32)
+        for tile_type in textures:
+            if tile_type == Tiles.NONE:
+                continue  # never blitted
+            tile.type = tile_type
+            for a, area_type in enumerate(areas):
+                for clip in range(clips):
+                    tile.col = clip  # resolvers pick clip by col + row
+                    index[tile_type, a, clip] = len(surfaces)
+                    surfaces.append(get_surface(area_type).copy())
+        return _atlas_layer(surfaces, index, layer_offset, (tile_width, tile_height))
+
+    def clips(areas):
+        return int(numpy.lcm.reduce([len(area_type.value) for area_type in areas]))
+
+    foreground_areas = list(ForegroundSpriteResolver.Areas)
+    background_area = BackgroundSpriteResolver.resolve_tile_sprite_area_type(None, tile)
+    background = layer(BackgroundSpriteResolver.textures, [background_area], clips([background_area]),
+                       lambda _: BackgroundSpriteResolver.get_surface(None, tile, size + 16), (0, 0))
+    furniture = layer(FurnitureSpriteResolver.textures, [None], 1,
+                      lambda _: FurnitureSpriteResolver.get_sprite(None, tile, size).get_surface(), offset)
+    foreground = layer(ForegroundSpriteResolver.textures, foreground_areas, clips(foreground_areas),
+                       lambda area_type: ForegroundSpriteResolver.get_surface(None, tile, size, area_type), offset)
+    areas = numpy.array([foreground_areas.index(area_type) for area_type in ForegroundSpriteResolver.lookup])
+    return Atlas(tile_width, tile_height, background, furniture, foreground, areas)
 
 
 class PygameRenderer:
     class ActorRenderer:
 
-        def __init__(self, camera, actor, map_, tile_width: int, tile_height: int) -> None:
+        def __init__(self, camera, actor, map_, tile_width: int, tile_height: int, shaded: bool = True) -> None:
+            """ :param shaded draw light of tiles around actor over it """
             self.camera = camera
             self.actor = actor
+            self.shaded = shaded
 
             self.map = map_
             self.tile_width = tile_width
@@ -785,6 +985,8 @@ class PygameRenderer:
             sprite.set_time(abs(vel.x) * 7)
 
             self.light_surface.fill(Color(255, 255, 255, 0))
+            if not self.shaded:
+                return
             x, y = self.actor.pos.x, self.actor.pos.y
             w, h = self.actor.size.x + 5, self.actor.size.y + 5
 
@@ -794,9 +996,8 @@ class PygameRenderer:
 
             for c in range(s_c, e_c + 1):
                 for r in range(s_r, e_r + 1):
-                    tile = self.map.lighting.get_tile(c, r)
-                    if tile and tile.type != Tiles.NONE:
-                        gradient_surface = GradientTile.get_surface(self.map.lighting, tile, size)
+                    if self.map.lighting.type_at(c, r, Tiles.NONE) != Tiles.NONE:
+                        gradient_surface = GradientTile.get_surface(self.map.lighting, c, r, size)
                         t_x = c * self.tile_width - x
                         t_y = r * self.tile_height - y
                         self.light_surface.blit(gradient_surface, [t_x, t_y, w, h], None)
@@ -828,14 +1029,81 @@ class PygameRenderer:
 
         # TODO render background and foreground on one surface
 
+        class ChunkPool:
+            """ Bounded number of chunk surfaces, off screen chunks give theirs up in least recently used order """
+
+            def __init__(self, capacity: int, size: Tuple[int, int]) -> None:
+                """
+                :param capacity maximal number of chunks holding surface
+                :param size of chunk surface
+                """
+                self.capacity = capacity
+                self.size = size
+                self.chunks = OrderedDict()  # chunks holding surface, least recently used first
+                self.free = []  # surfaces of evicted chunks
+                self.hits = 0
+                self.misses = 0
+                self.evictions = 0
+                self.waits = 0  # acquires which found every surface held by chunk being baked
+
+            def acquire(self, chunk) -> bool:
+                """
+                Mark chunk as used, hand it surface if it has none
+                :return True when chunk holds surface, False when pool is full of chunks being baked and chunk has
+                to wait for later acquire
+                """
+
+                if chunk in self.chunks:
+                    self.chunks.move_to_end(chunk)
+                    self.hits += 1
+                    return True
+
+                if len(self.chunks) >= self.capacity and not self.evict():
+                    self.waits += 1
+                    return False
+
+                self.misses += 1
+                surface = self.free.pop() if self.free else Surface(self.size, SRCALPHA, 32)
+                surface.fill((0, 0, 0, 0))
+                chunk.surface = surface
+                self.chunks[chunk] = None
+                return True
+
+            def evict(self) -> bool:
+                """
+                Take surface of least recently used chunk, chunks being baked or re-baked are skipped
+                :return False when every chunk is being baked
+                """
+
+                for chunk in self.chunks:
+                    if not chunk.initializing and not chunk.rebaking:
+                        del self.chunks[chunk]
+                        self.free.append(chunk.release())
+                        self.evictions += 1
+                        return True
+                return False
+
+            def get_stats(self) -> Dict[str, int]:
+                """ :return hits, misses, evictions, waits, surfaces held and their memory in bytes """
+                surfaces = len(self.chunks) + len(self.free)
+                return {
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "waits": self.waits,
+                    "surfaces": surfaces,
+                    "memory": surfaces * self.size[0] * self.size[1] * 4
+                }
+
         class Chunk(Rect):
 
-            def __init__(self, camera, map_, surface, col: int, row: int, tile_width: int, tile_height: int,
+            def __init__(self, camera, map_, col: int, row: int, tile_width: int, tile_height: int,
                          tiles_x: int,
-                         tiles_y: int, lighting: bool) -> None:
+                         tiles_y: int, lighting: bool, pipeline: Union[None, BakePipeline] = None) -> None:
+                """ :param pipeline composing chunk pixels in worker processes, chunk blits its tiles when None """
                 self.camera = camera
                 self.map = map_
-                self.surface = surface
+                self.surface = None  # given by ChunkPool
                 self.col = col
                 self.row = row
                 self.tile_width = tile_width
@@ -844,7 +1112,10 @@ class PygameRenderer:
                 self.tiles_y = tiles_y
                 self.initialized = False
                 self.initializing = False
+                self.rebaking = False  # pool keeps surface of chunk until its re-bake swaps it
+                self.changes = 0  # region changes reported while chunk was not baked
                 self.lighting = lighting
+                self.pipeline = pipeline
 
                 width = tiles_x * tile_width
                 height = tiles_y * tile_height
@@ -852,68 +1123,138 @@ class PygameRenderer:
                 y = row * height
                 super().__init__(x, y, width, height)
 
-            def init_surface(self):
-                """ Initialize chunk surface """
+            def init_surface(self) -> Iterator[Union[None, Future]]:
+                """ Initialize chunk surface, slice by slice, see bake_slices """
 
-                for col in range(self.tiles_x):
-                    for row in range(self.tiles_y):
-                        if self.lighting:
-                            tile = self.get_tile(col, row, GridType.LIGHTING)
-                            if tile and tile.type > -15:  # lighting depth
-                                tile = self.get_tile(col, row, GridType.BACKGROUND)
-                                if tile and tile.type != Tiles.NONE:
-                                    self.blit_tile(tile, GridType.BACKGROUND)
-                                tile = self.get_tile(col, row, GridType.FURNITURE)
-                                if tile and tile.type != Tiles.NONE:
-                                    self.blit_tile(tile, GridType.FURNITURE)
-                                tile = self.get_tile(col, row, GridType.FOREGROUND)
-                                if tile and tile.type != Tiles.NONE:
-                                    self.blit_tile(tile, GridType.FOREGROUND)
-                            tile = self.get_tile(col, row, GridType.LIGHTING)
-                            if tile and tile.type != Tiles.NONE:
-                                self.blit_tile(tile, GridType.LIGHTING)
-                        else:
-                            tile = self.get_tile(col, row, GridType.BACKGROUND)
-                            if tile and tile.type != Tiles.NONE:
-                                self.blit_tile(tile, GridType.BACKGROUND)
-                            tile = self.get_tile(col, row, GridType.FURNITURE)
-                            if tile and tile.type != Tiles.NONE:
-                                self.blit_tile(tile, GridType.FURNITURE)
-                            tile = self.get_tile(col, row, GridType.FOREGROUND)
-                            if tile and tile.type != Tiles.NONE:
-                                self.blit_tile(tile, GridType.FOREGROUND)
+                if self.pipeline is not None and self.pipeline.is_full():
+                    # renderer submits chunk again, with priority of its next update
+                    self.initializing = False
+                    return
 
+                while True:
+                    changes = self.changes
+                    yield from self.bake_slices(self.surface)
+                    if changes == self.changes:
+                        break
+                    self.surface.fill((0, 0, 0, 0))  # tiles changed while baking, drawn slices may be stale
                 self.initialized = True
                 self.initializing = False
 
-            def get_tile(self, col: int, row: int, grid_type: GridType):
+            def release(self) -> Surface:
+                """ Give up surface, chunk is baked again once it gets new one """
+                surface, self.surface = self.surface, None
+                self.initialized = False
+                return surface
 
-                tile_col = col + self.col * self.tiles_x
-                tile_row = row + self.row * self.tiles_y
+            def rebake(self) -> Iterator[Union[None, Future]]:
+                """ Redraw whole chunk into new surface and swap it in, renderer never sees half drawn chunk """
 
-                if grid_type == GridType.BACKGROUND:
-                    return self.map.background.get_tile(tile_col, tile_row)
-                elif grid_type == GridType.FURNITURE:
-                    return self.map.furniture.get_tile(tile_col, tile_row)
-                elif grid_type == GridType.FOREGROUND:
-                    return self.map.foreground.get_tile(tile_col, tile_row)
-                elif grid_type == GridType.LIGHTING:
-                    return self.map.lighting.get_tile(tile_col, tile_row)
-                else:
-                    raise AttributeError
+                current = self.surface
+                if current is None:
+                    return  # evicted meanwhile
 
-            def blit_tile(self, tile: Tile, grid_type: GridType):
-                """ Blit tile sprite into chunk surface """
+                surface = Surface(current.get_size(), SRCALPHA, 32)
+                self.rebaking = True
+                try:
+                    yield from self.bake_slices(surface)
+                finally:
+                    self.rebaking = False
+                self.surface = surface
+
+            def bake(self, surface: Surface):
+                """ Draw all layers of chunk tiles into surface at once """
+                for waiting in self.bake_slices(surface):
+                    if waiting is not None:
+                        waiting.result()
+
+            def bake_slices(self, surface: Surface) -> Iterator[Union[None, Future]]:
+                """
+                Draw all layers of chunk tiles into surface, yields after each column of tiles,
+                or futures of pipeline to wait for
+                """
+
+                if self.pipeline is not None:
+                    yield from self.bake_pixels(surface)
+                    return
+
+                s_col = self.col * self.tiles_x
+                s_row = self.row * self.tiles_y
+                e_col = s_col + self.tiles_x
+                e_row = s_row + self.tiles_y
+                background = self.map.background.region(s_col, s_row, e_col, e_row)
+                furniture = self.map.furniture.region(s_col, s_row, e_col, e_row)
+                foreground = self.map.foreground.region(s_col, s_row, e_col, e_row)
+                light = self.map.lighting.region(s_col, s_row, e_col, e_row)
+                signatures = ForegroundSpriteResolver.get_signatures(self.map.foreground, s_col, s_row, e_col, e_row)
+                lookup = ForegroundSpriteResolver.lookup
+
+                tile = Tile(0, 0, Tiles.NONE)  # reused for every blit, resolvers do not keep it
+
+                def blit(grid_type: GridType, tile_type: int, area_type=None):
+                    if tile_type != Tiles.NONE:
+                        tile.type = tile_type
+                        self.blit_tile(tile, grid_type, area_type, surface)
+
+                for col in range(light.shape[0]):
+                    for row in range(light.shape[1]):
+                        tile.col = s_col + col
+                        tile.row = s_row + row
+                        light_type = light.item(col, row)
+                        if not self.lighting or light_type > -15:  # lighting depth
+                            blit(GridType.BACKGROUND, background.item(col, row))
+                            blit(GridType.FURNITURE, furniture.item(col, row))
+                            blit(GridType.FOREGROUND, foreground.item(col, row), lookup[signatures[col, row]])
+                        if self.lighting:
+                            blit(GridType.LIGHTING, light_type)
+                    yield
+
+            def bake_pixels(self, surface: Surface) -> Iterator[Union[None, Future]]:
+                """ Compose all layers of chunk tiles in worker process and copy them into surface, see BakePipeline """
+
+                s_col = self.col * self.tiles_x
+                s_row = self.row * self.tiles_y
+                e_col = s_col + self.tiles_x
+                e_row = s_row + self.tiles_y
+                background = self.map.background.region(s_col, s_row, e_col, e_row)
+                furniture = self.map.furniture.region(s_col, s_row, e_col, e_row)
+                foreground = self.map.foreground.region(s_col, s_row, e_col, e_row)
+                e_col, e_row = s_col + foreground.shape[0], s_row + foreground.shape[1]  # clipped to map
+                signatures = ForegroundSpriteResolver.get_signatures(self.map.foreground, s_col, s_row, e_col, e_row)
+
+                # light levels with one tile border of neighbours, 0 outside of map
+                grid = self.map.lighting
+                light = numpy.zeros((e_col - s_col + 2, e_row - s_row + 2), dtype=numpy.int8)
+                h_s_col, h_s_row = max(0, s_col - 1), max(0, s_row - 1)
+                h_e_col, h_e_row = min(grid.width, e_col + 1), min(grid.height, e_row + 1)
+                light[h_s_col - s_col + 1:h_e_col - s_col + 1, h_s_row - s_row + 1:h_e_row - s_row + 1] = \
+                    grid.tiles[h_s_col:h_e_col, h_s_row:h_e_row]
+
+                slot = yield from self.pipeline.compose(s_col, s_row, self.lighting, numpy.array(background),
+                                                        numpy.array(furniture), numpy.array(foreground),
+                                                        signatures, light)
+                try:
+                    pixels = pygame.image.frombuffer(self.pipeline.get_buffer(slot), surface.get_size(), PIXEL_FORMAT)
+                    surface.fill((0, 0, 0, 0))
+                    surface.blit(pixels, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)  # copy, onto zeros
+                    del pixels
+                finally:
+                    self.pipeline.release(slot)
+
+            def blit_tile(self, tile: Tile, grid_type: GridType, area_type=None, surface: Surface = None):
+                """
+                Blit tile sprite into chunk surface
+                :param area_type of foreground tile, resolved from its neighbours when None
+                :param surface to blit into instead of chunk surface
+                """
 
                 size = Vector(self.tile_width, self.tile_height)
 
                 if grid_type == GridType.FOREGROUND:
-                    tile_surface = ForegroundSpriteResolver.get_sprite(self.map.foreground, tile, size).get_surface()
+                    tile_surface = ForegroundSpriteResolver.get_surface(self.map.foreground, tile, size, area_type)
                 elif grid_type == GridType.BACKGROUND:
-                    tile_surface = BackgroundSpriteResolver.get_sprite(self.map.background, tile,
-                                                                       size + 16).get_surface()
+                    tile_surface = BackgroundSpriteResolver.get_surface(self.map.background, tile, size + 16)
                 elif grid_type == GridType.LIGHTING:
-                    tile_surface = GradientTile.get_surface(self.map.lighting, tile, size)
+                    tile_surface = GradientTile.get_surface(self.map.lighting, tile.col, tile.row, size)
                 elif grid_type == GridType.FURNITURE:
                     tile_surface = FurnitureSpriteResolver.get_sprite(self.map.furniture, tile, size).get_surface()
                 else:
@@ -925,7 +1266,7 @@ class PygameRenderer:
                 x = col * self.tile_width + (self.tile_width / 2 if grid_type != GridType.BACKGROUND else 0)
                 y = row * self.tile_height + (self.tile_height / 2 if grid_type != GridType.BACKGROUND else 0)
 
-                self.surface.blit(tile_surface, (x, y))
+                (self.surface if surface is None else surface).blit(tile_surface, (x, y))
 
             def blit_empty(self, col, row):
                 # translate map col - row to chunk col - row
@@ -935,68 +1276,145 @@ class PygameRenderer:
                 self.surface.blit(surface, (x, y), special_flags=BLEND_RGBA_MIN)
 
             def update_tile(self, col: int, row: int):
-                col = col % self.tiles_x
-                row = row % self.tiles_y
-
-                self.blit_empty(col, row)
-                tile = self.get_tile(col, row, GridType.BACKGROUND)
-                if tile and tile.type != Tiles.NONE:
-                    self.blit_tile(tile, GridType.BACKGROUND)
-                tile = self.get_tile(col, row, GridType.FURNITURE)
-                if tile and tile.type != Tiles.NONE:
-                    self.blit_tile(tile, GridType.FURNITURE)
-                tile = self.get_tile(col, row, GridType.FOREGROUND)
-                if tile and tile.type != Tiles.NONE:
-                    self.blit_tile(tile, GridType.FOREGROUND)
+                if not self.initialized:
+                    return  # bake draws current tiles
+
+                self.blit_empty(col % self.tiles_x, row % self.tiles_y)
+
+                layers = [(self.map.background, GridType.BACKGROUND),
+                          (self.map.furniture, GridType.FURNITURE),
+                          (self.map.foreground, GridType.FOREGROUND)]
                 if self.lighting:
-                    tile = self.get_tile(col, row, GridType.LIGHTING)
-                    if tile and tile.type != Tiles.NONE:
-                        self.blit_tile(tile, GridType.LIGHTING)
+                    layers.append((self.map.lighting, GridType.LIGHTING))
 
-            def update(self, delta_time: float):
-                if not self.initialized and not self.initializing:
-                    self.initializing = True
-                    run_in_thread(self.init_surface, tuple(), priority=10)
+                tile = Tile(col, row, Tiles.NONE)  # reused for every layer
+                for grid, grid_type in layers:
+                    tile.type = grid.type_at(col, row, Tiles.NONE)
+                    if tile.type != Tiles.NONE:
+                        self.blit_tile(tile, grid_type)
 
             def render(self, delta_time: float):
                 if self.initialized:
                     self.camera.draw_surface(self.surface, self.pos - 8, None)
 
         def __init__(self, camera, map_, tile_width: int, tile_height: int, chunk_width: int,
-                     chunk_height: int, lighting_enabled: bool) -> None:
+                     chunk_height: int, lighting_enabled: bool, cache_memory: int, prefetch_time: float,
+                     bake_workers: int = 0, light_map: bool = False) -> None:
+            """
+            :param cache_memory unit [MB] held by chunk surfaces, raised to fit chunks around screen
+            :param prefetch_time unit [s], chunks camera is predicted to show within it are baked ahead
+            :param bake_workers processes composing chunk pixels, chunks are blitted on main thread when 0
+            :param light_map lighting is drawn over frame by LightMapRenderer, chunks are baked unlit
+            """
             self.camera = camera
             self.map = map_
 
             self.lighting_enabled = lighting_enabled
+            self.light_baked = lighting_enabled and not light_map  # chunks are re-baked when light changes
             self.tile_width = tile_width
             self.tile_height = tile_height
             self.chunk_width = chunk_width
             self.chunk_height = chunk_height
-            self.chunks: Dict[str, PygameRenderer.MapRenderer.Chunk] = {}
-
-            for col in range(int(self.map.width / chunk_width) + 1):
-                for row in range(int(self.map.height / chunk_height) + 1):
-                    surface = Surface(
-                        (chunk_width * tile_width + tile_width, chunk_height * tile_height + tile_height),
-                        SRCALPHA, 32)
-                    self.chunks[chunk_key(col, row)] = PygameRenderer.MapRenderer.Chunk(
-                        self.camera,
-                        self.map,
-                        surface,
-                        col,
-                        row,
-                        self.tile_width,
-                        self.tile_height,
-                        self.chunk_width,
-                        self.chunk_height,
-                        lighting_enabled
-                    )
+            self.chunks: Dict[str, PygameRenderer.MapRenderer.Chunk] = {}  # created on first use
+            self.dirty = []  # bounding boxes of region changes waiting for update_region, see merge_box
+            self.light_changes = None  # tiles changed waiting for update_light
+            self.light_changed_at = 0.0  # unit [s] of first of them
+            self.light_updates = 0
+            self.light_time = 0.0  # unit [ms] spent relighting
+            self.light_latency = 0.0  # unit [ms] summed from first change to relit tiles of each update
+            self.prefetch_time = prefetch_time
+            self.bakes: Dict[PygameRenderer.MapRenderer.Chunk, Future] = {}  # chunks waiting to be baked
+            self.visible = 0  # chunks rendered while on screen
+            self.pop_ins = 0  # of them not baked yet
+
+            size = (chunk_width * tile_width + tile_width, chunk_height * tile_height + tile_height)
+            # chunks update touches each frame, screen now and up to one screen ahead
+            updated = (2 * int(camera.size.x / (chunk_width * tile_width)) + 7) * \
+                      (2 * int(camera.size.y / (chunk_height * tile_height)) + 7)
+            capacity = max(updated, cache_memory * 2 ** 20 // (size[0] * size[1] * 4))
+            self.pool = PygameRenderer.MapRenderer.ChunkPool(capacity, size)
+            self.pipeline = BakePipeline(bake_workers, _build_atlas(tile_width, tile_height), size) \
+                if bake_workers > 0 else None
+            if self.light_baked:
+                # gradients of screens around where camera settles are drawn ahead, others when first baked
+                followee = camera.scene.get_followee()
+                pos = followee.pos + followee.size / 2 - camera.size / 2 if followee else camera.pos
+                cols, rows = int(camera.size.x / tile_width) + 1, int(camera.size.y / tile_height) + 1
+                s_col, s_row = int(pos.x / tile_width) - cols, int(pos.y / tile_height) - rows
+                GradientTile.warm(self.map.lighting.region(s_col, s_row, s_col + 3 * cols, s_row + 3 * rows),
+                                  Vector(tile_width, tile_height))
+                self.map.lighting.add_listener(self)  # light map writes without edit, e.g. generating regions
 
             self.map.add_map_listener(self)
 
+        def exit(self):
+            """ Stop listening to map and stop bake workers """
+            self.map.remove_map_listener(self)
+            if self.light_baked:
+                self.map.lighting.remove_listener(self)
+            if self.pipeline is not None:
+                self.pipeline.close()
+
         def get_chunk(self, chunk_col: int, chunk_row: int) -> Chunk:
             """ :return chunk: """
-            return self.chunks[chunk_key(chunk_col, chunk_row)]
+            key = chunk_key(chunk_col, chunk_row)
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = PygameRenderer.MapRenderer.Chunk(
+                    self.camera,
+                    self.map,
+                    chunk_col,
+                    chunk_row,
+                    self.tile_width,
+                    self.tile_height,
+                    self.chunk_width,
+                    self.chunk_height,
+                    self.light_baked,
+                    self.pipeline
+                )
+                self.chunks[key] = chunk
+            return chunk
+
+        def get_pool_stats(self) -> Dict[str, int]:
+            """ :return chunk surface pool counters, see ChunkPool.get_stats """
+            return self.pool.get_stats()
+
+        def get_pop_in_stats(self) -> Dict[str, float]:
+            """ :return chunks rendered on screen, how many of them were not baked yet and their ratio """
+            return {
+                "visible": self.visible,
+                "pop_ins": self.pop_ins,
+                "rate": self.pop_ins / self.visible if self.visible else 0.0
+            }
+
+        def get_light_stats(self) -> Dict[str, float]:
+            """ :return relights of tile changes, their mean time and mean latency from change in ms """
+            return {
+                "updates": self.light_updates,
+                "time": self.light_time / self.light_updates if self.light_updates else 0.0,
+                "latency": self.light_latency / self.light_updates if self.light_updates else 0.0
+            }
+
+        def get_bake_priority(self, chunk: Chunk, pos: Vector, vel: Vector) -> float:
+            """
+            :param chunk not baked yet
+            :param pos of camera
+            :param vel unit [px/s] of camera
+            :return priority of baking chunk, BAKE_PRIORITY when visible, later by estimated seconds to be visible
+            """
+
+            size = self.camera.size
+            dx = max(0, chunk.pos.x - (pos.x + size.x), pos.x - (chunk.pos.x + chunk.size.x))
+            dy = max(0, chunk.pos.y - (pos.y + size.y), pos.y - (chunk.pos.y + chunk.size.y))
+            distance = hypot(dx, dy)
+            if distance == 0:
+                return BAKE_PRIORITY
+
+            offset = (chunk.pos + chunk.size / 2) - (pos + size / 2)
+            speed = vel.dot(offset) / offset.mag()  # towards chunk
+            if speed < 0:
+                return BAKE_PRIORITY + BAKE_BEHIND_PENALTY + distance / BAKE_MIN_SPEED
+            return BAKE_PRIORITY + distance / max(speed, BAKE_MIN_SPEED)
 
         def get_tile_chunk(self, tile_col: int, tile_row: int) -> Chunk:
             """ :return: chunk for tile """
@@ -1006,85 +1424,21 @@ class PygameRenderer:
 
             return self.get_chunk(chunk_col, chunk_row)
 
-        def update_light(self, tile: Tile, grid_type: GridType):
+        def update_light(self) -> None:
+            """ Relight tiles changed since last update at once, redraw tiles whose light changed """
 
-            if grid_type == GridType.FOREGROUND:
-                destroyed = (tile.type == Tiles.NONE)
-            elif grid_type == GridType.BACKGROUND:
-                destroyed = (tile.type == Tiles.NONE)
-            else:
-                destroyed = (tile.type == Tiles.WHITE_TORCH)
-
-            redraw = set()
-
-            if destroyed:  # tile removed ( light added )
-
-                lc, lr = tile.col, tile.row
-                min_d = {}
-                for c in range(tile.col - 14, tile.col + 16):
-                    for r in range(tile.row - 14, tile.row + 16):
-                        dx = lc - c if lc > c else c - lc
-                        dy = lr - r if lr > r else r - lr
-                        d = dx + dy
-                        min_d[(c, r)] = d
-
-                for tc, tr in min_d.keys():
-                    d = min_d.get((tc, tr))
-                    t = self.map.lighting.get_tile(tc, tr)
-                    if t and d <= abs(t.type):
-                        self.map.lighting.set_tile(tc, tr, -d)
-                        redraw.add((tc, tr))
-
-            else:  # tile added ( light removed )
-
-                lc, lr = tile.col, tile.row
-                max_d = {}
-                for c in range(tile.col - 14, tile.col + 16):
-                    for r in range(tile.row - 14, tile.row + 16):
-                        dx = lc - c if lc > c else c - lc
-                        dy = lr - r if lr > r else r - lr
-                        d = dx + dy
-
-                        if d < 16:
-                            max_d[(c, r)] = d
-
-                lights = set()
-                masks = set()
-                for tc, tr in max_d.keys():
-                    d = max_d.get((tc, tr))
-                    t = self.map.lighting.get_tile(tc, tr)
-                    if t:
-                        if d > abs(t.type):
-                            lights.add((tc, tr, abs(t.type)))
-                        else:
-                            self.map.lighting.set_tile(tc, tr, -14)
-                            redraw.add((tc, tr))
-                            masks.add((tc, tr))
-
-                min_d = {}
-                for lc, lr, dp in lights:
-                    for c, r in masks:
-                        dx = lc - c if lc > c else c - lc
-                        dy = lr - r if lr > r else r - lr
-                        d = dx + dy
-                        if dp + d < 16:
-                            m_d = min_d.get((c, r))
-                            if m_d is None:
-                                min_d[(c, r)] = dp + d
-                            else:
-                                min_d[(c, r)] = min(m_d, dp + d)
-
-                for tc, tr in min_d.keys():
-                    d = min_d[(tc, tr)]
-                    t = self.map.lighting.get_tile(tc, tr)
-                    if t and d <= abs(t.type):
-                        self.map.lighting.set_tile(tc, tr, -d)
-                        redraw.add((tc, tr))
-
-            for c, r in redraw:
-                chunk = self.get_tile_chunk(c, r)
-                tile = self.map.lighting.get_tile(c, r)
-                chunk.update_tile(tile.col, tile.row)
+            tiles, self.light_changes = self.light_changes, None
+
+            started = time.perf_counter()
+            lit = propagate_light(self.map, tiles)
+            self.light_updates += 1
+            self.light_time += (time.perf_counter() - started) * 1000
+            self.light_latency += (time.perf_counter() - self.light_changed_at) * 1000
+
+            if self.light_baked:
+                for c, r in lit:
+                    chunk = self.get_tile_chunk(c, r)
+                    chunk.update_tile(c, r)
 
         def on_tile_change(self, tile: Tile, grid_id: GridType):
 
@@ -1104,34 +1458,74 @@ class PygameRenderer:
                 chunk = self.get_tile_chunk(col, row)
                 chunk.update_tile(col, row)
 
-            b_tile = self.map.background.get_tile(c, r)
-            if self.lighting_enabled and (
-                    (grid_id == GridType.FOREGROUND and b_tile.type == Tiles.NONE) or
-                    (grid_id != GridType.FOREGROUND)
-            ):
-                run_in_thread(self.update_light, (tile, grid_id), priority=5)
+            if self.lighting_enabled:
+                self.add_light_changes([(c, r)])
+
+        def add_light_changes(self, tiles: List[Tuple[int, int]]) -> None:
+            # changes coming before update runs are relit together
+            if self.light_changes is None:
+                self.light_changes = tiles
+                self.light_changed_at = time.perf_counter()
+                submit_sliced(self.update_light, priority=5)
+            else:
+                self.light_changes.extend(tiles)
+
+        def on_region_change(self, grid, s_col: int, s_row: int, e_col: int, e_row: int):
+            # relit as tiles are, update_light submitted first runs before chunks are re-baked
+            # change of lighting layer was lit by map already
+            if self.lighting_enabled and grid is not self.map.lighting:
+                self.add_light_changes([(col, row) for col in range(s_col, e_col) for row in range(s_row, e_row)])
+
+            # changes of all layers coming before update runs are merged into boxes, far apart ones stay apart
+            if not self.dirty:
+                submit_sliced(self.update_region, priority=5)
+            merge_box(self.dirty, (s_col, s_row, e_col, e_row), REGION_GAP)
+
+        def update_region(self) -> Iterator[None]:
+            """ Re-bake every chunk showing a change once, chunk by chunk """
+
+            boxes, self.dirty = self.dirty, []
+
+            m_col = int(self.map.width / self.chunk_width)
+            m_row = int(self.map.height / self.chunk_height)
+            keys = {}  # chunks in order of changes
+            for s_col, s_row, e_col, e_row in boxes:
+                # autotiled neighbours of changed tiles change their look too
+                s_col, s_row, e_col, e_row = s_col - 1, s_row - 1, e_col + 1, e_row + 1
+                for col in range(max(0, s_col // self.chunk_width), min(m_col, (e_col - 1) // self.chunk_width) + 1):
+                    for row in range(max(0, s_row // self.chunk_height),
+                                     min(m_row, (e_row - 1) // self.chunk_height) + 1):
+                        keys[chunk_key(col, row)] = None
+
+            for key in keys:
+                chunk = self.chunks.get(key)
+                if chunk is None:
+                    continue
+                if chunk.initialized:
+                    yield from chunk.rebake()
+                else:
+                    chunk.changes += 1  # bake in progress starts over
 
         def update(self, delta_time):
-            x = self.camera.pos.x
-            y = self.camera.pos.y
+            pos = self.camera.pos
+            size = self.camera.size
 
-            if x < 0:
-                x = 0
-            if y < 0:
-                y = 0
+            # camera path over prefetch time, at most one screen ahead
+            predicted = self.camera.predict(self.prefetch_time)
+            ahead = Vector(min(max(predicted.x - pos.x, -size.x), size.x),
+                           min(max(predicted.y - pos.y, -size.y), size.y))
+            vel = ahead / self.prefetch_time if self.prefetch_time > 0 else Vector(0, 0)
 
-            # create chunks if can be visible
+            # create chunks if can be visible now or along path
             chunk_width = self.chunk_width * self.tile_width
             chunk_height = self.chunk_height * self.tile_height
-            chunk_col = int(x / chunk_width)
-            chunk_row = int(y / chunk_height)
-            chunks_per_width = int(self.camera.size.x / chunk_width) + 2
-            chunks_per_height = int(self.camera.size.y / chunk_height) + 2
+            chunks_per_width = int(size.x / chunk_width) + 2
+            chunks_per_height = int(size.y / chunk_height) + 2
 
-            s_col = chunk_col - 2
-            s_row = chunk_row - 2
-            e_col = chunk_col + chunks_per_width + 2
-            e_row = chunk_row + chunks_per_height + 2
+            s_col = int(max(0, min(pos.x, pos.x + ahead.x)) / chunk_width) - 2
+            s_row = int(max(0, min(pos.y, pos.y + ahead.y)) / chunk_height) - 2
+            e_col = int(max(0, max(pos.x, pos.x + ahead.x)) / chunk_width) + chunks_per_width + 2
+            e_row = int(max(0, max(pos.y, pos.y + ahead.y)) / chunk_height) + chunks_per_height + 2
 
             if s_col < 0:
                 s_col = 0
@@ -1144,10 +1538,28 @@ class PygameRenderer:
             if e_row > m_row:
                 e_row = m_row
 
+            self.map.ensure_region(s_col * self.chunk_width, s_row * self.chunk_height,
+                                   e_col * self.chunk_width, e_row * self.chunk_height)
+
+            # priorities are refreshed each frame, chunks off path wait until it reaches them again
+            bakes = {}
             for col in range(s_col, e_col):
                 for row in range(s_row, e_row):
                     chunk = self.get_chunk(col, row)
-                    chunk.update(delta_time)
+                    if not self.pool.acquire(chunk):
+                        continue  # baked once pool has surface for it
+                    if not chunk.initialized:
+                        future = self.bakes.get(chunk)
+                        if future is None or not future.running():
+                            chunk.initializing = True
+                            future = submit_sliced(chunk.init_surface,
+                                                   priority=self.get_bake_priority(chunk, pos, vel), key=chunk)
+                        bakes[chunk] = future
+
+            for chunk, future in self.bakes.items():
+                if chunk not in bakes and future.cancel():
+                    chunk.initializing = False
+            self.bakes = bakes
 
         def render(self, delta_time: float):
             x = self.camera.pos.x
@@ -1182,6 +1594,10 @@ class PygameRenderer:
             for col in range(s_col, e_col):
                 for row in range(s_row, e_row):
                     chunk = self.get_chunk(col, row)
+                    if chunk.pos.x < x + self.camera.size.x and chunk.pos.y < y + self.camera.size.y:
+                        self.visible += 1
+                        if not chunk.initialized:
+                            self.pop_ins += 1
                     chunk.render(delta_time)
 
     class WorldRenderer(SceneListener):
@@ -1219,6 +1635,150 @@ class PygameRenderer:
                     pos = Vector(_ * w - ((x * 0.25) % w), translated_y if translated_y > min_y else min_y)
                     self.camera.draw_sprite(sprite, pos, delta_time, translate=False)
 
+        class LightMapRenderer:
+            """ Light of visible tiles as texture of tile resolution, smoothly scaled and multiplied over frame """
+
+            def __init__(self, camera, map_, tile_width: int, tile_height: int,
+                         color_lighting: Union[None, ColorLighting] = None,
+                         day_cycle: Union[None, DayCycle] = None) -> None:
+                """
+                :param color_lighting texture shows its colored light instead of lighting grid when given
+                :param day_cycle scales light, sources other than sky keep their light, full light when None
+                """
+                self.camera = camera
+                self.map = map_
+                self.color_lighting = color_lighting
+                self.day_cycle = day_cycle
+                self.daylight = 1.0
+                # light of furniture sources alone, drawn where it is brighter than scaled light
+                self.emitted = ColorLighting(map_, sky=False, colored=color_lighting is not None) \
+                    if day_cycle is not None else None
+                self.tile_width = tile_width
+                self.tile_height = tile_height
+                self.cols = int(camera.size.x / tile_width) + LIGHT_MAP_MARGIN + 3
+                self.rows = int(camera.size.y / tile_height) + LIGHT_MAP_MARGIN + 3
+                # texture spans centers of tiles, tile at first pixel is origin
+                size = ((self.cols - 1) * tile_width, (self.rows - 1) * tile_height)
+                self.surface = Surface(size, 0, 32)
+                self.back = Surface(size, 0, 32)  # texture is scrolled into it when origin moves
+                self.origin = None
+                self.light = None  # packed colors of light and emitted light texture shows
+                self.builds = 0  # unit [tiles] scaled into texture
+
+                # baked gradients shade tile twice, by vertical and horizontal neighbours, same falloff keeps its look
+                levels = numpy.arange(LIGHT_DEPTH + 2)
+                brightness = (levels ** 2 * 255 // (LIGHT_DEPTH + 1) ** 2).astype(numpy.uint8)
+                self.colors = brightness[unpack_color(numpy.arange(1 << 3 * COLOR_BITS))]  # of packed levels
+                self.grays = pack_color(numpy.repeat(levels[:, None], 3, axis=1))  # packed colors of levels
+
+            def exit(self):
+                for lighting in (self.color_lighting, self.emitted):
+                    if lighting is not None:
+                        lighting.exit()
+
+            def update(self, delta_time: float):
+                if self.day_cycle is not None:
+                    self.day_cycle.update(delta_time)
+                    daylight = self.day_cycle.get_daylight()
+                    if daylight != self.daylight:
+                        self.daylight = daylight
+                        self.origin = None  # whole texture is scaled again
+
+            def render(self, delta_time: float):
+                tile_width, tile_height = self.tile_width, self.tile_height
+                margin = LIGHT_MAP_MARGIN
+                # origin snaps to margin, so texture scrolls only once camera moves that many tiles
+                s_col = int((self.camera.pos.x - tile_width / 2) // (tile_width * margin)) * margin
+                s_row = int((self.camera.pos.y - tile_height / 2) // (tile_height * margin)) * margin
+
+                e_col, e_row = s_col + self.cols, s_row + self.rows
+                for lighting in (self.color_lighting, self.emitted):
+                    if lighting is not None:
+                        # stale blocks shown or half block away are computed by frame job, texture shows them later
+                        lighting.request(s_col - COLOR_BLOCK // 2, s_row - COLOR_BLOCK // 2, e_col + COLOR_BLOCK // 2,
+                                         e_row + COLOR_BLOCK // 2, BAKE_PRIORITY)
+                white = len(self.colors) - 1
+                light = numpy.full((self.cols, self.rows), white << 3 * COLOR_BITS | white, dtype=numpy.uint32)
+                if self.color_lighting is None:
+                    region = self.grays[self.map.lighting.region(s_col, s_row, e_col, e_row) + LIGHT_DEPTH + 1]
+                else:
+                    region = self.color_lighting.region(s_col, s_row, e_col, e_row)
+                o_col, o_row = max(0, -s_col), max(0, -s_row)
+                view = light[o_col:o_col + region.shape[0], o_row:o_row + region.shape[1]]
+                view[...] = region
+                view <<= 3 * COLOR_BITS
+                if self.emitted is not None:
+                    view |= self.emitted.region(s_col, s_row, e_col, e_row)
+
+                self.build(light, (s_col, s_row))
+
+                pos = Vector(s_col * tile_width + tile_width / 2, s_row * tile_height + tile_height / 2)
+                self.camera.draw_surface(self.surface, pos, None, special_flags=pygame.BLEND_RGB_MULT)
+
+            def build(self, light: numpy.ndarray, origin: Tuple[int, int]):
+                """
+                Bring texture to light levels, only parts around changed or newly shown tiles are scaled again
+                :param light packed colors of light and emitted light of tiles in (col, row) layout, see render
+                :param origin col, row of first tile of light
+                """
+
+                cols, rows = self.cols, self.rows
+                changed = numpy.ones((cols, rows), dtype=bool)
+                if self.origin is not None:
+                    d_col, d_row = origin[0] - self.origin[0], origin[1] - self.origin[1]
+                    if d_col or d_row:
+                        self.back.blit(self.surface, (-d_col * self.tile_width, -d_row * self.tile_height))
+                        self.surface, self.back = self.back, self.surface
+                    # tiles shown before keep their pixels unless their level changed
+                    s_col, e_col = max(0, -d_col), min(cols, cols - d_col)
+                    s_row, e_row = max(0, -d_row), min(rows, rows - d_row)
+                    if s_col < e_col and s_row < e_row:
+                        changed[s_col:e_col, s_row:e_row] = \
+                            light[s_col:e_col, s_row:e_row] != \
+                            self.light[s_col + d_col:e_col + d_col, s_row + d_row:e_row + d_row]
+                self.origin = origin
+                self.light = light
+
+                # newly shown columns, newly shown rows, changes between them
+                patches = []
+                shown_cols, shown_rows = changed.all(axis=1), changed.all(axis=0)
+                if shown_cols.any():
+                    c_cols = numpy.nonzero(shown_cols)[0]
+                    patches.append((c_cols[0], c_cols[-1], 0, rows - 1))
+                if shown_rows.any() and not shown_cols.all():
+                    c_rows = numpy.nonzero(shown_rows)[0]
+                    patches.append((0, cols - 1, c_rows[0], c_rows[-1]))
+                changed[shown_cols] = False
+                changed[:, shown_rows] = False
+                if changed.any():
+                    c_cols = numpy.nonzero(changed.any(axis=1))[0]
+                    c_rows = numpy.nonzero(changed.any(axis=0))[0]
+                    patches.append((c_cols[0], c_cols[-1], c_rows[0], c_rows[-1]))
+
+                # pixels between centers of changed tile and its neighbours change
+                for s_col, e_col, s_row, e_row in patches:
+                    s_col, e_col = max(0, s_col - 1), min(cols - 1, e_col + 1)
+                    s_row, e_row = max(0, s_row - 1), min(rows - 1, e_row + 1)
+                    self.scale_into(light[s_col:e_col + 1, s_row:e_row + 1], s_col, s_row)
+
+            def scale_into(self, light: numpy.ndarray, col: int, row: int):
+                """ Draw texture between centers of tiles of light block, its first tile at col, row of texture """
+
+                cols, rows = light.shape
+                if cols < 2 or rows < 2:
+                    return
+                pixels = self.colors[light >> 3 * COLOR_BITS]
+                if self.daylight < 1:
+                    pixels = (pixels.astype(numpy.uint16) * int(self.daylight * 256) >> 8).astype(numpy.uint8)
+                    numpy.maximum(pixels, self.colors[light & len(self.colors) - 1], out=pixels)
+                texture = Surface((cols, rows), 0, 32)
+                pygame.surfarray.blit_array(texture, pixels)
+                # smoothscale puts pixel i at i * width / (cols - 1), one tile apart
+                scaled = pygame.transform.smoothscale(texture, ((cols - 1) * self.tile_width,
+                                                                (rows - 1) * self.tile_height))
+                self.surface.blit(scaled, (col * self.tile_width, row * self.tile_height))
+                self.builds += cols * rows
+
         class InventoryRenderer:
 
             def __init__(self, camera, inventory, item_width: int, item_height: int, item_spacing: int) -> None:
@@ -1298,24 +1858,45 @@ class PygameRenderer:
             inv_item_spacing = settings.get_inventory_spacing()
 
             lighting = settings.is_lighting_enabled()
+            cache_memory = settings.get_chunk_cache_memory()
+            prefetch_time = settings.get_prefetch_time()
+            bake_workers = settings.get_bake_workers()
+            light_color = lighting and settings.is_light_color_enabled()
+            day_length = settings.get_day_length() if lighting else 0
+            light_map = lighting and (settings.is_light_map_enabled() or light_color or day_length > 0)
 
             self.background_renderer = PygameRenderer.WorldRenderer.BackgroundRenderer(self.camera, scene,
                                                                                        tile_width, tile_height)
 
             self.map_renderer = PygameRenderer.MapRenderer(self.camera, scene.get_map(), tile_width, tile_height,
-                                                           chunk_width, chunk_height, lighting)
+                                                           chunk_width, chunk_height, lighting and not light_color,
+                                                           cache_memory, prefetch_time, bake_workers, light_map)
+            self.light_map_renderer = PygameRenderer.WorldRenderer.LightMapRenderer(
+                self.camera, scene.get_map(), tile_width, tile_height,
+                ColorLighting(scene.get_map()) if light_color else None,
+                DayCycle(day_length) if day_length > 0 else None) if light_map else None
             self.inv_renderer = PygameRenderer.WorldRenderer.InventoryRenderer(
                 self.camera, scene.inventory, inv_item_width, inv_item_height, inv_item_spacing)
 
+            self.tile_width = tile_width
+            self.tile_height = tile_height
+            self.light_map = light_map
             for actor in scene.get_actors():
-                self.actor_renderers[str(actor)] = PygameRenderer.ActorRenderer(self.camera, actor, scene.get_map(),
-                                                                                tile_width, tile_height)
+                self.on_actor_added(actor)
+
+        def exit(self):
+            """ Free renderer resources """
+            self.map_renderer.exit()
+            if self.light_map_renderer is not None:
+                self.light_map_renderer.exit()
 
         def on_actor_added(self, actor):
-            self.actor_renderers[str(actor)] = PygameRenderer.ActorRenderer(self.camera, actor)
+            self.actor_renderers[str(actor)] = PygameRenderer.ActorRenderer(self.camera, actor, self.scene.get_map(),
+                                                                            self.tile_width, self.tile_height,
+                                                                            not self.light_map)
 
         def on_actor_removed(self, actor):
-            self.actor_renderers.pop(actor)
+            self.actor_renderers.pop(str(actor))
 
         def on_scene_move(self, x, y):
             pass
@@ -1324,6 +1905,8 @@ class PygameRenderer:
             """ Update actors and map """
             self.background_renderer.update(delta_time)
             self.map_renderer.update(delta_time)
+            if self.light_map_renderer is not None:
+                self.light_map_renderer.update(delta_time)
             for actor_renderer in self.actor_renderers.values():
                 actor_renderer.update(delta_time)
             self.inv_renderer.update(delta_time)
@@ -1335,6 +1918,8 @@ class PygameRenderer:
             self.map_renderer.render(delta_time)
             for actor_renderer in self.actor_renderers.values():
                 actor_renderer.render(delta_time)
+            if self.light_map_renderer is not None:
+                self.light_map_renderer.render(delta_time)  # over map and actors, inventory stays lit
             self.inv_renderer.render(delta_time)
             self.camera.render(delta_time)
 
@@ -1342,10 +1927,13 @@ class PygameRenderer:
         self._screen_width = settings.get_width()
         self._screen_height = settings.get_height()
         self._scene_renderer = None
+        self._loading_font = None
+        TextureFactory.set_path(settings.get_texture_path())
 
     def set_scene(self, scene):
         if self._scene_renderer:
-            scene.remove_scene_listener(self._scene_renderer)
+            self._scene_renderer.scene.remove_scene_listener(self._scene_renderer)
+            self._scene_renderer.exit()
         self._scene_renderer = PygameRenderer.WorldRenderer(scene, self._screen_width, self._screen_height)
         scene.add_scene_listener(self._scene_renderer)
 
@@ -1356,6 +1944,31 @@ class PygameRenderer:
         flags = pygame.DOUBLEBUF
         pygame.display.set_mode([self._screen_width, self._screen_height], flags, 32)
 
+    def render_loading(self, progress):
+        """ Draw loading screen with progress bar and preview of map generated so far """
+
+        surface = pygame.display.get_surface()
+        surface.fill((0, 0, 0))
+
+        bar_height = 24
+        space = Vector(self._screen_width, self._screen_height - 3 * bar_height)
+        width, height = progress.foreground.shape
+        step = max(1, -(-width // int(space.x)), -(-height // int(space.y)))
+        preview = pygame.surfarray.make_surface(progress.preview(step))
+        surface.blit(preview, ((space.x - preview.get_width()) / 2, (space.y - preview.get_height()) / 2))
+
+        y = self._screen_height - 2 * bar_height
+        pygame.draw.rect(surface, (64, 64, 64), (0, y, self._screen_width, bar_height))
+        pygame.draw.rect(surface, (28, 216, 94), (0, y, self._screen_width * progress.get_fraction(), bar_height))
+
+        if not self._loading_font:
+            self._loading_font = pygame.font.SysFont("Helvetica", 16)
+        text = self._loading_font.render("Generating world: {} {}/{}".format(progress.stage.value, progress.done,
+                                                                             progress.total),
+                                         False, (255, 255, 255))
+        surface.blit(text, (4, y + 4))
+        pygame.display.flip()
+
     def update(self, delta_time: float):
         if self._scene_renderer:
             self._scene_renderer.update(delta_time)
@@ -1365,6 +1978,9 @@ class PygameRenderer:
             self._scene_renderer.render(delta_time)
 
     def exit(self):
+        if self._scene_renderer:
+            self._scene_renderer.exit()
+            self._scene_renderer = None
         pygame.display.quit()
         pygame.font.quit()
         pygame.quit()
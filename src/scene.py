@@ -39,6 +39,10 @@ class Scene(Rect, ABC):
         """ Initialize all scene resources here """
         pass
 
+    def load(self, application):
+        """ :return iterator over loading progress, scene is rendered and updated once it is exhausted """
+        return iter(())
+
     @abstractmethod
     def exit(self):
         """ Free all scene resources here """
@@ -69,7 +73,7 @@ class Scene(Rect, ABC):
 
         # notify
         for listener in self.listeners:
-            listener.on_actor_removed(listener)
+            listener.on_actor_removed(actor)
 
     def schedule_action(self, action, actor):
         """ Will schedule action on next tick on actor """
@@ -98,6 +102,10 @@ class Scene(Rect, ABC):
     def remove_scene_listener(self, listener):
         self.listeners.remove(listener)
 
+    def handle_events(self, events):
+        """ Dispatch frame input events to listeners """
+        self.input.handle_events(events)
+
     def get_input(self):
         """ :return input processor """
         return self.input
@@ -125,6 +133,11 @@ class World(Scene, ABC):
     map: Map
     inventory: Inventory
 
+    def handle_events(self, events):
+        # edits made by one frame of input reach map listeners as one region change per layer
+        with self.map.transaction():
+            super().handle_events(events)
+
     def get_map(self):
         """ :return scene map """
         return self.map
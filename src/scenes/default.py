@@ -4,7 +4,7 @@ from src.actors.player import Player
 from src.input import Input, KeyboardListener, MouseListener, Mouse, Key
 from src.inventory import Inventory
 from src.maps.procedural import ProceduralMap
-from src.physics import resolve_dynamic_rect_vs_rect, dynamic_rect_vs_rect, CollisionInfo
+from src.physics import resolve_dynamic_rect_vs_rect, dynamic_rect_vs_rect, CollisionInfo, SweepAndPrune
 from src.rect import Rect
 from src.scene import World
 from src.settings import SceneSettings
@@ -38,12 +38,10 @@ class DefaultScene(MouseListener, KeyboardListener, World):
         self.inventory.add(Items.IRON_HAMMER, 1)
         self.inventory.add(Tiles.WHITE_TORCH, 999)
         self.player = Player(0, 0, 20, 42)
+        self.broadphase = SweepAndPrune()
 
     def get_tiles_around(self, rect, delta_time: float) -> List[Rect]:
 
-        def is_wall(tile_type: int):
-            return tile_type != Tiles.NONE
-
         t_w = self.settings.get_tile_width()
         t_h = self.settings.get_tile_height()
 
@@ -55,15 +53,15 @@ class DefaultScene(MouseListener, KeyboardListener, World):
         e_c = col + 4 + int(rect.size.x / t_w)
         e_r = row + 4 + int(rect.size.y / t_h)
 
+        self.map.ensure_region(s_c, s_r, e_c + 1, e_r + 1)
+
         tiles = []
-        for c_ in range(s_c, e_c + 1):
-            for r_ in range(s_r, e_r + 1):
-                tile = self.map.foreground.get_tile(c_, r_)
-                if tile and is_wall(tile.type):
-                    x = c_ * t_w
-                    y = r_ * t_h
-                    rect = Rect(x, y, t_w, t_h)
-                    tiles.append(rect)
+        walls = self.map.foreground.region(s_c, s_r, e_c + 1, e_r + 1) != Tiles.NONE
+        for c_, r_ in zip(*walls.nonzero()):
+            x = (s_c + int(c_)) * t_w
+            y = (s_r + int(r_)) * t_h
+            rect = Rect(x, y, t_w, t_h)
+            tiles.append(rect)
         return tiles
 
     def on_key_down(self, key) -> bool:
@@ -315,12 +313,19 @@ class DefaultScene(MouseListener, KeyboardListener, World):
                 if actor.vel.y > 1000:
                     actor.vel.y = 1000
 
+        # actors whose swept boxes overlap are tested against each other
+        nearby = {}
+        for a, b in self.broadphase.update(self.get_actors(), delta_time):
+            nearby.setdefault(a, []).append(b)
+            nearby.setdefault(b, []).append(a)
+
+        for actor in self.get_actors():
             # resolve collisions
             contacts = []
-            for tile in self.get_tiles_around(actor, delta_time):
+            for rect in self.get_tiles_around(actor, delta_time) + nearby.get(actor, []):
                 info = CollisionInfo()
-                if dynamic_rect_vs_rect(actor, tile, delta_time, info):
-                    contacts.append((tile, info.c_time))
+                if dynamic_rect_vs_rect(actor, rect, delta_time, info):
+                    contacts.append((rect, info.c_time))
             if contacts:
                 contacts.sort(key=lambda v: v[1])
                 for contact_pair in contacts:
@@ -332,7 +337,6 @@ class DefaultScene(MouseListener, KeyboardListener, World):
 
     def init(self, application):
         self.input.init(self)
-        self.map.init(self)
         self.input.add_keyboard_listener(self)
         self.input.add_mouse_listener(self)
 
@@ -343,5 +347,8 @@ class DefaultScene(MouseListener, KeyboardListener, World):
 
         self.initialized = True
 
+    def load(self, application):
+        return self.map.generate(self, application.get_settings().get_map_path())
+
     def exit(self):
-        pass
+        self.map.exit()
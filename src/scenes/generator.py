@@ -50,10 +50,12 @@ class GeneratorScene(KeyboardListener, World):
 
     def init(self, application):
         self.input.init(self)
-        self.map.init(self)
         self.input.add_keyboard_listener(self)
 
         self.initialized = True
 
+    def load(self, application):
+        return self.map.generate(self, application.get_settings().get_map_path())
+
     def exit(self):
-        pass
+        self.map.exit()
@@ -10,9 +10,22 @@ class SceneSettings:
         "CHUNK_HEIGHT": 16,  # unit [tiles]
         "WORLD_WIDTH": 800,  # unit [tiles]
         "WORLD_HEIGHT": 600,  # unit [tiles]
+        "MEMORY_MAPPED_MAP": False,  # map layers are mapped from world save file copied from cache, edits persist
+
+        # GENERATION
+        "GENERATOR_WORKERS": 1,  # processes generating world bands, 1 generates serially
+        "LAZY_GENERATION": False,  # generate chunk sized regions when they are first touched
+
+        # RENDERING
+        "CHUNK_CACHE_MEMORY": 64,  # unit [MB], chunk surfaces kept baked, least recently used are dropped
+        "PREFETCH_TIME": 0.5,  # unit [s], chunks camera is predicted to show within it are baked ahead
+        "BAKE_WORKERS": 0,  # processes composing chunk pixels, 0 blits chunk tiles on main thread
 
         # LIGHTING
         "LIGHTING": False,
+        "LIGHT_MAP": False,  # lighting multiplied over frame from one texture of tile resolution, chunks baked unlit
+        "LIGHT_COLOR": False,  # colored light of sources drawn as light map, replaces lighting grid
+        "DAY_LENGTH": 0,  # unit [s] of day and night cycle scaling sky light drawn as light map, no cycle when 0
 
         # INVENTORY
         "INVENTORY_ITEM_WIDTH": 32,
@@ -41,9 +54,36 @@ class SceneSettings:
     def get_world_height(self):
         return self._settings["WORLD_HEIGHT"]
 
+    def is_map_memory_mapped(self):
+        return self._settings["MEMORY_MAPPED_MAP"]
+
+    def get_generator_workers(self):
+        return self._settings["GENERATOR_WORKERS"]
+
+    def is_generation_lazy(self):
+        return self._settings["LAZY_GENERATION"]
+
+    def get_chunk_cache_memory(self):
+        return self._settings["CHUNK_CACHE_MEMORY"]
+
+    def get_prefetch_time(self):
+        return self._settings["PREFETCH_TIME"]
+
+    def get_bake_workers(self):
+        return self._settings["BAKE_WORKERS"]
+
     def is_lighting_enabled(self):
         return self._settings["LIGHTING"]
 
+    def is_light_map_enabled(self):
+        return self._settings["LIGHT_MAP"]
+
+    def is_light_color_enabled(self):
+        return self._settings["LIGHT_COLOR"]
+
+    def get_day_length(self):
+        return self._settings["DAY_LENGTH"]
+
     def get_inventory_item_width(self):
         return self._settings["INVENTORY_ITEM_WIDTH"]
 
@@ -62,6 +102,8 @@ class ApplicationSettings:
         "WIDTH": 1900,
         "HEIGHT": 800,
         "FPS": 60,
+        "WORKERS": 1,  # threads running background jobs
+        "FRAME_BUDGET": 4,  # unit [ms], main thread work such as chunk baking and relighting done each frame
         "TEXTURE_PATH": "./res/",
         "MAP_PATH": "./save/default_map.raw",
     }
@@ -78,5 +120,14 @@ class ApplicationSettings:
     def get_fps(self):
         return self._settings["FPS"]
 
+    def get_workers(self):
+        return self._settings["WORKERS"]
+
+    def get_frame_budget(self):
+        return self._settings["FRAME_BUDGET"]
+
     def get_texture_path(self):
         return self._settings["TEXTURE_PATH"]
+
+    def get_map_path(self):
+        return self._settings["MAP_PATH"]
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import struct
+from typing import Dict, Iterable, Union
+
+import numpy
+
+# Map save file: preamble, json header describing planes, then raw C ordered planes.
+# Header and every plane start on _ALIGNMENT boundary so planes can be memory mapped.
+
+_MAGIC = b"PTMAP"
+_VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<5sBI")  # magic, version, header length
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_planes(path: str, key: str, planes: Dict[str, numpy.ndarray]) -> None:
+    """
+    Atomically write planes into save file
+    :param path of save file
+    :param key identifying content, read_planes with different key misses
+    :param planes name: array pairs
+    """
+
+    header = json.dumps({
+        "key": key,
+        "planes": [{"name": name, "dtype": plane.dtype.str, "shape": list(plane.shape)}
+                   for name, plane in planes.items()]
+    }).encode()
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+        file.write(header)
+        for plane in planes.values():
+            file.seek(_align(file.tell()))
+            file.write(numpy.ascontiguousarray(plane).tobytes())
+    os.replace(tmp_path, path)
+
+
+def copy_planes(path: str, copy_path: str) -> None:
+    """ Atomically copy save file, e.g. to edit world while keeping cached one """
+
+    directory = os.path.dirname(copy_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = copy_path + ".tmp"
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, copy_path)
+
+
+def world_path(path: str) -> str:
+    """ :return path of world save file holding edits of world cached in save file at path """
+    root, extension = os.path.splitext(path)
+    return root + ".world" + extension
+
+
+def read_planes(path: str, key: str, names: Iterable[str],
+                mmap_mode: Union[None, str] = None) -> Union[None, Dict[str, numpy.ndarray]]:
+    """
+    :param path of save file
+    :param key identifying content
+    :param names of planes expected in file
+    :param mmap_mode memory map planes in this numpy.memmap mode instead of reading them into memory
+    :return name: array pairs, None if file is missing, unreadable, saved with different key or lacks some plane
+    """
+
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            magic, version, header_length = _PREAMBLE.unpack(file.read(_PREAMBLE.size))
+            if magic != _MAGIC or version != _VERSION:
+                return None
+
+            header = json.loads(file.read(header_length))
+            if header["key"] != key or not set(names) <= {plane["name"] for plane in header["planes"]}:
+                return None
+
+            planes = {}
+            offset = _PREAMBLE.size + header_length
+            for plane in header["planes"]:
+                dtype = numpy.dtype(plane["dtype"])
+                shape = tuple(plane["shape"])
+                offset = _align(offset)
+                length = int(numpy.prod(shape)) * dtype.itemsize
+                if offset + length > size:
+                    return None
+
+                if mmap_mode is None:
+                    file.seek(offset)
+                    data = numpy.fromfile(file, dtype=dtype, count=int(numpy.prod(shape))).reshape(shape)
+                else:
+                    data = numpy.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape)
+                planes[plane["name"]] = data
+                offset += length
+            return planes
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
@@ -0,0 +1,96 @@
+from concurrent.futures import Future
+from threading import Event, current_thread
+
+from src.parellel import FrameScheduler, Scheduler
+
+
+def test_priority_order():
+    """ Lower priority runs first, jobs with same priority in order of submission """
+
+    scheduler = FrameScheduler()
+    ran = []
+    for name, priority in [("c", 3), ("a", 1), ("b", 2), ("a2", 1)]:
+        scheduler.submit(ran.append, (name,), priority)
+    scheduler.run(1000)
+    assert ran == ["a", "a2", "b", "c"]
+
+
+def test_key_dedup():
+    """ Submitting waiting job again returns its future and only moves its priority """
+
+    scheduler = FrameScheduler()
+    ran = []
+    first = scheduler.submit(ran.append, ("keyed",), 5, key="chunk")
+    scheduler.submit(ran.append, ("other",), 1)
+    again = scheduler.submit(ran.append, ("duplicate",), 0, key="chunk")
+    assert again is first
+    assert scheduler.get_pending() == 2
+    scheduler.run(1000)
+    assert ran == ["keyed", "other"]
+
+
+def test_cancel():
+    """ Cancelled job never runs and its key identifies new job """
+
+    scheduler = FrameScheduler()
+    ran = []
+    future = scheduler.submit(ran.append, ("cancelled",), key="chunk")
+    assert future.cancel()
+    assert scheduler.get_pending() == 0
+    again = scheduler.submit(ran.append, ("resubmitted",), key="chunk")
+    assert again is not future
+    scheduler.run(1000)
+    assert ran == ["resubmitted"]
+
+
+def test_sliced_job_parked_on_future_resumes():
+    """ Slice yielding future which is not done parks job without spending frames, job resumes once it is done """
+
+    scheduler = FrameScheduler()
+    waiting = Future()
+    slices = []
+
+    def job():
+        slices.append(1)
+        yield waiting
+        slices.append(2)
+        return waiting.result() * 2
+
+    future = scheduler.submit(job, key="job")
+    scheduler.run(1000)
+    assert slices == [1]
+    assert scheduler.get_pending() == 0
+    assert not future.done()
+
+    # parked job keeps its key until its last slice
+    assert scheduler.submit(job, priority=3, key="job") is future
+
+    waiting.set_result(21)
+    assert scheduler.get_pending() == 1
+    scheduler.run(1000)
+    assert slices == [1, 2]
+    assert future.result() == 42
+    assert scheduler.submit(job, key="job") is not future
+
+
+def test_scheduler_runs_jobs_on_worker_threads():
+    """ Jobs run on pool threads in priority order, keyed job waiting behind running one is deduplicated """
+
+    scheduler = Scheduler(1, "test")
+    started, release = Event(), Event()
+    ran = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    scheduler.submit(block)
+    started.wait()
+    first = scheduler.submit(ran.append, ("flush",), 2, key="flush")
+    assert scheduler.submit(ran.append, ("flush again",), 2, key="flush") is first
+    thread = scheduler.submit(lambda: current_thread().name, priority=1)
+    release.set()
+    scheduler.join()
+    assert ran == ["flush"]
+    assert thread.result() == "test-0"
+    scheduler.shutdown()
@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.maps.procedural import ProceduralMap, band_noise, bands, layer_bounds, lerp, map_tiles, surface_noise
+from src.settings import SceneSettings
+from src.tables import Tiles
+
+
+def per_cell_map_tiles(start: int, end: int, height: int, surface, caves, filling, cop, ld, sil, gd) -> np.ndarray:
+    """ Classification of tiles cell by cell, as map_tiles did before it used masks """
+
+    sky_end, surface_end, cave_end, caverns_end = layer_bounds(height)
+    tiles = np.zeros((end - start, len(surface)), dtype=np.uint8)
+
+    for i in range(start, end):
+        k = i - start
+        for j in range(len(surface)):
+
+            if i < sky_end:  # sky
+
+                tiles[k][j] = Tiles.NONE  # sky
+
+            elif i < surface_end:
+
+                min_i = sky_end  # surface min value is 30% of dirt caves height (1.5 / 10)
+                max_i = surface_end - 1
+                p = (i - min_i) / (max_i - min_i)
+
+                if i - min_i > surface[j] * min_i:
+                    if caves[k][j] < lerp(0.25, 0.2, p):
+                        if cop[k][j] < -0.25:
+                            tiles[k][j] = Tiles.COPPER  # copper
+                        elif ld[k][j] < -0.35:
+                            tiles[k][j] = Tiles.LEAD  # lead
+                        else:
+                            if filling[k][j] < lerp(-0.5, -0.2, p):
+                                tiles[k][j] = Tiles.STONE  # stone
+                            else:
+                                tiles[k][j] = Tiles.DIRT  # dirt
+                    elif caves[k][j] < 1.0:
+                        tiles[k][j] = Tiles.NONE  # cave bg
+
+                else:
+                    tiles[k][j] = Tiles.NONE
+
+            elif i < cave_end:  # caves (2 / 10)
+
+                min_i = surface_end
+                max_i = cave_end - 1
+                p = (i - min_i) / (max_i - min_i)
+
+                if caves[k][j] < lerp(0.2, 0.15, p):
+                    if cop[k][j] < -0.35:
+                        tiles[k][j] = Tiles.COPPER  # copper
+                    elif ld[k][j] < -0.28:
+                        tiles[k][j] = Tiles.LEAD  # lead
+                    elif sil[k][j] < -0.35:
+                        tiles[k][j] = Tiles.SILVER  # silver
+                    elif gd[k][j] < -0.4:
+                        tiles[k][j] = Tiles.GOLD  # gold
+                    else:
+                        if filling[k][j] < lerp(-0.2, 0.1, p):
+                            tiles[k][j] = Tiles.STONE  # stone
+                        else:
+                            tiles[k][j] = Tiles.DIRT  # dirt
+                elif caves[k][j] < 0.45:
+                    tiles[k][j] = Tiles.NONE  # cave bg
+                elif caves[k][j] < 1.0:
+                    tiles[k][j] = Tiles.STONE  # stone
+
+            elif i < caverns_end:  # caverns (4 / 10)
+
+                min_i = cave_end
+                max_i = caverns_end - 1
+                p = (i - min_i) / (max_i - min_i)
+
+                if caves[k][j] < lerp(0.15, 0.05, p):
+                    if cop[k][j] < -0.4:
+                        tiles[k][j] = Tiles.COPPER  # copper
+                    elif ld[k][j] < -0.3:
+                        tiles[k][j] = Tiles.LEAD  # lead
+                    elif sil[k][j] < -0.3:
+                        tiles[k][j] = Tiles.SILVER  # silver
+                    elif gd[k][j] < -0.32:
+                        tiles[k][j] = Tiles.GOLD  # gold
+                    else:
+                        if filling[k][j] < lerp(0.1, 0.3, p):
+                            tiles[k][j] = Tiles.STONE  # stone
+                        else:
+                            tiles[k][j] = Tiles.DIRT  # dirt
+
+                elif caves[k][j] < 0.35:  # size of caves
+                    tiles[k][j] = Tiles.NONE  # caverns_bg
+                elif caves[k][j] < 1.0:
+                    tiles[k][j] = Tiles.STONE  # stone
+
+            else:  # hell (1 / 10)
+                tiles[k][j] = Tiles.ASH  # ash
+
+    return tiles
+
+
+def noise(width: int, height: int, seed: int, start: int, end: int):
+    """ :return arguments of map_tiles for rows [start, end) """
+    surface = np.abs(surface_noise(np.arange(width), height, seed))
+    surface *= 1 / np.max(surface)
+    return (start, end, height, surface) + band_noise(start, end, np.arange(width), seed)
+
+
+@pytest.mark.parametrize("width, height, seed", [(97, 61, 0), (120, 100, 7)])
+def test_map_tiles_matches_per_cell(width, height, seed):
+    args = noise(width, height, seed, 0, height)
+    assert np.array_equal(map_tiles(*args), per_cell_map_tiles(*args))
+
+
+def test_map_tiles_bands_match_per_cell():
+    width, height, seed = 80, 90, 3
+    for start, end in bands(height, 4):
+        args = noise(width, height, seed, start, end)
+        assert np.array_equal(map_tiles(*args), per_cell_map_tiles(*args))
+
+
+def scene(width: int, height: int, **settings):
+    """ :return scene as seen by map, settings only """
+    return SimpleNamespace(settings=SceneSettings(dict(settings, WORLD_WIDTH=width, WORLD_HEIGHT=height)))
+
+
+def test_lazy_sky_matches_scan():
+    width, height = 96, 80
+    map_ = ProceduralMap(width, height)
+    map_.init(scene(width, height, LAZY_GENERATION=True))
+    assert np.array_equal(map_.sky, map_.find_sky(0, width))
+
+    map_.ensure_region(16, 0, 48, height)
+    assert np.array_equal(map_.sky, map_.find_sky(0, width))
+
+
+def test_mapped_edits_persist_in_world_save_file(tmp_path):
+    width, height = 64, 48
+    path = str(tmp_path / "map.raw")
+    map_ = ProceduralMap(width, height)
+    map_.init(scene(width, height, MEMORY_MAPPED_MAP=True), path)
+    tile = int(map_.foreground.tiles[10, 40])
+    map_.foreground.set_tile(10, 40, Tiles.GOLD)
+    map_.exit()
+
+    edited = ProceduralMap(width, height)
+    edited.init(scene(width, height, MEMORY_MAPPED_MAP=True), path)
+    assert edited.foreground.tiles[10, 40] == Tiles.GOLD
+    assert np.array_equal(edited.sky, edited.find_sky(0, width))
+
+    cached = ProceduralMap(width, height)
+    cached.init(scene(width, height), path)
+    assert cached.foreground.tiles[10, 40] == tile